@@ -78,12 +78,36 @@ async def lifespan(app: FastAPI):
         
         from core import limits_api
         limits_api.initialize(db)
+
+        from core.sandbox.sandbox_pool import sandbox_pool
+        if sandbox_pool.enabled:
+            # Also sweeps warm sandboxes orphaned by a previous process
+            sandbox_pool.start()
+
+        from core.billing.usage_ledger import usage_ledger
+        usage_ledger.start()
         
         yield
         
         logger.debug("Cleaning up agent resources")
         await core_api.cleanup()
         
+        from core.services.pubsub_multiplexer import pubsub_multiplexer
+        await pubsub_multiplexer.close()
+
+        from core.services.agent_run_stream import stream_read_multiplexer
+        await stream_read_multiplexer.close()
+
+        from core.tools.utils.mcp_session_pool import mcp_session_pool
+        await mcp_session_pool.close_all()
+
+        try:
+            await sandbox_pool.close()
+        except Exception as e:
+            logger.error(f"Error releasing warm sandboxes: {e}")
+
+        await usage_ledger.close()
+
         try:
             logger.debug("Closing Redis connection")
             await redis.close()
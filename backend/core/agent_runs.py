@@ -3,6 +3,7 @@ import json
 import traceback
 import uuid
 import os
+import re
 from datetime import datetime, timezone
 from typing import Optional, List, Tuple, Dict
 from fastapi import APIRouter, HTTPException, Depends, Request, Body, File, UploadFile, Form
@@ -12,7 +13,13 @@ from core.utils.logger import logger, structlog
 from core.billing.billing_integration import billing_integration
 from core.utils.config import config, EnvMode
 from core.services import redis
-from core.sandbox.sandbox import create_sandbox, delete_sandbox, get_or_start_sandbox
+from core.services.pubsub_multiplexer import pubsub_multiplexer, RECONNECT_MESSAGE_TYPE
+from core.services.run_admission import run_admission
+from core.services.agent_run_stream import (
+    TRANSPORT_STREAM, STREAM_START_ID, get_transport, get_stream_block_ms, read_stream_entries,
+)
+from core.sandbox.sandbox import get_or_start_sandbox
+from core.sandbox.sandbox_pool import bind_project_sandbox
 from core.utils.sandbox_utils import generate_unique_filename, get_uploads_directory
 from run_agent_background import run_agent_background
 
@@ -24,7 +31,7 @@ from . import core_utils as utils
 from .core_utils import (
     stop_agent_run_with_helpers as stop_agent_run,
     _get_version_service, generate_and_update_project_name,
-    check_agent_run_limit, check_project_count_limit
+    acquire_agent_run_slot, check_project_count_limit
 )
 
 router = APIRouter(tags=["agent-runs"])
@@ -115,7 +122,7 @@ async def _load_agent_config(client, agent_id: Optional[str], account_id: str, u
     return agent_config
 
 
-async def _check_billing_and_limits(client, account_id: str, model_name: Optional[str], check_project_limit: bool = False):
+async def _check_billing_and_limits(client, account_id: str, model_name: Optional[str], agent_run_id: str, check_project_limit: bool = False):
     """
     Check billing, model access, and rate limits.
     
@@ -123,6 +130,7 @@ async def _check_billing_and_limits(client, account_id: str, model_name: Optiona
         client: Database client
         account_id: Account ID to check
         model_name: Model name to check access for
+        agent_run_id: ID of the run being started; takes one of the account's concurrent run slots
         check_project_limit: Whether to check project count limit (for new threads)
     
     Raises:
@@ -147,8 +155,8 @@ async def _check_billing_and_limits(client, account_id: str, model_name: Optiona
     
     # Check limits (only if not in local mode)
     if config.ENV_MODE != EnvMode.LOCAL:
-        # Always check agent run limit
-        limit_check = await check_agent_run_limit(client, account_id)
+        # Always check agent run limit (and take a run slot if below it)
+        limit_check = await acquire_agent_run_slot(client, account_id, agent_run_id)
         if not limit_check['can_start']:
             error_detail = {
                 "message": f"Maximum of {limit_check['limit']} concurrent agent runs allowed. You currently have {limit_check['running_count']} running.",
@@ -202,12 +210,13 @@ async def _get_effective_model(model_name: Optional[str], agent_config: Optional
         return effective_model
 
 
-async def _create_agent_run_record(client, thread_id: str, agent_config: Optional[dict], effective_model: str) -> str:
+async def _create_agent_run_record(client, agent_run_id: str, thread_id: str, agent_config: Optional[dict], effective_model: str) -> str:
     """
     Create an agent run record in the database.
     
     Args:
         client: Database client
+        agent_run_id: ID admitted by the concurrent run check
         thread_id: Thread ID to associate with
         agent_config: Agent configuration dict
         effective_model: Model name to use
@@ -216,6 +225,7 @@ async def _create_agent_run_record(client, thread_id: str, agent_config: Optiona
         agent_run_id: The created agent run ID
     """
     agent_run = await client.table('agent_runs').insert({
+        "id": agent_run_id,
         "thread_id": thread_id,
         "status": "running",
         "started_at": datetime.now(timezone.utc).isoformat(),
@@ -240,6 +250,14 @@ async def _create_agent_run_record(client, thread_id: str, agent_config: Optiona
     return agent_run_id
 
 
+async def _release_run_slot(agent_run_id: str):
+    """Give back the concurrent run slot of a start that failed before the run was queued."""
+    try:
+        await run_admission.release(agent_run_id)
+    except Exception as e:
+        logger.warning(f"Failed to release run slot for {agent_run_id}: {str(e)}")
+
+
 async def _trigger_agent_background(agent_run_id: str, thread_id: str, project_id: str, effective_model: str, agent_config: Optional[dict]):
     """
     Trigger the background agent execution.
@@ -383,43 +401,11 @@ async def _ensure_sandbox_for_thread(client, project_id: str, files: List[Upload
         logger.debug(f"No files to upload and no sandbox exists for project {project_id}")
         return None, None
     
-    # Create new sandbox
+    # Create new sandbox (warm from the pool when one is ready)
     try:
-        sandbox_pass = str(uuid.uuid4())
-        sandbox = await create_sandbox(sandbox_pass, project_id)
-        sandbox_id = sandbox.id
+        provisioned = await bind_project_sandbox(client, project_id)
+        sandbox, sandbox_id = provisioned.sandbox, provisioned.sandbox_id
         logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
-
-        # Get preview links
-        vnc_link = await sandbox.get_preview_link(6080)
-        website_link = await sandbox.get_preview_link(8080)
-        vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
-        website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
-        token = None
-        if hasattr(vnc_link, 'token'):
-            token = vnc_link.token
-        elif "token='" in str(vnc_link):
-            token = str(vnc_link).split("token='")[1].split("'")[0]
-
-        # Update project with sandbox info
-        update_result = await client.table('projects').update({
-            'sandbox': {
-                'id': sandbox_id,
-                'pass': sandbox_pass,
-                'vnc_preview': vnc_url,
-                'sandbox_url': website_url,
-                'token': token
-            }
-        }).eq('project_id', project_id).execute()
-
-        if not update_result.data:
-            logger.error(f"Failed to update project {project_id} with new sandbox {sandbox_id}")
-            if sandbox_id:
-                try:
-                    await delete_sandbox(sandbox_id)
-                except Exception as e:
-                    logger.error(f"Error deleting sandbox: {str(e)}")
-            raise Exception("Database update failed")
         
         return sandbox, sandbox_id
     except Exception as e:
@@ -472,6 +458,9 @@ async def unified_agent_start(
         model_name = model_manager.resolve_model_id(model_name)
         logger.debug(f"Resolved model name: {model_name}")
     
+    # Pre-assigned so the run can hold its concurrent run slot before the record exists
+    agent_run_id = str(uuid.uuid4())
+
     try:
         # ====================================================================
         # Branch: Existing Thread vs New Thread
@@ -509,7 +498,7 @@ async def unified_agent_start(
             agent_config = await _load_agent_config(client, agent_id, thread_account_id, user_id, is_new_thread=False)
             
             # Check billing and limits
-            await _check_billing_and_limits(client, thread_account_id, model_name, check_project_limit=False)
+            await _check_billing_and_limits(client, thread_account_id, model_name, agent_run_id, check_project_limit=False)
             
             # Get effective model
             effective_model = await _get_effective_model(model_name, agent_config, client, thread_account_id)
@@ -552,7 +541,7 @@ async def unified_agent_start(
                 logger.debug(f"Created user message for thread {thread_id}")
             
             # Create agent run
-            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model)
+            await _create_agent_run_record(client, agent_run_id, thread_id, agent_config, effective_model)
             
             # Trigger background execution
             await _trigger_agent_background(agent_run_id, thread_id, project_id, effective_model, agent_config)
@@ -579,7 +568,7 @@ async def unified_agent_start(
             agent_config = await _load_agent_config(client, agent_id, account_id, user_id, is_new_thread=True)
             
             # Check billing and limits (including project and thread limits)
-            await _check_billing_and_limits(client, account_id, model_name, check_project_limit=True)
+            await _check_billing_and_limits(client, account_id, model_name, agent_run_id, check_project_limit=True)
             
             if config.ENV_MODE != EnvMode.LOCAL:
                 from core.utils.limits_checker import check_thread_limit
@@ -666,7 +655,7 @@ async def unified_agent_start(
             }).execute()
             
             # Create agent run
-            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model)
+            await _create_agent_run_record(client, agent_run_id, thread_id, agent_config, effective_model)
             
             # Trigger background execution
             await _trigger_agent_background(agent_run_id, thread_id, project_id, effective_model, agent_config)
@@ -678,8 +667,10 @@ async def unified_agent_start(
             }
     
     except HTTPException:
+        await _release_run_slot(agent_run_id)
         raise
     except Exception as e:
+        await _release_run_slot(agent_run_id)
         logger.error(f"Error in unified agent start: {str(e)}\n{traceback.format_exc()}")
         # Log the actual error details for debugging
         error_details = {
@@ -901,13 +892,92 @@ async def get_thread_agent(thread_id: str, user_id: str = Depends(verify_and_get
         logger.error(f"Error fetching agent for thread {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch thread agent: {str(e)}")
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
+    "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
+    "Access-Control-Allow-Origin": "*"
+}
+
+STREAM_END_STATUSES = ('completed', 'failed', 'stopped')
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+
+async def _redis_stream_generator(agent_run_id: str, agent_run_data: Optional[Dict], last_event_id: Optional[str]):
+    """Stream run output from a Redis Stream, resuming after last_event_id.
+
+    Every event carries its stream entry ID as the SSE `id`, so a reconnecting
+    EventSource sends it back as `Last-Event-ID` and only receives what it missed.
+    """
+    last_id = last_event_id if last_event_id and STREAM_ID_PATTERN.match(last_event_id) else STREAM_START_ID
+    logger.debug(f"Streaming responses for {agent_run_id} from Redis stream after {last_id}")
+
+    def format_entry(entry):
+        """Return (sse_event, is_final) for a stream entry."""
+        if entry.control:
+            return f"id: {entry.id}\ndata: {json.dumps({'type': 'status', 'status': entry.control})}\n\n", True
+        if entry.data is None:
+            return None, False
+        return f"id: {entry.id}\ndata: {entry.data}\n\n", entry.status in STREAM_END_STATUSES
+
+    try:
+        # 1. Replay everything after last_id
+        while True:
+            entries = await read_stream_entries(agent_run_id, last_id)
+            if not entries:
+                break
+            for entry in entries:
+                last_id = entry.id
+                event, is_final = format_entry(entry)
+                if event:
+                    yield event
+                if is_final:
+                    return
+
+        # 2. Check run status
+        current_status = agent_run_data.get('status') if agent_run_data else None
+        if current_status != 'running':
+            logger.debug(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
+            yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+            return
+
+        structlog.contextvars.bind_contextvars(
+            thread_id=agent_run_data.get('thread_id'),
+        )
+
+        # 3. Block for new entries until the run ends
+        block_ms = get_stream_block_ms()
+        while True:
+            entries = await read_stream_entries(agent_run_id, last_id, block_ms=block_ms)
+            for entry in entries:
+                last_id = entry.id
+                event, is_final = format_entry(entry)
+                if event:
+                    yield event
+                if is_final:
+                    return
+
+    except asyncio.CancelledError:
+        logger.debug(f"Stream generator cancelled for {agent_run_id}")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming agent run {agent_run_id} from Redis stream: {e}", exc_info=True)
+        yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
+    finally:
+        logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
+
+
 @router.get("/agent-run/{agent_run_id}/stream", summary="Stream Agent Run", operation_id="stream_agent_run")
 async def stream_agent_run(
     agent_run_id: str,
     token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run using Redis Lists and Pub/Sub, or Redis Streams.
+
+    With the stream transport, clients resume with the `Last-Event-ID` header
+    (or the `last_event_id` query parameter).
+    """
     logger.debug(f"Starting stream for agent run: {agent_run_id}")
     client = await utils.db.client
 
@@ -919,6 +989,14 @@ async def stream_agent_run(
         user_id=user_id,
     )
 
+    if get_transport() == TRANSPORT_STREAM:
+        resume_from = (request.headers.get("last-event-id") if request else None) or last_event_id
+        return StreamingResponse(
+            _redis_stream_generator(agent_run_id, agent_run_data, resume_from),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
     response_list_key = f"agent_run:{agent_run_id}:responses"
     response_channel = f"agent_run:{agent_run_id}:new_response"
     control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
@@ -926,8 +1004,8 @@ async def stream_agent_run(
     async def stream_generator(agent_run_data):
         logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
         last_processed_index = -1
-        # Single pubsub used for response + control
-        listener_task = None
+        # Shared per-process pub/sub, watching both response + control channels
+        subscription = None
         terminate_stream = False
         initial_yield_complete = False
 
@@ -955,58 +1033,18 @@ async def stream_agent_run(
                 thread_id=agent_run_data.get('thread_id'),
             )
 
-            # 3. Use a single Pub/Sub connection subscribed to both channels
-            pubsub = await redis.create_pubsub()
-            await pubsub.subscribe(response_channel, control_channel)
+            # 3. Subscribe through the process-wide multiplexer (no dedicated connection per viewer)
+            subscription = await pubsub_multiplexer.subscribe(response_channel, control_channel)
             logger.debug(f"Subscribed to channels: {response_channel}, {control_channel}")
 
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                listener = pubsub.listen()
-                task = asyncio.create_task(listener.__anext__())
-
-                while not terminate_stream:
-                    done, _ = await asyncio.wait([task], return_when=asyncio.FIRST_COMPLETED)
-                    for finished in done:
-                        try:
-                            message = finished.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes):
-                                    data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.debug(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return  # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener stopped for {agent_run_id}.")
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Resubscribe to the next message if continuing
-                            if not terminate_stream:
-                                task = asyncio.create_task(listener.__anext__())
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
+            # Catch up on anything pushed between the initial read and the subscription
+            pending_fetch = True
+
+            # 4. Main loop: fetch the list tail on every "new" ping, stop on control signals
             while not terminate_stream:
                 try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
+                    if pending_fetch:
+                        pending_fetch = False
                         # Fetch new responses from Redis list starting after the last processed index
                         new_start_index = last_processed_index + 1
                         new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
@@ -1025,16 +1063,20 @@ async def stream_agent_run(
                             last_processed_index += num_new
                         if terminate_stream: break
 
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
+                    message = await subscription.get()
+                    if message["type"] == RECONNECT_MESSAGE_TYPE:
+                        # Pings may have been lost while the shared connection was down
+                        pending_fetch = True
+                        continue
+
+                    channel = message.get("channel")
+                    data = message.get("data")
+                    if channel == response_channel and data == "new":
+                        pending_fetch = True
+                    elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
+                        logger.debug(f"Received control signal '{data}' for {agent_run_id}")
                         terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
-
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
-                        terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
+                        yield f"data: {json.dumps({'type': 'status', 'status': data})}\n\n"
                         break
 
                 except asyncio.CancelledError:
@@ -1054,28 +1096,11 @@ async def stream_agent_run(
                  yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
         finally:
             terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            try:
-                if 'pubsub' in locals() and pubsub:
-                    await pubsub.unsubscribe(response_channel, control_channel)
-                    await pubsub.close()
-            except Exception as e:
-                logger.debug(f"Error during pubsub cleanup for {agent_run_id}: {e}")
-
-            if listener_task:
-                listener_task.cancel()
+            if subscription:
                 try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
+                    await subscription.close()
                 except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
+                    logger.debug(f"Error releasing subscription for {agent_run_id}: {e}")
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
-    return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers={
-        "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
-        "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
-        "Access-Control-Allow-Origin": "*"
-    })
+    return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers=SSE_HEADERS)
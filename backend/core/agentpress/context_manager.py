@@ -5,64 +5,55 @@ This module handles token counting and thread summarization to prevent
 reaching the context window limitations of LLM models.
 """
 
+import hashlib
 import json
-import os
-from typing import List, Dict, Any, Optional, Union
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 from litellm.utils import token_counter
-from anthropic import Anthropic
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
 from core.ai_models import model_manager
 from core.agentpress.prompt_caching import apply_anthropic_caching_strategy
+from core.agentpress.message_cache import ThreadMessageCache
+from core.agentpress.thread_run_state import thread_run_state
+from core.agentpress.token_counting import token_counting_service
 
 DEFAULT_TOKEN_THRESHOLD = 120000
 
+# Per-message local token counts, keyed by (model, message_id, content hash).
+# Shared across ContextManager instances so later turns only count new or changed messages.
+MESSAGE_TOKEN_CACHE_SIZE = 20000
+_message_token_cache: "OrderedDict[Tuple[str, Optional[str], str], int]" = OrderedDict()
+
 class ContextManager:
     """Manages thread context including token counting and summarization."""
     
-    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD):
+    def __init__(self, token_threshold: int = DEFAULT_TOKEN_THRESHOLD, message_cache: Optional[ThreadMessageCache] = None):
         """Initialize the ContextManager.
         
         Args:
             token_threshold: Token count threshold to trigger summarization
+            message_cache: Optional ThreadManager message cache, invalidated when compressions are persisted
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.message_cache = message_cache
+        self.token_counter = token_counting_service
         # Tool output management
         self.keep_recent_tool_outputs = 5  # Number of recent tool outputs to preserve
         # Compression strategy
         self.compression_target_ratio = 0.6  # Compress to 60% of max tokens (hysteresis)
         self.keep_recent_user_messages = 10  # Number of recent user messages to keep uncompressed
         self.keep_recent_assistant_messages = 10  # Number of recent assistant messages to keep uncompressed
-        # Initialize Anthropic client for accurate token counting
-        self._anthropic_client = None
-        self._bedrock_client = None
-
-    def _get_anthropic_client(self):
-        """Lazy initialization of Anthropic client."""
-        if self._anthropic_client is None:
-            api_key = os.environ.get("ANTHROPIC_API_KEY")
-            if api_key:
-                self._anthropic_client = Anthropic(api_key=api_key)
-        return self._anthropic_client
-    
-    def _get_bedrock_client(self):
-        """Lazy initialization of Bedrock client."""
-        if self._bedrock_client is None:
-            try:
-                import boto3
-                self._bedrock_client = boto3.client('bedrock-runtime', region_name='us-west-2')
-            except Exception as e:
-                logger.debug(f"Could not initialize Bedrock client: {e}")
-        return self._bedrock_client
 
-    async def count_tokens(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None, apply_caching: bool = True) -> int:
+    async def count_tokens(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None, apply_caching: bool = True, threshold: Optional[int] = None, accurate: bool = False) -> int:
         """Count tokens using the correct tokenizer for the model.
         
-        For Anthropic/Claude models: Uses Anthropic's official tokenizer
-        For Bedrock models: Uses Bedrock's count_tokens API
-        For other models: Uses LiteLLM's token_counter
+        Counting is delegated to the TokenCountingService, which never blocks the event loop:
+        For Anthropic/Claude models: Anthropic's official tokenizer (async client)
+        For Bedrock models: Bedrock's count_tokens API (offloaded to an executor)
+        For other models, or when the policy skips the remote call: LiteLLM's token_counter
         
         IMPORTANT: By default, applies caching transformation before counting to match
         the actual token count that will be sent to the API.
@@ -72,6 +63,8 @@ class ContextManager:
             messages: List of messages
             system_prompt: Optional system prompt
             apply_caching: If True, temporarily apply caching transformation before counting
+            threshold: Token limit the result is compared against (drives the near_threshold policy)
+            accurate: Force a provider count regardless of policy
             
         Returns:
             Token count (with caching overhead if apply_caching=True)
@@ -98,118 +91,49 @@ class ContextManager:
                 logger.debug(f"Failed to apply caching for counting: {e}")
                 # Continue with uncached messages
         
-        # Check if this is an Anthropic model
-        if 'claude' in model.lower() or 'anthropic' in model.lower():
-            # Use Anthropic's official tokenizer
-            try:
-                client = self._get_anthropic_client()
-                if client:
-                    # Strip provider prefix
-                    clean_model = model.split('/')[-1] if '/' in model else model
-                    
-                    # Clean messages - only role and content
-                    clean_messages = []
-                    for msg in messages_to_count:
-                        if msg.get('role') == 'system':
-                            continue  # System passed separately
-                        clean_messages.append({
-                            'role': msg.get('role'),
-                            'content': msg.get('content')
-                        })
-                    
-                    # Extract system content
-                    system_content = None
-                    if system_to_count and isinstance(system_to_count, dict):
-                        system_content = system_to_count.get('content')
-                    
-                    # Build parameters
-                    count_params = {'model': clean_model, 'messages': clean_messages}
-                    if system_content:
-                        count_params['system'] = system_content
-                    
-                    result = client.messages.count_tokens(**count_params)
-                    return result.input_tokens
-            except Exception as e:
-                logger.debug(f"Anthropic token counting failed, falling back to LiteLLM: {e}")
-        
-        # Check if this is a Bedrock model
-        elif 'bedrock' in model.lower():
-            try:
-                bedrock_client = self._get_bedrock_client()
-                if bedrock_client:
-                    # Map profile IDs to model IDs
-                    model_id_mapping = {
-                        "heol2zyy5v48": "anthropic.claude-3-5-haiku-20241022-v1:0",
-                        "few7z4l830xh": "anthropic.claude-3-5-sonnet-20241022-v2:0",
-                        "tyj1ks3nj9qf": "anthropic.claude-sonnet-4-20250514-v1:0",
-                    }
-                    
-                    # Extract profile ID from ARN
-                    bedrock_model_id = None
-                    if "application-inference-profile" in model:
-                        profile_id = model.split("/")[-1]
-                        bedrock_model_id = model_id_mapping.get(profile_id)
-                    
-                    if not bedrock_model_id:
-                        bedrock_model_id = "anthropic.claude-3-5-haiku-20241022-v1:0"
-                    
-                    # Clean content blocks for Bedrock Converse API
-                    def clean_content_for_bedrock(content):
-                        """
-                        Convert Anthropic format to Bedrock Converse API format.
-                        Converts cache_control -> cachePoint to preserve cache overhead in token counts.
-                        """
-                        if isinstance(content, str):
-                            return [{'text': content}]
-                        elif isinstance(content, list):
-                            cleaned = []
-                            for block in content:
-                                if isinstance(block, dict):
-                                    # Extract text
-                                    if 'text' in block:
-                                        cleaned.append({'text': block['text']})
-                                        # Convert cache_control to cachePoint (separate block)
-                                        if 'cache_control' in block:
-                                            cleaned.append({'cachePoint': {'type': 'default'}})
-                            return cleaned if cleaned else [{'text': str(content)}]
-                        return [{'text': str(content)}]
-                    
-                    # Format messages for Bedrock
-                    bedrock_messages = []
-                    system_content = None
-                    
-                    for msg in messages_to_count:
-                        if msg.get('role') == 'system':
-                            system_content = clean_content_for_bedrock(msg.get('content'))
-                            continue
-                        
-                        bedrock_messages.append({
-                            'role': msg.get('role'),
-                            'content': clean_content_for_bedrock(msg.get('content'))
-                        })
-                    
-                    # Build input
-                    input_to_count = {'messages': bedrock_messages}
-                    if system_content:
-                        input_to_count['system'] = system_content
-                    elif system_to_count:
-                        input_to_count['system'] = clean_content_for_bedrock(system_to_count.get('content'))
-                    
-                    # Call Bedrock count_tokens API
-                    response = bedrock_client.count_tokens(
-                        modelId=bedrock_model_id,
-                        input={'converse': input_to_count}
-                    )
-                    
-                    return response['inputTokens']
-            except Exception as e:
-                logger.debug(f"Bedrock token counting failed, falling back to LiteLLM: {e}")
-        
-        # Fallback to LiteLLM token_counter
-        if system_to_count:
-            return token_counter(model=model, messages=[system_to_count] + messages_to_count)
-        else:
-            return token_counter(model=model, messages=messages_to_count)
+        return await self.token_counter.count(
+            model, messages_to_count, system_to_count, threshold=threshold, accurate=accurate
+        )
+
+    def _message_token_key(self, model: str, message: Dict[str, Any]) -> Tuple[str, Optional[str], str]:
+        """Build the memoization key for a message: model, message_id and a hash of role + content."""
+        content = message.get('content')
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{message.get('role')}\x00{content}".encode('utf-8', 'surrogatepass')).hexdigest()
+        return (model, message.get('message_id'), digest)
+
+    def count_message_tokens(self, model: str, message: Dict[str, Any]) -> int:
+        """Count tokens of a single message with the local tokenizer, memoized by message_id + content hash."""
+        key = self._message_token_key(model, message)
+        cached = _message_token_cache.get(key)
+        if cached is not None:
+            _message_token_cache.move_to_end(key)
+            return cached
+
+        try:
+            count = token_counter(model=model, messages=[message])
+        except Exception as e:
+            logger.debug(f"Local token counting failed for message, using word estimate: {e}")
+            count = int(len(str(message.get('content', '')).split()) * 1.3)
+
+        _message_token_cache[key] = count
+        if len(_message_token_cache) > MESSAGE_TOKEN_CACHE_SIZE:
+            _message_token_cache.popitem(last=False)
+        return count
+
+    def estimate_tokens(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        """Sum memoized per-message counts. Only new or changed messages hit the tokenizer."""
+        total = sum(self.count_message_tokens(model, msg) for msg in messages)
+        if system_prompt:
+            total += self.count_message_tokens(model, system_prompt)
+        return total
+
+    def _calibration_ratio(self, exact_total: int, local_total: int) -> float:
+        """Ratio between an exact (provider, with caching) count and the local estimate of the same messages."""
+        if local_total <= 0 or exact_total <= 0:
+            return 1.0
+        return exact_total / local_total
 
     async def estimate_token_usage(self, prompt_messages: List[Dict[str, Any]], completion_content: str, model: str) -> Dict[str, Any]:
         """
@@ -226,7 +150,7 @@ class ContextManager:
         """
         try:
             # Count prompt tokens using accurate provider APIs
-            prompt_tokens = await self.count_tokens(model, prompt_messages, apply_caching=False)
+            prompt_tokens = await self.count_tokens(model, prompt_messages, apply_caching=False, accurate=True)
             
             # Count completion tokens (just the text)
             completion_tokens = 0
@@ -753,7 +677,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if self.is_tool_result_message(msg):  # Only compress ToolResult messages
                     _i += 1  # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = self.count_message_tokens(llm_model, msg)  # Count the number of tokens in the message (memoized)
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_tool_outputs:  # If this is not one of the most recent N ToolResult messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -783,7 +707,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if msg.get('role') == 'user':  # Only compress User messages
                     _i += 1  # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = self.count_message_tokens(llm_model, msg)  # Count the number of tokens in the message (memoized)
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_user_messages:  # If this is not one of the most recent N User messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -813,7 +737,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if msg.get('role') == 'assistant':  # Only compress Assistant messages
                     _i += 1  # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = self.count_message_tokens(llm_model, msg)  # Count the number of tokens in the message (memoized)
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_assistant_messages:  # If this is not one of the most recent N Assistant messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -883,7 +807,7 @@ class ContextManager:
             uncompressed_total_token_count = actual_total_tokens
         else:
             # Count conversation + system prompt WITH caching (to match API reality)
-            uncompressed_total_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+            uncompressed_total_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True, threshold=max_tokens)
             logger.info(f"Initial token count (with caching): {uncompressed_total_token_count}")
 
         # Calculate target tokens (hysteresis: compress to 60% of max to avoid repeated compressions)
@@ -899,6 +823,8 @@ class ContextManager:
         if uncompressed_total_token_count > max_tokens:
             logger.info(f"Context over limit ({uncompressed_total_token_count} > {max_tokens}), starting tiered compression...")
             
+            messages_before_tiers = result
+            
             # Tier 1: Remove old tool outputs
             updated_count = await self.update_old_tool_outputs_in_db(
                 result, keep_last_n=self.keep_recent_tool_outputs
@@ -908,12 +834,16 @@ class ContextManager:
             # Also update in-memory for this request
             result = self.remove_old_tool_outputs(result, keep_last_n=self.keep_recent_tool_outputs)
             
-            # Recalculate WITH caching
-            current_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+            # Track the total incrementally: memoized local counts scaled to the exact count,
+            # so only messages changed by a tier are re-tokenized and no provider call is made
+            ratio = self._calibration_ratio(uncompressed_total_token_count, self.estimate_tokens(llm_model, messages_before_tiers, system_prompt))
+            current_token_count = int(self.estimate_tokens(llm_model, result, system_prompt) * ratio)
             
             logger.info(f"After tool removal: {uncompressed_total_token_count} -> {current_token_count} tokens")
             
             # Tier 2: Compress user messages if still above target
+            user_compressed = 0
+            assistant_compressed = 0
             if current_token_count > target_tokens:
                 logger.info(f"Still above target ({current_token_count} > {target_tokens}), compressing user messages...")
                 user_compressed = await self.persist_user_message_compressions_to_db(
@@ -924,8 +854,7 @@ class ContextManager:
                 # Also compress in-memory for this request
                 result = self.compress_user_messages_in_memory(result, keep_last_n=self.keep_recent_user_messages)
                 
-                # Recalculate with in-memory compressed messages WITH caching
-                current_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+                current_token_count = int(self.estimate_tokens(llm_model, result, system_prompt) * ratio)
                 logger.info(f"After user compression: {current_token_count} tokens")
             
             # Tier 3: Compress assistant messages if still above target
@@ -939,21 +868,20 @@ class ContextManager:
                 # Also compress in-memory for this request
                 result = self.compress_assistant_messages_in_memory(result, keep_last_n=self.keep_recent_assistant_messages)
                 
-                # Recalculate with in-memory compressed messages WITH caching
-                current_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+                current_token_count = int(self.estimate_tokens(llm_model, result, system_prompt) * ratio)
                 logger.info(f"After assistant compression: {current_token_count} tokens")
             
             logger.info(f"Tiered compression complete: {uncompressed_total_token_count} -> {current_token_count} tokens (target: {target_tokens})")
             
+            # Cached rows no longer match the compressed metadata in the DB
+            if thread_id and self.message_cache and (updated_count or user_compressed or assistant_compressed):
+                self.message_cache.invalidate(thread_id)
+            
             # Set flag for cache rebuild on next turn (primary compression modified DB)
             if thread_id and updated_count > 0:
                 try:
                     logger.info(f"✂️ Compressed {updated_count} messages - cache will rebuild on next turn")
-                    client = await self.db.client
-                    result_data = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
-                    metadata = result_data.data.get('metadata', {}) if result_data.data else {}
-                    metadata['cache_needs_rebuild'] = True
-                    await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
+                    await thread_run_state.mark_cache_rebuild(thread_id)
                 except Exception as e:
                     logger.warning(f"Failed to set cache_needs_rebuild flag: {e}")
             uncompressed_total_token_count = current_token_count
@@ -974,7 +902,7 @@ class ContextManager:
             result = await self.compress_assistant_messages(result, llm_model, max_tokens, token_threshold, uncompressed_total_token_count)
 
         # Recalculate WITH caching (to match API reality)
-        compressed_total = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+        compressed_total = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True, threshold=target_tokens)
         
         if compressed_total != uncompressed_total_token_count:
             logger.info(f"Context compression: {uncompressed_total_token_count} -> {compressed_total} tokens (saved {uncompressed_total_token_count - compressed_total})")
@@ -984,8 +912,7 @@ class ContextManager:
         # Recurse if still too large
         if max_iterations <= 0:
             logger.warning(f"Max iterations reached, omitting messages")
-            result = await self.compress_messages_by_omitting_messages(result, llm_model, max_tokens, system_prompt=system_prompt)
-            compressed_total = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+            result, compressed_total = await self._omit_messages(result, llm_model, max_tokens, system_prompt=system_prompt, initial_token_count=compressed_total)
             # Fall through to last_usage update
         elif compressed_total > max_tokens:
             logger.warning(f"Further compression needed: {compressed_total} > {max_tokens}")
@@ -998,8 +925,7 @@ class ContextManager:
         elif compressed_total > target_tokens:
             # Still over target but under max_tokens - use omit_messages to reach target
             logger.info(f"Secondary compression didn't reach target ({compressed_total} > {target_tokens}). Using message omission to reach target.")
-            result = await self.compress_messages_by_omitting_messages(result, llm_model, target_tokens, system_prompt=system_prompt)
-            compressed_total = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
+            result, compressed_total = await self._omit_messages(result, llm_model, target_tokens, system_prompt=system_prompt, initial_token_count=compressed_total)
             logger.info(f"After message omission to target: {compressed_total} tokens")
 
         logger.info(f"✨ Final compression complete: {compressed_total} tokens (target: {target_tokens}, max: {max_tokens})")
@@ -1023,26 +949,55 @@ class ContextManager:
             removal_batch_size: Number of messages to remove per iteration
             min_messages_to_keep: Minimum number of messages to preserve
         """
+        result, _ = await self._omit_messages(
+            messages, llm_model, max_tokens, removal_batch_size, min_messages_to_keep, system_prompt
+        )
+        return result
+
+    async def _omit_messages(
+            self,
+            messages: List[Dict[str, Any]],
+            llm_model: str,
+            max_tokens: Optional[int] = 41000,
+            removal_batch_size: int = 10,
+            min_messages_to_keep: int = 10,
+            system_prompt: Optional[Dict[str, Any]] = None,
+            initial_token_count: Optional[int] = None
+        ) -> Tuple[List[Dict[str, Any]], int]:
+        """Omit messages from the middle until under max_tokens.
+        
+        The running total is maintained from memoized per-message counts (scaled to the
+        exact count), so the exact count is only recomputed once the estimate converges.
+        
+        Returns:
+            Tuple of (remaining messages, exact token count of the result WITH caching)
+        """
         if not messages:
-            return messages
+            return messages, 0
             
         result = messages
         result = self.remove_meta_messages(result)
 
-        # Early exit if no compression needed - WITH caching
-        initial_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
-        
         max_allowed_tokens = max_tokens or (100 * 1000)
         
+        # Early exit if no compression needed - WITH caching
+        if initial_token_count is None:
+            initial_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True, threshold=max_allowed_tokens)
+        
         if initial_token_count <= max_allowed_tokens:
-            return result
+            return result, initial_token_count
 
         # Separate system message (assumed to be first) from conversation messages
         system_message = system_prompt
         conversation_messages = result
+        message_counts = [self.count_message_tokens(llm_model, msg) for msg in conversation_messages]
+        system_count = self.count_message_tokens(llm_model, system_message) if system_message else 0
+        local_total = sum(message_counts) + system_count
+        ratio = self._calibration_ratio(initial_token_count, local_total)
         
         safety_limit = 500
         current_token_count = initial_token_count
+        is_exact = True
         
         while current_token_count > max_allowed_tokens and safety_limit > 0:
             safety_limit -= 1
@@ -1056,28 +1011,37 @@ class ContextManager:
                 # Remove from middle, keeping recent and early context
                 middle_start = len(conversation_messages) // 2 - (removal_batch_size // 2)
                 middle_end = middle_start + removal_batch_size
+                local_total -= sum(message_counts[middle_start:middle_end])
                 conversation_messages = conversation_messages[:middle_start] + conversation_messages[middle_end:]
+                message_counts = message_counts[:middle_start] + message_counts[middle_end:]
             else:
                 # Remove from earlier messages, preserving recent context
                 messages_to_remove = min(removal_batch_size, len(conversation_messages) // 2)
                 if messages_to_remove > 0:
+                    local_total -= sum(message_counts[:messages_to_remove])
                     conversation_messages = conversation_messages[messages_to_remove:]
+                    message_counts = message_counts[messages_to_remove:]
                 else:
                     # Can't remove any more messages
                     break
 
-            # Recalculate token count WITH caching
-            current_token_count = await self.count_tokens(llm_model, conversation_messages, system_message, apply_caching=True)
+            current_token_count = int(local_total * ratio)
+            is_exact = False
+            
+            # Estimate converged - confirm WITH caching and recalibrate if still over
+            if current_token_count <= max_allowed_tokens:
+                current_token_count = await self.count_tokens(llm_model, conversation_messages, system_message, apply_caching=True, threshold=max_allowed_tokens)
+                ratio = self._calibration_ratio(current_token_count, local_total)
+                is_exact = True
+
+        if not is_exact:
+            current_token_count = await self.count_tokens(llm_model, conversation_messages, system_message, apply_caching=True, threshold=max_allowed_tokens)
 
-        # Prepare final result - return only conversation messages (matches compress_messages pattern)
         final_messages = conversation_messages
         
-        # Log with system prompt included for accurate token reporting WITH caching
-        final_token_count = await self.count_tokens(llm_model, final_messages, system_message, apply_caching=True)
-        
-        logger.info(f"Context compression (omit): {initial_token_count} -> {final_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
+        logger.info(f"Context compression (omit): {initial_token_count} -> {current_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
             
-        return final_messages
+        return final_messages, current_token_count
     
     def middle_out_messages(self, messages: List[Dict[str, Any]], max_messages: int = 320) -> List[Dict[str, Any]]:
         """Remove messages from the middle of the list, keeping max_messages total."""
@@ -0,0 +1,92 @@
+"""
+Run-scoped message cache for AgentPress threads.
+
+Keeps the parsed LLM messages of a thread in memory so that auto-continue
+iterations only have to pull rows newer than the last cached message instead
+of re-reading and re-parsing the whole thread from the database.
+
+The cache is write-through: ThreadManager.add_message appends rows as they are
+persisted, and ContextManager invalidates a thread whenever it rewrites the
+compressed metadata of existing rows.
+"""
+
+import copy
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set
+from core.utils.logger import logger
+
+
+@dataclass
+class _ThreadEntry:
+    """Cached state for a single thread."""
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    seen_ids: Set[str] = field(default_factory=set)
+    last_created_at: Optional[str] = None
+
+
+class ThreadMessageCache:
+    """Write-through cache of parsed LLM messages, keyed by thread_id.
+
+    Messages are stored in `created_at` order. Callers receive deep copies of
+    the cached messages, so in-place changes downstream (prompt caching markers
+    on content blocks, compression rewriting content) never leak back into the
+    cache.
+    """
+
+    def __init__(self):
+        self._threads: Dict[str, _ThreadEntry] = {}
+
+    def is_loaded(self, thread_id: str) -> bool:
+        """Whether the full thread has been loaded at least once."""
+        return thread_id in self._threads
+
+    def get_cursor(self, thread_id: str) -> Optional[str]:
+        """Return the `created_at` of the newest cached row, or None if not loaded."""
+        entry = self._threads.get(thread_id)
+        return entry.last_created_at if entry else None
+
+    def reset(self, thread_id: str) -> None:
+        """Start an empty entry for a thread that is about to be fully loaded."""
+        self._threads[thread_id] = _ThreadEntry()
+
+    def add(self, thread_id: str, message_id: str, created_at: Optional[str], message: Optional[Dict[str, Any]]) -> bool:
+        """Append a persisted row to the cache.
+
+        Args:
+            thread_id: Thread the row belongs to
+            message_id: ID of the persisted row (used for de-duplication)
+            created_at: Row timestamp, advances the incremental fetch cursor
+            message: Parsed LLM message, or None if the row could not be parsed
+
+        Returns:
+            True if the row was new, False if it was already cached
+        """
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            return False
+
+        if message_id in entry.seen_ids:
+            return False
+
+        entry.seen_ids.add(message_id)
+        if message is not None:
+            entry.messages.append(message)
+        if created_at and (entry.last_created_at is None or created_at > entry.last_created_at):
+            entry.last_created_at = created_at
+        return True
+
+    def get_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Return copies of the cached messages for a thread."""
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            return []
+        return copy.deepcopy(entry.messages)
+
+    def invalidate(self, thread_id: str) -> None:
+        """Drop a thread so the next read reloads it from the database."""
+        if self._threads.pop(thread_id, None) is not None:
+            logger.debug(f"Invalidated message cache for thread {thread_id}")
+
+    def clear(self) -> None:
+        """Drop all cached threads."""
+        self._threads.clear()
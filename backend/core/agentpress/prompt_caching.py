@@ -40,20 +40,15 @@ from core.utils.logger import logger
 
 
 async def get_stored_threshold(thread_id: str, model: str) -> Optional[Dict[str, Any]]:
-    """Get stored cache threshold from thread metadata."""
-    from core.services.supabase import DBConnection
-    db = DBConnection()
-    client = await db.client
+    """Get stored cache threshold from the thread's run state."""
+    from core.agentpress.thread_run_state import thread_run_state
     
     try:
-        result = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
-        if result.data:
-            metadata = result.data.get('metadata', {})
-            cache_config = metadata.get('cache_config', {})
-            
-            # Validate it's for the same model
-            if cache_config.get('model') == model:
-                return cache_config
+        cache_config = (await thread_run_state.get(thread_id)).get('cache_config') or {}
+        
+        # Validate it's for the same model
+        if cache_config.get('model') == model:
+            return cache_config
     except Exception as e:
         logger.debug(f"No stored threshold found for thread {thread_id}: {e}")
     
@@ -61,36 +56,18 @@ async def get_stored_threshold(thread_id: str, model: str) -> Optional[Dict[str,
 
 
 async def store_threshold(thread_id: str, threshold: int, model: str, reason: str, turn: Optional[int] = None, system_prompt_tokens: Optional[int] = None):
-    """Store cache threshold in thread metadata."""
-    from core.services.supabase import DBConnection
-    db = DBConnection()
-    client = await db.client
+    """Store cache threshold in the thread's run state."""
+    from core.agentpress.thread_run_state import thread_run_state, build_cache_config
     
     try:
-        # Get existing metadata
-        result = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
-        metadata = result.data.get('metadata', {}) if result.data else {}
-        
-        # Update cache config
-        metadata['cache_config'] = {
-            'threshold': threshold,
-            'model': model,
-            'system_prompt_tokens': system_prompt_tokens,
-            'last_calc_turn': turn,
-            'last_calc_reason': reason,
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }
-        
-        # Write back
-        await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
-        
+        await thread_run_state.store_cache_config(
+            thread_id, build_cache_config(threshold, model, reason, turn, system_prompt_tokens)
+        )
         logger.info(f"💾 Stored cache threshold: {threshold} tokens (reason: {reason})")
     except Exception as e:
         logger.warning(f"Failed to store threshold: {e}")
 
 
-
-
 def get_resolved_model_id(model_name: str) -> str:
     """Resolve model name to its canonical ID through the model registry."""
     try:
@@ -268,7 +245,8 @@ async def apply_anthropic_caching_strategy(
     turn_number: Optional[int] = None,  # NEW: for tracking
     force_recalc: bool = False,  # NEW: for compression triggers
     context_window_tokens: Optional[int] = None,  # Auto-detect from model registry
-    cache_threshold_tokens: Optional[int] = None  # Auto-calculate based on context window
+    cache_threshold_tokens: Optional[int] = None,  # Auto-calculate based on context window
+    run_state: Optional[Dict[str, Any]] = None  # Thread run state already read by the caller
 ) -> List[Dict[str, Any]]:
     """
     Apply mathematically optimized token-based caching strategy for Anthropic models.
@@ -317,7 +295,11 @@ async def apply_anthropic_caching_strategy(
     system_prompt_tokens = None
     
     if thread_id and not force_recalc:
-        stored_config = await get_stored_threshold(thread_id, model_name)
+        if run_state is not None:
+            cache_config = run_state.get('cache_config') or {}
+            stored_config = cache_config if cache_config.get('model') == model_name else None
+        else:
+            stored_config = await get_stored_threshold(thread_id, model_name)
         
         if stored_config:
             cache_threshold_tokens = stored_config['threshold']
@@ -18,7 +18,7 @@ from dataclasses import dataclass
 from core.utils.logger import logger
 from core.agentpress.tool import ToolResult
 from core.agentpress.tool_registry import ToolRegistry
-from core.agentpress.xml_tool_parser import XMLToolParser
+from core.agentpress.xml_tool_parser import XMLToolParser, StreamingXMLChunkExtractor
 from core.agentpress.error_processor import ErrorProcessor
 from langfuse.client import StatefulTraceClient
 from core.services.langfuse import langfuse
@@ -108,6 +108,8 @@ class ResponseProcessor:
         self.is_agent_builder = False  # Deprecated - keeping for compatibility
         self.target_agent_id = None  # Deprecated - keeping for compatibility
         self.agent_config = agent_config
+        self._legacy_tag_names: Tuple[str, ...] = ()
+        self._legacy_tag_pattern: Optional[re.Pattern] = None
 
     async def _yield_message(self, message_obj: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """Helper to yield a message with proper formatting.
@@ -273,7 +275,8 @@ class ResponseProcessor:
         continuous_state = continuous_state or {}
         accumulated_content = continuous_state.get('accumulated_content', "")
         tool_calls_buffer = {}
-        current_xml_content = accumulated_content   # equal to accumulated_content if auto-continuing, else blank
+        # Seeded with accumulated_content if auto-continuing; legacy tags are looked for while no <function_calls> block is open
+        xml_chunk_extractor = StreamingXMLChunkExtractor(accumulated_content, legacy_extractor=self._extract_legacy_xml_chunks)
         xml_chunks_buffer = []
         pending_tool_executions = []
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
@@ -393,8 +396,6 @@ class ResponseProcessor:
                         # print(chunk_content, end='', flush=True)
                         # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to accumulated_content (type={type(accumulated_content)})")
                         accumulated_content += chunk_content
-                        # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to current_xml_content (type={type(current_xml_content)})")
-                        current_xml_content += chunk_content
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -414,9 +415,8 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
+                            xml_chunks = xml_chunk_extractor.feed(chunk_content)
                             for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
                                 xml_chunks_buffer.append(xml_chunk)
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
@@ -673,9 +673,10 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
+                    # Blocks are extracted incrementally while streaming; blocks after the XML limit are dropped by the limit below.
+                    # If nothing was extracted, reparse the whole response once as a safety net (e.g. content the extractor never saw)
+                    if not xml_chunks_buffer:
+                        xml_chunks_buffer.extend(self._extract_xml_chunks(accumulated_content))
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
@@ -1326,6 +1327,84 @@ class ResponseProcessor:
             if end_msg_obj: yield format_for_yield(end_msg_obj)
 
 
+    def _get_legacy_tag_pattern(self) -> Optional[re.Pattern]:
+        """Compiled alternation of all legacy tool tags (`<function-name`), rebuilt only when the registry changes."""
+        func_names = tuple(self.tool_registry.tools.keys())
+        if func_names != self._legacy_tag_names:
+            self._legacy_tag_names = func_names
+            # Convert function name to potential tag name (underscore to dash); order preserves registration priority
+            tag_names = [func_name.replace('_', '-') for func_name in func_names]
+            self._legacy_tag_pattern = re.compile('<(' + '|'.join(re.escape(tag) for tag in tag_names) + ')') if tag_names else None
+        return self._legacy_tag_pattern
+
+    def _extract_legacy_xml_chunks(self, content: str) -> Tuple[List[str], int, Optional[str]]:
+        """Extract complete chunks in the legacy per-tool tag format (`<create-file>...</create-file>`).
+        
+        Returns:
+            The chunks; the offset from which `content` may still hold a chunk
+            that is not complete yet (the first unclosed tag, or a tail long enough
+            to hold the start of a tag split across deltas); and the end tag the
+            unclosed tag at that offset waits for, or None for a tail
+        """
+        chunks = []
+        pos = 0
+        first_open = None
+        first_open_end = None
+        legacy_tag_pattern = self._get_legacy_tag_pattern()
+        while legacy_tag_pattern and pos < len(content):
+            # Find the earliest occurrence of any registered tool tag in a single scan
+            tag_match = legacy_tag_pattern.search(content, pos)
+            if not tag_match:
+                break
+            next_tag_start = tag_match.start()
+            current_tag = tag_match.group(1)
+            
+            # Find the matching end tag
+            end_pattern = f'</{current_tag}>'
+            tag_stack = []
+            chunk_start = next_tag_start
+            current_pos = next_tag_start
+            
+            while current_pos < len(content):
+                # Look for next start or end tag of the same type
+                next_start = content.find(f'<{current_tag}', current_pos + 1)
+                next_end = content.find(end_pattern, current_pos)
+                
+                if next_end == -1:  # No closing tag found
+                    if first_open is None:
+                        first_open, first_open_end = next_tag_start, end_pattern
+                    break
+                
+                if next_start != -1 and next_start < next_end:
+                    # Found nested start tag
+                    tag_stack.append(next_start)
+                    current_pos = next_start + 1
+                else:
+                    # Found end tag
+                    if not tag_stack:  # This is our matching end tag
+                        chunk_end = next_end + len(end_pattern)
+                        chunk = content[chunk_start:chunk_end]
+                        chunks.append(chunk)
+                        pos = chunk_end
+                        break
+                    else:
+                        # Pop nested tag
+                        tag_stack.pop()
+                        current_pos = next_end + 1
+            
+            if current_pos >= len(content):  # Reached end without finding closing tag
+                if first_open is None:
+                    first_open, first_open_end = next_tag_start, end_pattern
+                break
+            
+            pos = max(pos + 1, current_pos)
+        
+        if first_open is not None:
+            return chunks, first_open, first_open_end
+        # Keep enough of the end to complete a tag whose name is split across deltas
+        longest_tag = max((len(name) for name in self._legacy_tag_names), default=0) + 1
+        return chunks, max(pos, len(content) - longest_tag), None
+
     def _extract_xml_chunks(self, content: str) -> List[str]:
         """Extract complete XML chunks using start and end pattern matching."""
         chunks = []
@@ -1357,63 +1436,7 @@ class ResponseProcessor:
             
             # If no new format found, fall back to old format for backwards compatibility
             if not chunks:
-                pos = 0
-                while pos < len(content):
-                    # Find the next tool tag
-                    next_tag_start = -1
-                    current_tag = None
-                    
-                    # Find the earliest occurrence of any registered tool function name
-                    # Check for available function names
-                    available_functions = self.tool_registry.get_available_functions()
-                    for func_name in available_functions.keys():
-                        # Convert function name to potential tag name (underscore to dash)
-                        tag_name = func_name.replace('_', '-')
-                        start_pattern = f'<{tag_name}'
-                        tag_pos = content.find(start_pattern, pos)
-                        
-                        if tag_pos != -1 and (next_tag_start == -1 or tag_pos < next_tag_start):
-                            next_tag_start = tag_pos
-                            current_tag = tag_name
-                    
-                    if next_tag_start == -1 or not current_tag:
-                        break
-                    
-                    # Find the matching end tag
-                    end_pattern = f'</{current_tag}>'
-                    tag_stack = []
-                    chunk_start = next_tag_start
-                    current_pos = next_tag_start
-                    
-                    while current_pos < len(content):
-                        # Look for next start or end tag of the same type
-                        next_start = content.find(f'<{current_tag}', current_pos + 1)
-                        next_end = content.find(end_pattern, current_pos)
-                        
-                        if next_end == -1:  # No closing tag found
-                            break
-                        
-                        if next_start != -1 and next_start < next_end:
-                            # Found nested start tag
-                            tag_stack.append(next_start)
-                            current_pos = next_start + 1
-                        else:
-                            # Found end tag
-                            if not tag_stack:  # This is our matching end tag
-                                chunk_end = next_end + len(end_pattern)
-                                chunk = content[chunk_start:chunk_end]
-                                chunks.append(chunk)
-                                pos = chunk_end
-                                break
-                            else:
-                                # Pop nested tag
-                                tag_stack.pop()
-                                current_pos = next_end + 1
-                    
-                    if current_pos >= len(content):  # Reached end without finding closing tag
-                        break
-                    
-                    pos = max(pos + 1, current_pos)
+                chunks, _, _ = self._extract_legacy_xml_chunks(content)
         
         except Exception as e:
             logger.error(f"Error extracting XML chunks: {e}")
@@ -1509,16 +1532,11 @@ class ResponseProcessor:
 
             # Get available functions from tool registry
             logger.debug(f"🔍 Looking up tool function: {function_name}")
-            available_functions = self.tool_registry.get_available_functions()
-            # logger.debug(f"📋 Available functions: {list(available_functions.keys())}")
-
-            # Look up the function by name
-            tool_fn = available_functions.get(function_name)
+            tool_fn = self.tool_registry.get_function(function_name)
             if not tool_fn:
                 logger.error(f"❌ Tool function '{function_name}' not found in registry")
-                # logger.error(f"❌ Available functions: {list(available_functions.keys())}")
                 span.end(status_message="tool_not_found", level="ERROR")
-                return ToolResult(success=False, output=f"Tool function '{function_name}' not found. Available: {list(available_functions.keys())}")
+                return ToolResult(success=False, output=f"Tool function '{function_name}' not found. Available: {list(self.tool_registry.tools.keys())}")
 
             logger.debug(f"✅ Found tool function for '{function_name}'")
             # logger.debug(f"🔧 Tool function type: {type(tool_fn)}")
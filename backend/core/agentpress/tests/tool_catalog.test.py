@@ -0,0 +1,148 @@
+import pytest
+
+from core.agentpress.tool import SchemaType, Tool, ToolResult, ToolSchema, openapi_schema
+from core.agentpress.tool_catalog import LazyTool, ToolCatalog
+from core.agentpress.tool_registry import ToolRegistry
+
+
+class _CountingTool(Tool):
+    constructed = 0
+
+    def __init__(self, greeting: str = "hello"):
+        super().__init__()
+        type(self).constructed += 1
+        self.greeting = greeting
+
+    @openapi_schema({"type": "function", "function": {"name": "greet", "parameters": {}}})
+    async def greet(self, name: str = "world") -> ToolResult:
+        return self.success_response(f"{self.greeting} {name}")
+
+    @openapi_schema({"type": "function", "function": {"name": "wave", "parameters": {}}})
+    async def wave(self) -> ToolResult:
+        return self.success_response("wave")
+
+
+class _BrokenTool(Tool):
+    attempts = 0
+
+    def __init__(self, api_key: str):
+        type(self).attempts += 1
+        raise RuntimeError(f"invalid key {api_key}")
+
+    @openapi_schema({"type": "function", "function": {"name": "search", "parameters": {}}})
+    async def search(self) -> ToolResult:
+        return self.success_response("results")
+
+
+class _DynamicTool(Tool):
+    """Builds its schemas per instance, like the MCP wrapper."""
+
+    constructed = 0
+
+    def __init__(self, function_name: str = "dynamic"):
+        super().__init__()
+        type(self).constructed += 1
+        self.function_name = function_name
+
+    def get_schemas(self):
+        schema = {"type": "function", "function": {"name": self.function_name, "parameters": {}}}
+        return {self.function_name: [ToolSchema(schema_type=SchemaType.OPENAPI, schema=schema)]}
+
+    async def dynamic(self) -> ToolResult:
+        return self.success_response("dynamic")
+
+
+@pytest.fixture(autouse=True)
+def reset_counters():
+    _CountingTool.constructed = 0
+    _BrokenTool.attempts = 0
+    _DynamicTool.constructed = 0
+
+
+class TestToolCatalog:
+    @pytest.mark.unit
+    def test_compiles_class_schemas_once(self):
+        catalog = ToolCatalog()
+
+        spec = catalog.get(_CountingTool)
+
+        assert catalog.get(_CountingTool) is spec
+        assert spec.lazy
+        assert sorted(spec.schemas) == ["greet", "wave"]
+        assert _CountingTool.constructed == 0
+
+    @pytest.mark.unit
+    def test_tools_with_instance_schemas_are_not_lazy(self):
+        assert not ToolCatalog().get(_DynamicTool).lazy
+
+
+class TestToolRegistry:
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_construction_is_deferred_to_the_first_call(self):
+        registry = ToolRegistry()
+        registry.register_tool(_CountingTool, greeting="hi")
+
+        assert isinstance(registry.tools["greet"]["instance"], LazyTool)
+        assert len(registry.get_openapi_schemas()) == 2
+        assert _CountingTool.constructed == 0
+
+        result = await registry.get_function("greet")(name="there")
+        await registry.get_function("wave")()
+
+        assert result.output == "hi there"
+        assert _CountingTool.constructed == 1
+
+    @pytest.mark.unit
+    def test_dispatch_is_cached(self):
+        registry = ToolRegistry()
+        registry.register_tool(_CountingTool)
+
+        assert registry.get_function("greet") is registry.get_function("greet")
+        assert registry.get_function("missing") is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_replaced_tool_entry_invalidates_the_cached_callable(self):
+        registry = ToolRegistry()
+        registry.register_tool(_CountingTool)
+        original = registry.get_function("greet")
+
+        # As run.py does when it registers MCP tools at runtime
+        replacement = _CountingTool(greeting="replaced")
+        registry.tools["greet"] = {"instance": replacement, "schema": registry.tools["greet"]["schema"]}
+
+        function = registry.get_function("greet")
+        assert function is not original
+        assert (await function()).output == "replaced world"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_tools_with_instance_schemas_are_constructed_eagerly(self):
+        registry = ToolRegistry()
+        registry.register_tool(_DynamicTool)
+
+        assert _DynamicTool.constructed == 1
+        assert isinstance(registry.tools["dynamic"]["instance"], _DynamicTool)
+        assert (await registry.get_function("dynamic")()).output == "dynamic"
+
+    @pytest.mark.unit
+    def test_invalid_constructor_arguments_fail_at_registration(self):
+        registry = ToolRegistry()
+
+        with pytest.raises(TypeError):
+            registry.register_tool(_CountingTool, unknown_argument=1)
+        assert registry.tools == {}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_construction_returns_a_failed_result(self):
+        registry = ToolRegistry()
+        registry.register_tool(_BrokenTool, api_key="bad")
+
+        first = await registry.get_function("search")()
+        second = await registry.get_function("search")()
+
+        assert not first.success and not second.success
+        assert "failed to initialize" in first.output and "invalid key bad" in first.output
+        assert _BrokenTool.attempts == 1
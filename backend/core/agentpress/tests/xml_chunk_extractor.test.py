@@ -0,0 +1,135 @@
+import pytest
+
+from core.agentpress.response_processor import ResponseProcessor
+from core.agentpress.tool import Tool, ToolResult, openapi_schema
+from core.agentpress.tool_registry import ToolRegistry
+from core.agentpress.xml_tool_parser import StreamingXMLChunkExtractor
+
+
+class _NoopTrace:
+    def event(self, *args, **kwargs):
+        pass
+
+
+class _FilesTool(Tool):
+    @openapi_schema({"type": "function", "function": {"name": "create_file", "parameters": {}}})
+    async def create_file(self, file_path: str = "", file_contents: str = "") -> ToolResult:
+        return self.success_response("ok")
+
+    @openapi_schema({"type": "function", "function": {"name": "delete_file", "parameters": {}}})
+    async def delete_file(self, file_path: str = "") -> ToolResult:
+        return self.success_response("ok")
+
+
+NEW_FORMAT = (
+    'Let me write the files.\n'
+    '<function_calls>\n<invoke name="create_file">\n'
+    '<parameter name="file_path">a.py</parameter>\n'
+    '<parameter name="file_contents">x = 1 > 0</parameter>\n'
+    '</invoke>\n</function_calls>\n'
+    'And one more: <function_calls>\n<invoke name="delete_file">\n'
+    '<parameter name="file_path">b.py</parameter>\n'
+    '</invoke>\n</function_calls> done.'
+)
+
+LEGACY_FORMAT = (
+    'Let me write the files.\n'
+    '<create-file file_path="a.py">x = 1 > 0</create-file>\n'
+    'Now <delete-file file_path="b.py"></delete-file> and '
+    '<create-file file_path="c.py">print("a < b")</create-file> done.'
+)
+
+
+def _deltas(content: str, size: int):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class TestStreamingXMLChunkExtractor:
+    """Streamed extraction must find the same chunks as a full reparse."""
+
+    @pytest.fixture
+    def processor(self):
+        registry = ToolRegistry()
+        registry.register_tool(_FilesTool)
+        return ResponseProcessor(registry, add_message_callback=None, trace=_NoopTrace())
+
+    def _stream(self, processor, content: str, delta_size: int, initial_content: str = ""):
+        extractor = StreamingXMLChunkExtractor(initial_content, legacy_extractor=processor._extract_legacy_xml_chunks)
+        chunks = []
+        for delta in _deltas(content, delta_size):
+            chunks.extend(extractor.feed(delta))
+        return chunks
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("delta_size", [1, 3, 7, 16, 1000])
+    def test_function_calls_format(self, processor, delta_size):
+        chunks = self._stream(processor, NEW_FORMAT, delta_size)
+        assert chunks == processor._extract_xml_chunks(NEW_FORMAT)
+        assert len(chunks) == 2
+        assert all(chunk.startswith('<function_calls>') and chunk.endswith('</function_calls>') for chunk in chunks)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("delta_size", [1, 3, 7, 16, 1000])
+    def test_legacy_format(self, processor, delta_size):
+        chunks = self._stream(processor, LEGACY_FORMAT, delta_size)
+        assert chunks == processor._extract_xml_chunks(LEGACY_FORMAT)
+        assert chunks == [
+            '<create-file file_path="a.py">x = 1 > 0</create-file>',
+            '<delete-file file_path="b.py"></delete-file>',
+            '<create-file file_path="c.py">print("a < b")</create-file>',
+        ]
+
+    @pytest.mark.unit
+    def test_legacy_chunk_is_returned_once(self, processor):
+        extractor = StreamingXMLChunkExtractor(legacy_extractor=processor._extract_legacy_xml_chunks)
+        assert extractor.feed('<delete-file file_path="b.py"></delete-file>') == ['<delete-file file_path="b.py"></delete-file>']
+        assert extractor.feed(' more text > with brackets') == []
+
+    @pytest.mark.unit
+    def test_legacy_tags_inside_function_calls_are_ignored(self, processor):
+        content = (
+            '<function_calls>\n<invoke name="create_file">\n'
+            '<parameter name="file_contents"><delete-file></delete-file></parameter>\n'
+            '</invoke>\n</function_calls>'
+        )
+        chunks = self._stream(processor, content, 5)
+        assert chunks == [content]
+
+    @pytest.mark.unit
+    def test_initial_content_is_extracted_on_first_feed(self, processor):
+        legacy = '<delete-file file_path="b.py"></delete-file>'
+        extractor = StreamingXMLChunkExtractor(legacy, legacy_extractor=processor._extract_legacy_xml_chunks)
+        assert extractor.feed(" next") == [legacy]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("delta_size", [1, 5, 64])
+    def test_open_legacy_tag_is_not_rescanned_per_delta(self, processor, delta_size):
+        body = '<div class="row"><p>cell</p></div>\n' * 200
+        content = f'Writing it now. <create-file file_path="index.html">{body}</create-file> done.'
+        scans = []
+
+        def counting_extractor(text):
+            scans.append(len(text))
+            return processor._extract_legacy_xml_chunks(text)
+
+        extractor = StreamingXMLChunkExtractor(legacy_extractor=counting_extractor)
+        chunks = []
+        for delta in _deltas(content, delta_size):
+            chunks.extend(extractor.feed(delta))
+
+        assert chunks == processor._extract_xml_chunks(content)
+        # Once the tag is open the extractor only runs again when its end tag arrives
+        assert sum(1 for length in scans if length > len('<create-file file_path="index.html">')) <= 2
+
+    @pytest.mark.unit
+    def test_nested_legacy_tags_still_complete(self, processor):
+        content = '<create-file file_path="a.md">see <create-file>x</create-file> here</create-file>'
+        assert self._stream(processor, content, 3) == [content]
+
+    @pytest.mark.unit
+    def test_without_legacy_extractor_only_function_calls_are_found(self):
+        chunks = []
+        extractor = StreamingXMLChunkExtractor()
+        for delta in _deltas(LEGACY_FORMAT + NEW_FORMAT, 4):
+            chunks.extend(extractor.feed(delta))
+        assert len(chunks) == 2
@@ -10,6 +10,8 @@ from core.agentpress.prompt_caching import apply_anthropic_caching_strategy, val
 from core.agentpress.tool import Tool
 from core.agentpress.tool_registry import ToolRegistry
 from core.agentpress.context_manager import ContextManager
+from core.agentpress.message_cache import ThreadMessageCache
+from core.agentpress.thread_run_state import thread_run_state
 from core.agentpress.response_processor import ResponseProcessor, ProcessorConfig
 from core.agentpress.error_processor import ErrorProcessor
 from core.services.supabase import DBConnection
@@ -28,6 +30,8 @@ class ThreadManager:
     def __init__(self, trace: Optional[StatefulTraceClient] = None, agent_config: Optional[dict] = None):
         self.db = DBConnection()
         self.tool_registry = ToolRegistry()
+        self.message_cache = ThreadMessageCache()
+        self._account_ids: Dict[str, str] = {}
         
         self.trace = trace
         if not self.trace:
@@ -107,7 +111,19 @@ class ThreadManager:
             if result.data and len(result.data) > 0 and 'message_id' in result.data[0]:
                 saved_message = result.data[0]
                 
+                if is_llm_message and self.message_cache.is_loaded(thread_id):
+                    self.message_cache.add(
+                        thread_id,
+                        saved_message['message_id'],
+                        saved_message.get('created_at'),
+                        self._parse_llm_message(saved_message)
+                    )
+                
                 if type == "llm_response_end" and isinstance(content, dict):
+                    try:
+                        await thread_run_state.record_usage(thread_id, content.get("usage"), content.get("model"))
+                    except Exception as e:
+                        logger.warning(f"Failed to record run state for thread {thread_id}: {e}")
                     await self._handle_billing(thread_id, content, saved_message)
                 
                 return saved_message
@@ -118,6 +134,17 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
+    async def _get_account_id(self, thread_id: str) -> Optional[str]:
+        """Account owning the thread, looked up once per thread."""
+        if thread_id not in self._account_ids:
+            client = await self.db.client
+            thread_row = await client.table('threads').select('account_id').eq('thread_id', thread_id).limit(1).execute()
+            account_id = thread_row.data[0]['account_id'] if thread_row.data and len(thread_row.data) > 0 else None
+            if not account_id:
+                return None
+            self._account_ids[thread_id] = account_id
+        return self._account_ids[thread_id]
+
     async def _handle_billing(self, thread_id: str, content: dict, saved_message: dict):
         try:
             llm_response_id = content.get("llm_response_id", "unknown")
@@ -141,9 +168,7 @@ class ThreadManager:
             usage_type = "FALLBACK ESTIMATE" if is_fallback else ("ESTIMATED" if is_estimated else "EXACT")
             logger.info(f"💰 Usage type: {usage_type} - prompt={prompt_tokens}, completion={completion_tokens}, cache_read={cache_read_tokens}, cache_creation={cache_creation_tokens}")
             
-            client = await self.db.client
-            thread_row = await client.table('threads').select('account_id').eq('thread_id', thread_id).limit(1).execute()
-            user_id = thread_row.data[0]['account_id'] if thread_row.data and len(thread_row.data) > 0 else None
+            user_id = await self._get_account_id(thread_id)
             
             if user_id and (prompt_tokens > 0 or completion_tokens > 0):
 
@@ -155,7 +180,7 @@ class ThreadManager:
                 else:
                     logger.debug(f"❌ NO CACHE: All {prompt_tokens} tokens processed fresh")
 
-                deduct_result = await billing_integration.deduct_usage(
+                deduct_result = await billing_integration.record_usage(
                     account_id=user_id,
                     prompt_tokens=prompt_tokens,
                     completion_tokens=completion_tokens,
@@ -174,69 +199,85 @@ class ThreadManager:
             logger.error(f"Error handling billing: {str(e)}", exc_info=True)
 
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a thread."""
+        """Get all messages for a thread.
+        
+        The first call loads the whole thread; later calls only fetch rows newer than
+        the last cached message and serve the rest from the run-scoped message cache.
+        """
         logger.debug(f"Getting messages for thread {thread_id}")
         client = await self.db.client
 
         try:
-            all_messages = []
+            since = self.message_cache.get_cursor(thread_id)
+            if since is None:
+                self.message_cache.reset(thread_id)
+
             batch_size = 1000
             offset = 0
+            new_rows = 0
             
             while True:
-                result = await client.table('messages').select('message_id, type, content, metadata').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
+                query = client.table('messages').select('message_id, type, content, metadata, created_at').eq('thread_id', thread_id).eq('is_llm_message', True)
+                if since is not None:
+                    # gte (not gt) so rows sharing the cursor timestamp are not lost; duplicates are skipped by message_id
+                    query = query.gte('created_at', since)
+                result = await query.order('created_at').range(offset, offset + batch_size - 1).execute()
                 
                 if not result.data:
                     break
-                    
-                all_messages.extend(result.data)
+                
+                for item in result.data:
+                    if self.message_cache.add(thread_id, item['message_id'], item.get('created_at'), self._parse_llm_message(item)):
+                        new_rows += 1
+                
                 if len(result.data) < batch_size:
                     break
                 offset += batch_size
 
-            if not all_messages:
-                return []
+            if since is not None:
+                logger.debug(f"Incremental message fetch for thread {thread_id}: {new_rows} new rows")
 
-            messages = []
-            for item in all_messages:
-                # Check if this message has a compressed version in metadata
-                content = item['content']
-                metadata = item.get('metadata', {})
-                is_compressed = False
-                
-                # If compressed, use compressed_content for LLM instead of full content
-                if isinstance(metadata, dict) and metadata.get('compressed'):
-                    compressed_content = metadata.get('compressed_content')
-                    if compressed_content:
-                        content = compressed_content
-                        is_compressed = True
-                        # logger.debug(f"Using compressed content for message {item['message_id']}")
-                
-                # Parse content and add message_id
-                if isinstance(content, str):
-                    try:
-                        parsed_item = json.loads(content)
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        # If compressed, content is a plain string (not JSON) - this is expected
-                        if is_compressed:
-                            messages.append({
-                                'role': 'user',
-                                'content': content,
-                                'message_id': item['message_id']
-                            })
-                        else:
-                            logger.error(f"Failed to parse message: {content[:100]}")
-                else:
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
-
-            return messages
+            return self.message_cache.get_messages(thread_id)
 
         except Exception as e:
+            self.message_cache.invalidate(thread_id)
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
+
+    def _parse_llm_message(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a `messages` row into an LLM message, preferring compressed content."""
+        # Check if this message has a compressed version in metadata
+        content = item['content']
+        metadata = item.get('metadata', {})
+        is_compressed = False
+        
+        # If compressed, use compressed_content for LLM instead of full content
+        if isinstance(metadata, dict) and metadata.get('compressed'):
+            compressed_content = metadata.get('compressed_content')
+            if compressed_content:
+                content = compressed_content
+                is_compressed = True
+        
+        # Parse content and add message_id
+        if isinstance(content, str):
+            try:
+                parsed_item = json.loads(content)
+                parsed_item['message_id'] = item['message_id']
+                return parsed_item
+            except json.JSONDecodeError:
+                # If compressed, content is a plain string (not JSON) - this is expected
+                if is_compressed:
+                    return {
+                        'role': 'user',
+                        'content': content,
+                        'message_id': item['message_id']
+                    }
+                logger.error(f"Failed to parse message: {content[:100]}")
+                return None
+        
+        content = dict(content)
+        content['message_id'] = item['message_id']
+        return content
     
     async def run_thread(
         self,
@@ -323,6 +364,8 @@ class ThreadManager:
             skip_fetch = False
             need_compression = False
             estimated_total_tokens = None  # Will be passed to response processor to avoid recalculation
+            run_state = None
+            compression_ran = False
             
             # CRITICAL: Check if this is an auto-continue iteration FIRST (before any token counting)
             is_auto_continue = auto_continue_state.get('count', 0) > 0
@@ -333,24 +376,12 @@ class ThreadManager:
                     from litellm.utils import token_counter
                     client = await self.db.client
                     
-                    # Query last llm_response_end message from messages table (already stored there!)
-                    last_usage_result = await client.table('messages')\
-                        .select('content')\
-                        .eq('thread_id', thread_id)\
-                        .eq('type', 'llm_response_end')\
-                        .order('created_at', desc=True)\
-                        .limit(1)\
-                        .maybe_single()\
-                        .execute()
+                    # Last usage, model and cache flags come from the thread's run state (one Redis read)
+                    run_state = await thread_run_state.get(thread_id)
                     
-                    if last_usage_result.data:
-                        llm_end_content = last_usage_result.data.get('content', {})
-                        if isinstance(llm_end_content, str):
-                            import json
-                            llm_end_content = json.loads(llm_end_content)
-                        
-                        usage = llm_end_content.get('usage', {})
-                        stored_model = llm_end_content.get('model', '')
+                    if run_state['usage']:
+                        usage = run_state['usage']
+                        stored_model = run_state['model'] or ''
                         
                         # Normalize model names for comparison (strip any provider prefix like anthropic/, openai/, google/, etc.)
                         def normalize_model_name(model: str) -> str:
@@ -436,7 +467,7 @@ class ThreadManager:
                         else:
                             logger.debug(f"Fast check skipped - usage: {bool(usage)}, model_match: {normalized_stored == normalized_current}")
                     else:
-                        logger.debug(f"Fast check skipped - no last llm_response_end message found")
+                        logger.debug(f"Fast check skipped - no last llm_response_end usage recorded")
                 except Exception as e:
                     logger.debug(f"Fast path check failed, falling back to full fetch: {e}")
             
@@ -460,7 +491,8 @@ class ThreadManager:
                 elif need_compression:
                     # We know we're over threshold, compress now
                     logger.info(f"Applying context compression on {len(messages)} messages")
-                    context_manager = ContextManager()
+                    compression_ran = True
+                    context_manager = ContextManager(message_cache=self.message_cache)
                     compressed_messages = await context_manager.compress_messages(
                         messages, llm_model, max_tokens=llm_max_tokens, 
                         actual_total_tokens=estimated_total_tokens,  # Use estimated from fast check!
@@ -472,7 +504,8 @@ class ThreadManager:
                 else:
                     # First turn or no fast path data: Run compression check
                     logger.debug(f"Running compression check on {len(messages)} messages")
-                    context_manager = ContextManager()
+                    compression_ran = True
+                    context_manager = ContextManager(message_cache=self.message_cache)
                     compressed_messages = await context_manager.compress_messages(
                         messages, llm_model, max_tokens=llm_max_tokens, 
                         actual_total_tokens=None,
@@ -485,16 +518,12 @@ class ThreadManager:
             force_rebuild = False
             if ENABLE_PROMPT_CACHING:
                 try:
-                    client = await self.db.client
-                    result = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
-                    if result.data:
-                        metadata = result.data.get('metadata', {})
-                        if metadata.get('cache_needs_rebuild'):
-                            force_rebuild = True
+                    # Compression in this iteration may have just set the flag; otherwise the
+                    # run state read above already tells us whether there is one to consume
+                    if compression_ran or run_state is None or run_state['cache_needs_rebuild']:
+                        force_rebuild = await thread_run_state.consume_cache_rebuild(thread_id)
+                        if force_rebuild:
                             logger.info("🔄 Rebuilding cache due to compression/model change")
-                            # Clear the flag
-                            metadata['cache_needs_rebuild'] = False
-                            await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
                 except Exception as e:
                     logger.debug(f"Failed to check cache_needs_rebuild flag: {e}")
             
@@ -506,7 +535,8 @@ class ThreadManager:
                     messages, 
                     llm_model,
                     thread_id=thread_id,
-                    force_recalc=force_rebuild
+                    force_recalc=force_rebuild,
+                    run_state=run_state
                 )
                 prepared_messages = validate_cache_blocks(prepared_messages, llm_model)
             else:
@@ -0,0 +1,165 @@
+"""
+Per-thread run state held in Redis.
+
+Before every LLM call ThreadManager used to query the latest llm_response_end
+message for token usage, read `threads.metadata` for the cache rebuild flag and
+write it back, and the prompt caching code did its own read-modify-write of the
+same metadata blob for the cache threshold. That is 4-6 sequential Supabase
+round trips per iteration, and concurrent writers of `threads.metadata` could
+overwrite each other's changes.
+
+The state now lives in one Redis hash per thread (`thread_run_state:{id}`):
+
+- usage / model: usage of the last llm_response_end, written when it is saved
+- cache_config: the stored prompt cache threshold (see prompt_caching)
+- cache_needs_rebuild: set by context compression, consumed atomically
+- hydrated: "1" once the fields stored in the database have been loaded
+
+Each field is updated on its own, so writers never clobber each other. A
+thread whose record isn't marked hydrated (older threads, after expiry, or a
+record a writer created first) is hydrated once from the database.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from core.services import redis
+from core.services.supabase import DBConnection
+from core.utils.config import config
+from core.utils.logger import logger
+
+KEY_PREFIX = "thread_run_state:"
+HYDRATED_FIELD = "hydrated"
+
+# Returns the previous flag and clears it in one step
+_CONSUME_REBUILD_SCRIPT = """
+local value = redis.call('HGET', KEYS[1], 'cache_needs_rebuild')
+if value == '1' then
+    redis.call('HSET', KEYS[1], 'cache_needs_rebuild', '0')
+end
+return value
+"""
+
+
+def _key(thread_id: str) -> str:
+    return f"{KEY_PREFIX}{thread_id}"
+
+
+def _ttl() -> int:
+    return int(config.THREAD_RUN_STATE_TTL_SECONDS or 7 * 24 * 3600)
+
+
+def _loads(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ThreadRunStateStore:
+    """Reads and atomically updates the run state of a thread."""
+
+    def __init__(self):
+        self.db = DBConnection()
+
+    async def get(self, thread_id: str) -> Dict[str, Any]:
+        """The thread's run state: usage, model, cache_config and cache_needs_rebuild."""
+        client = await redis.get_client()
+        raw = await client.hgetall(_key(thread_id))
+        if raw.get(HYDRATED_FIELD) != '1':
+            raw = await self._hydrate(thread_id)
+        return {
+            'usage': _loads(raw.get('usage')),
+            'model': raw.get('model') or None,
+            'cache_config': _loads(raw.get('cache_config')),
+            'cache_needs_rebuild': raw.get('cache_needs_rebuild') == '1',
+        }
+
+    async def _hydrate(self, thread_id: str) -> Dict[str, str]:
+        """Fill in the record from the database for a thread whose record isn't hydrated yet."""
+        client = await self.db.client
+        last_usage_result, thread_result = await asyncio.gather(
+            client.table('messages')
+                .select('content')
+                .eq('thread_id', thread_id)
+                .eq('type', 'llm_response_end')
+                .order('created_at', desc=True)
+                .limit(1)
+                .maybe_single()
+                .execute(),
+            client.table('threads').select('metadata').eq('thread_id', thread_id).maybe_single().execute(),
+        )
+
+        fields: Dict[str, str] = {'cache_needs_rebuild': '0'}
+        if last_usage_result and last_usage_result.data:
+            llm_end_content = last_usage_result.data.get('content', {})
+            if isinstance(llm_end_content, str):
+                llm_end_content = json.loads(llm_end_content)
+            if llm_end_content.get('usage'):
+                fields['usage'] = json.dumps(llm_end_content['usage'])
+                fields['model'] = llm_end_content.get('model') or ''
+        thread_row = thread_result.data if thread_result and thread_result.data else {}
+        metadata = thread_row.get('metadata') or {}
+        if metadata.get('cache_config'):
+            fields['cache_config'] = json.dumps(metadata['cache_config'])
+        if metadata.get('cache_needs_rebuild'):
+            fields['cache_needs_rebuild'] = '1'
+
+        # HSETNX: never overwrite a field a concurrent writer already set
+        redis_client = await redis.get_client()
+        key = _key(thread_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for field, value in fields.items():
+                pipe.hsetnx(key, field, value)
+            pipe.hset(key, HYDRATED_FIELD, '1')
+            pipe.expire(key, _ttl())
+            pipe.hgetall(key)
+            results = await pipe.execute()
+        logger.debug(f"Hydrated run state for thread {thread_id} from the database")
+        return results[-1]
+
+    async def _set_fields(self, thread_id: str, fields: Dict[str, str]):
+        client = await redis.get_client()
+        key = _key(thread_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, _ttl())
+            await pipe.execute()
+
+    async def record_usage(self, thread_id: str, usage: Optional[Dict[str, Any]], model: Optional[str]):
+        """Store the usage of the latest llm_response_end."""
+        if not usage:
+            return
+        await self._set_fields(thread_id, {'usage': json.dumps(usage), 'model': model or ''})
+
+    async def store_cache_config(self, thread_id: str, cache_config: Dict[str, Any]):
+        await self._set_fields(thread_id, {'cache_config': json.dumps(cache_config)})
+
+    async def mark_cache_rebuild(self, thread_id: str):
+        """Flag that the prompt cache must be rebuilt on the next LLM call."""
+        await self._set_fields(thread_id, {'cache_needs_rebuild': '1'})
+
+    async def consume_cache_rebuild(self, thread_id: str) -> bool:
+        """Return whether a rebuild was flagged, clearing the flag atomically."""
+        client = await redis.get_client()
+        consume = client.register_script(_CONSUME_REBUILD_SCRIPT)
+        return await consume(keys=[_key(thread_id)]) == '1'
+
+
+def build_cache_config(threshold: int, model: str, reason: str, turn: Optional[int] = None,
+                       system_prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        'threshold': threshold,
+        'model': model,
+        'system_prompt_tokens': system_prompt_tokens,
+        'last_calc_turn': turn,
+        'last_calc_reason': reason,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+thread_run_state = ThreadRunStateStore()
@@ -0,0 +1,319 @@
+"""
+Async token counting for AgentPress.
+
+ContextManager delegates counting to the TokenCountingService defined here:
+- A local tokenizer fast path (LiteLLM's token_counter)
+- Remote provider counting (Anthropic count_tokens, Bedrock CountTokens) that never
+  blocks the event loop: Anthropic uses the async client and the boto3 Bedrock call
+  runs in a small dedicated executor
+- A process-wide cap on concurrent remote counts
+- A policy deciding when the remote round trip is worth its latency:
+    always          - every count goes to the provider (most accurate)
+    near_threshold  - remote only when the local count is close to the caller's threshold
+    never           - local tokenizer only (fastest)
+
+Backends are pluggable via TokenCountingService.register_backend().
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import List, Dict, Any, Optional
+
+from litellm.utils import token_counter
+from core.utils.config import config
+from core.utils.logger import logger
+
+
+class TokenCountPolicy(str, Enum):
+    """When to use a remote (provider) token count instead of the local tokenizer."""
+    ALWAYS = "always"
+    NEAR_THRESHOLD = "near_threshold"
+    NEVER = "never"
+
+
+class TokenCountingBackend:
+    """Base class for token counting backends."""
+
+    name = "base"
+
+    def supports(self, model: str) -> bool:
+        """Whether this backend can count tokens for the given model."""
+        return False
+
+    async def count(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        """Count input tokens for messages (+ optional system prompt)."""
+        raise NotImplementedError
+
+
+class LocalTokenCountingBackend(TokenCountingBackend):
+    """LiteLLM tokenizer. CPU-only, used as fast path and fallback for every model."""
+
+    name = "local"
+
+    def supports(self, model: str) -> bool:
+        return True
+
+    async def count(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        if system_prompt:
+            return token_counter(model=model, messages=[system_prompt] + messages)
+        return token_counter(model=model, messages=messages)
+
+
+class AnthropicTokenCountingBackend(TokenCountingBackend):
+    """Anthropic's official count_tokens endpoint via the async client."""
+
+    name = "anthropic"
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        """Lazy initialization of the async Anthropic client."""
+        if self._client is None:
+            api_key = os.environ.get("ANTHROPIC_API_KEY")
+            if api_key:
+                from anthropic import AsyncAnthropic
+                self._client = AsyncAnthropic(api_key=api_key)
+        return self._client
+
+    def supports(self, model: str) -> bool:
+        model_lower = model.lower()
+        return ('claude' in model_lower or 'anthropic' in model_lower) and self._get_client() is not None
+
+    async def count(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        client = self._get_client()
+
+        # Strip provider prefix
+        clean_model = model.split('/')[-1] if '/' in model else model
+
+        # Clean messages - only role and content
+        clean_messages = []
+        for msg in messages:
+            if msg.get('role') == 'system':
+                continue  # System passed separately
+            clean_messages.append({
+                'role': msg.get('role'),
+                'content': msg.get('content')
+            })
+
+        # Build parameters
+        count_params = {'model': clean_model, 'messages': clean_messages}
+        if system_prompt and isinstance(system_prompt, dict) and system_prompt.get('content'):
+            count_params['system'] = system_prompt.get('content')
+
+        result = await client.messages.count_tokens(**count_params)
+        return result.input_tokens
+
+
+class BedrockTokenCountingBackend(TokenCountingBackend):
+    """Bedrock CountTokens API. boto3 is synchronous, so calls run in a dedicated executor."""
+
+    name = "bedrock"
+
+    # Map profile IDs to model IDs
+    MODEL_ID_MAPPING = {
+        "heol2zyy5v48": "anthropic.claude-3-5-haiku-20241022-v1:0",
+        "few7z4l830xh": "anthropic.claude-3-5-sonnet-20241022-v2:0",
+        "tyj1ks3nj9qf": "anthropic.claude-sonnet-4-20250514-v1:0",
+    }
+    DEFAULT_MODEL_ID = "anthropic.claude-3-5-haiku-20241022-v1:0"
+
+    def __init__(self, max_workers: int = 4):
+        self._client = None
+        self._client_failed = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock-count-tokens")
+
+    def _get_client(self):
+        """Lazy initialization of Bedrock client."""
+        if self._client is None and not self._client_failed:
+            try:
+                import boto3
+                self._client = boto3.client('bedrock-runtime', region_name='us-west-2')
+            except Exception as e:
+                self._client_failed = True
+                logger.debug(f"Could not initialize Bedrock client: {e}")
+        return self._client
+
+    def supports(self, model: str) -> bool:
+        return 'bedrock' in model.lower() and self._get_client() is not None
+
+    @staticmethod
+    def _clean_content(content: Any) -> List[Dict[str, Any]]:
+        """
+        Convert Anthropic format to Bedrock Converse API format.
+        Converts cache_control -> cachePoint to preserve cache overhead in token counts.
+        """
+        if isinstance(content, str):
+            return [{'text': content}]
+        elif isinstance(content, list):
+            cleaned = []
+            for block in content:
+                if isinstance(block, dict):
+                    # Extract text
+                    if 'text' in block:
+                        cleaned.append({'text': block['text']})
+                        # Convert cache_control to cachePoint (separate block)
+                        if 'cache_control' in block:
+                            cleaned.append({'cachePoint': {'type': 'default'}})
+            return cleaned if cleaned else [{'text': str(content)}]
+        return [{'text': str(content)}]
+
+    def _resolve_model_id(self, model: str) -> str:
+        # Extract profile ID from ARN
+        if "application-inference-profile" in model:
+            profile_id = model.split("/")[-1]
+            return self.MODEL_ID_MAPPING.get(profile_id, self.DEFAULT_MODEL_ID)
+        return self.DEFAULT_MODEL_ID
+
+    async def count(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        client = self._get_client()
+
+        # Format messages for Bedrock
+        bedrock_messages = []
+        system_content = None
+
+        for msg in messages:
+            if msg.get('role') == 'system':
+                system_content = self._clean_content(msg.get('content'))
+                continue
+
+            bedrock_messages.append({
+                'role': msg.get('role'),
+                'content': self._clean_content(msg.get('content'))
+            })
+
+        # Build input
+        input_to_count = {'messages': bedrock_messages}
+        if system_content:
+            input_to_count['system'] = system_content
+        elif system_prompt:
+            input_to_count['system'] = self._clean_content(system_prompt.get('content'))
+
+        model_id = self._resolve_model_id(model)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self._executor,
+            lambda: client.count_tokens(modelId=model_id, input={'converse': input_to_count})
+        )
+        return response['inputTokens']
+
+
+class TokenCountingService:
+    """Routes token counts to the local tokenizer or a remote backend according to policy.
+
+    Remote counts share a process-wide semaphore and a timeout; any remote failure
+    falls back to the local count so counting never fails the caller.
+    """
+
+    def __init__(
+        self,
+        local_backend: Optional[TokenCountingBackend] = None,
+        remote_backends: Optional[List[TokenCountingBackend]] = None,
+        policy: Optional[TokenCountPolicy] = None,
+        near_threshold_ratio: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        remote_timeout: float = 10.0,
+    ):
+        self.local_backend = local_backend or LocalTokenCountingBackend()
+        self.remote_backends = remote_backends if remote_backends is not None else [
+            AnthropicTokenCountingBackend(),
+            BedrockTokenCountingBackend(),
+        ]
+        self._policy = policy
+        self._near_threshold_ratio = near_threshold_ratio
+        self._max_concurrency = max_concurrency
+        self.remote_timeout = remote_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def policy(self) -> TokenCountPolicy:
+        if self._policy is None:
+            try:
+                self._policy = TokenCountPolicy((config.TOKEN_COUNT_REMOTE_POLICY or TokenCountPolicy.NEAR_THRESHOLD.value).lower())
+            except ValueError:
+                logger.warning(f"Invalid TOKEN_COUNT_REMOTE_POLICY '{config.TOKEN_COUNT_REMOTE_POLICY}', using near_threshold")
+                self._policy = TokenCountPolicy.NEAR_THRESHOLD
+        return self._policy
+
+    @property
+    def near_threshold_ratio(self) -> float:
+        if self._near_threshold_ratio is None:
+            self._near_threshold_ratio = int(config.TOKEN_COUNT_REMOTE_THRESHOLD_PERCENT or 85) / 100
+        return self._near_threshold_ratio
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            if self._max_concurrency is None:
+                self._max_concurrency = int(config.TOKEN_COUNT_MAX_CONCURRENCY or 8)
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    def register_backend(self, backend: TokenCountingBackend, first: bool = True):
+        """Add a remote backend. By default it takes precedence over existing ones."""
+        if first:
+            self.remote_backends.insert(0, backend)
+        else:
+            self.remote_backends.append(backend)
+
+    def get_remote_backend(self, model: str) -> Optional[TokenCountingBackend]:
+        for backend in self.remote_backends:
+            if backend.supports(model):
+                return backend
+        return None
+
+    def should_count_remotely(self, local_count: int, threshold: Optional[int] = None, accurate: bool = False) -> bool:
+        """Apply the accuracy/latency policy to a local count."""
+        if accurate or self.policy == TokenCountPolicy.ALWAYS:
+            return True
+        if self.policy == TokenCountPolicy.NEVER:
+            return False
+        # near_threshold: without a threshold there is nothing to compare against, stay accurate
+        if threshold is None:
+            return True
+        return local_count >= threshold * self.near_threshold_ratio
+
+    async def count_local(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None) -> int:
+        return await self.local_backend.count(model, messages, system_prompt)
+
+    async def count(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[Dict[str, Any]] = None,
+        threshold: Optional[int] = None,
+        accurate: bool = False,
+    ) -> int:
+        """Count input tokens.
+
+        Args:
+            model: Model name
+            messages: Messages to count (system messages are allowed)
+            system_prompt: Optional system prompt passed separately
+            threshold: Token limit the caller compares against; drives the near_threshold policy
+            accurate: Force a remote count when a backend is available (e.g. billing estimates)
+        """
+        backend = self.get_remote_backend(model)
+        local_count = None
+
+        # Only pay for the local count up front when the policy needs it to decide
+        if backend is None or not (accurate or self.policy == TokenCountPolicy.ALWAYS):
+            local_count = await self.count_local(model, messages, system_prompt)
+            if backend is None or not self.should_count_remotely(local_count, threshold, accurate):
+                return local_count
+
+        try:
+            async with self._get_semaphore():
+                return await asyncio.wait_for(backend.count(model, messages, system_prompt), timeout=self.remote_timeout)
+        except asyncio.TimeoutError:
+            logger.debug(f"{backend.name} token counting timed out after {self.remote_timeout}s, using local count")
+        except Exception as e:
+            logger.debug(f"{backend.name} token counting failed, falling back to LiteLLM: {e}")
+
+        if local_count is None:
+            local_count = await self.count_local(model, messages, system_prompt)
+        return local_count
+
+
+token_counting_service = TokenCountingService()
@@ -0,0 +1,164 @@
+"""
+Process-level catalog of tool schemas and lazy tool instances.
+
+Regular tool schemas and metadata are declared with class decorators
+(`openapi_schema`, `tool_metadata`, `method_metadata`), so they are the same
+for every instance of a class. They used to be collected again by
+`Tool.__init__` for every tool of every run, and every enabled tool was
+constructed (API clients, config reads, ...) whether the run called it or not.
+
+- `ToolCatalog` compiles a class's schemas and metadata once per process; the
+  worker compiles every known tool class at startup (see tool_discovery)
+- `LazyTool` stands in for a tool instance in the registry and constructs the
+  tool on the first call to one of its functions. Its constructor arguments are
+  checked against `__init__` at registration; if construction itself fails,
+  the call returns a failed ToolResult instead of raising
+
+Tools that build their schemas per instance (MCP wrappers, dynamic tools)
+override `get_schemas`/`_register_schemas` and are still constructed eagerly.
+"""
+
+import functools
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type
+
+from core.agentpress.tool import MethodMetadata, Tool, ToolMetadata, ToolResult, ToolSchema
+from core.utils.logger import logger
+
+
+@dataclass
+class ToolSpec:
+    """Compiled schemas and metadata of a tool class.
+
+    Attributes:
+        tool_class (Type[Tool]): The tool class
+        schemas (Dict[str, List[ToolSchema]]): Schemas by method name, as Tool.get_schemas returns them
+        metadata (Optional[ToolMetadata]): Tool-level metadata
+        method_metadata (Dict[str, MethodMetadata]): Method-level metadata
+        lazy (bool): Whether the schemas are known without an instance
+        init_signature (Optional[inspect.Signature]): Signature of the constructor, if introspectable
+    """
+    tool_class: Type[Tool]
+    schemas: Dict[str, List[ToolSchema]] = field(default_factory=dict)
+    metadata: Optional[ToolMetadata] = None
+    method_metadata: Dict[str, MethodMetadata] = field(default_factory=dict)
+    lazy: bool = True
+    init_signature: Optional[inspect.Signature] = None
+
+
+def _has_static_schemas(tool_class: Type[Tool]) -> bool:
+    return tool_class.get_schemas is Tool.get_schemas and tool_class._register_schemas is Tool._register_schemas
+
+
+class ToolCatalog:
+    """Compiles tool classes once per process."""
+
+    def __init__(self):
+        self._specs: Dict[Type[Tool], ToolSpec] = {}
+
+    def get(self, tool_class: Type[Tool]) -> ToolSpec:
+        spec = self._specs.get(tool_class)
+        if spec is None:
+            spec = self._compile(tool_class)
+            self._specs[tool_class] = spec
+        return spec
+
+    def _compile(self, tool_class: Type[Tool]) -> ToolSpec:
+        spec = ToolSpec(
+            tool_class=tool_class,
+            metadata=getattr(tool_class, '__tool_metadata__', None),
+            lazy=_has_static_schemas(tool_class),
+        )
+        try:
+            spec.init_signature = inspect.signature(tool_class)
+        except (TypeError, ValueError):
+            pass
+        # Same members, in the same (name) order, as Tool.__init__ collects from an instance
+        for name, member in inspect.getmembers(tool_class, predicate=callable):
+            if hasattr(member, 'tool_schemas'):
+                spec.schemas[name] = member.tool_schemas
+            if hasattr(member, '__method_metadata__'):
+                spec.method_metadata[name] = member.__method_metadata__
+        return spec
+
+    def warm_up(self, tool_classes: Iterable[Type[Tool]]) -> int:
+        """Compile the given classes ahead of the first run. Returns the number compiled."""
+        compiled = 0
+        for tool_class in tool_classes:
+            try:
+                self.get(tool_class)
+                compiled += 1
+            except Exception as e:
+                logger.warning(f"Failed to compile tool catalog entry for {getattr(tool_class, '__name__', tool_class)}: {e}")
+        return compiled
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "classes": len(self._specs),
+            "lazy": sum(1 for spec in self._specs.values() if spec.lazy),
+        }
+
+
+class LazyTool:
+    """Registry stand-in for a tool that is constructed on first use."""
+
+    def __init__(self, spec: ToolSpec, kwargs: Dict[str, Any]):
+        # Raises TypeError for arguments the constructor would reject, as eager construction did
+        if spec.init_signature is not None:
+            spec.init_signature.bind(**kwargs)
+        self.spec = spec
+        self._kwargs = kwargs
+        self._instance: Optional[Tool] = None
+        self._error: Optional[Exception] = None
+
+    @property
+    def tool_class(self) -> Type[Tool]:
+        return self.spec.tool_class
+
+    @property
+    def constructed(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def instance(self) -> Tool:
+        """The constructed tool; raises the construction error (once per proxy, then cached)."""
+        if self._instance is None:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._instance = self.spec.tool_class(**self._kwargs)
+            except Exception as e:
+                logger.error(f"Failed to initialize tool {self.spec.tool_class.__name__}: {e}")
+                self._error = e
+                raise
+            self._kwargs = {}
+        return self._instance
+
+    def function(self, name: str) -> Callable:
+        """Callable for one of the tool's functions that constructs the tool on its first call."""
+        if self._instance is not None:
+            return getattr(self._instance, name)
+
+        @functools.wraps(getattr(self.spec.tool_class, name))
+        async def call(*args, **kwargs):
+            try:
+                instance = self.instance
+            except Exception as e:
+                return ToolResult(success=False, output=f"Tool {self.spec.tool_class.__name__} is unavailable: it failed to initialize ({e})")
+            return await getattr(instance, name)(*args, **kwargs)
+
+        return call
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes the proxy doesn't define itself
+        if name.startswith('__') or name in ('spec', '_kwargs', '_instance', '_error'):
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+    def __repr__(self) -> str:
+        state = "constructed" if self.constructed else "pending"
+        return f"<LazyTool {self.spec.tool_class.__name__} ({state})>"
+
+
+tool_catalog = ToolCatalog()
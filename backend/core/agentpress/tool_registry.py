@@ -1,5 +1,6 @@
-from typing import Dict, Type, Any, List, Optional, Callable
+from typing import Dict, Type, Any, List, Optional, Callable, Tuple
 from core.agentpress.tool import Tool, SchemaType
+from core.agentpress.tool_catalog import LazyTool, tool_catalog
 from core.utils.logger import logger
 import json
 
@@ -9,12 +10,15 @@ class ToolRegistry:
     
     Maintains a collection of tool instances and their schemas, allowing for
     selective registration of tool functions and easy access to tool capabilities.
+    Tools whose schemas are declared on the class are registered from the process
+    tool catalog and held as LazyTool proxies until one of their functions is called.
     
     Attributes:
         tools (Dict[str, Dict[str, Any]]): OpenAPI-style tools and schemas
         
     Methods:
         register_tool: Register a tool with optional function filtering
+        get_function: Get the callable for a function name
         get_tool: Get a specific tool by name
         get_openapi_schemas: Get OpenAPI schemas for function calling
     """
@@ -22,6 +26,8 @@ class ToolRegistry:
     def __init__(self):
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
+        # function name -> (tool info it was resolved from, callable)
+        self._dispatch: Dict[str, Tuple[Dict[str, Any], Callable]] = {}
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -35,10 +41,18 @@ class ToolRegistry:
         Notes:
             - If function_names is None, all functions are registered
             - Handles OpenAPI schema registration
+            - Tools with class-level schemas are constructed on first call; their
+              arguments are checked here, and a tool whose constructor then fails
+              returns a failed ToolResult from its functions
         """
         # logger.debug(f"Registering tool class: {tool_class.__name__}")
-        tool_instance = tool_class(**kwargs)
-        schemas = tool_instance.get_schemas()
+        spec = tool_catalog.get(tool_class)
+        if spec.lazy:
+            tool_instance = LazyTool(spec, kwargs)
+            schemas = spec.schemas
+        else:
+            tool_instance = tool_class(**kwargs)
+            schemas = tool_instance.get_schemas()
         
         # logger.debug(f"Available schemas for {tool_class.__name__}: {list(schemas.keys())}")
         
@@ -50,28 +64,51 @@ class ToolRegistry:
                     if schema.schema_type == SchemaType.OPENAPI:
                         self.tools[func_name] = {
                             "instance": tool_instance,
-                            "schema": schema
+                            "schema": schema,
+                            "class": tool_class
                         }
                         registered_openapi += 1
                         # logger.debug(f"Registered OpenAPI function {func_name} from {tool_class.__name__}")
         
         # logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions")
 
+    def get_function(self, function_name: str) -> Optional[Callable]:
+        """Get the implementation of a tool function.
+        
+        Resolved once per function and reused; entries written to `tools`
+        directly (e.g. MCP tools registered at runtime) are picked up because
+        the cached callable is checked against the current tool info.
+        
+        Args:
+            function_name: Name of the tool function
+            
+        Returns:
+            The callable, or None if the function is not registered
+        """
+        tool_info = self.tools.get(function_name)
+        if tool_info is None:
+            return None
+        cached = self._dispatch.get(function_name)
+        if cached is not None and cached[0] is tool_info:
+            return cached[1]
+        tool_instance = tool_info['instance']
+        if isinstance(tool_instance, LazyTool):
+            function = tool_instance.function(function_name)
+        else:
+            function = getattr(tool_instance, function_name)
+        self._dispatch[function_name] = (tool_info, function)
+        return function
+
     def get_available_functions(self) -> Dict[str, Callable]:
         """Get all available tool functions.
         
         Returns:
             Dict mapping function names to their implementations
         """
-        available_functions = {}
-        
-        # Get OpenAPI tool functions
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            function_name = tool_name
-            function = getattr(tool_instance, function_name)
-            available_functions[function_name] = function
-            
+        available_functions = {
+            function_name: self.get_function(function_name)
+            for function_name in self.tools
+        }
         # logger.debug(f"Retrieved {len(available_functions)} available functions")
         return available_functions
 
@@ -7,7 +7,7 @@ the XML format with structured function_calls blocks.
 
 import re
 import xml.etree.ElementTree as ET
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 import json
 import logging
@@ -220,6 +220,137 @@ class XMLToolParser:
         return True, None
 
 
+class StreamingXMLChunkExtractor:
+    """
+    Incremental extractor for complete <function_calls> blocks in a streamed response.
+    
+    Each delta is scanned exactly once: outside a block only a short tail (shorter than
+    the start tag) is kept to catch tags split across deltas; inside a block the content
+    is collected in parts and joined once when the closing tag arrives. Total work is
+    linear in the response length, unlike rescanning the accumulated buffer per delta.
+    
+    Legacy per-tool tags (`<create-file>...</create-file>`) are handled by an optional
+    `legacy_extractor`, which is run over the text that is not part of a
+    <function_calls> block whenever a delta could have closed a tag. It returns the
+    chunks it found, the offset from which the text must be kept for later deltas
+    (an unclosed tag, or a tail that may hold the start of one) and the end tag an
+    unclosed tag waits for. While a tag is open, only the new text is searched for
+    that end tag, so a long legacy tool call is not rescanned on every delta.
+    """
+    
+    START_TAG = '<function_calls>'
+    END_TAG = '</function_calls>'
+    
+    def __init__(
+        self,
+        initial_content: str = "",
+        legacy_extractor: Optional[Callable[[str], Tuple[List[str], int, Optional[str]]]] = None,
+    ):
+        """
+        Args:
+            initial_content: Content already streamed (e.g. on auto-continue); complete
+                blocks found in it are returned by the next feed() call.
+            legacy_extractor: Fallback for the legacy tag format, used while no
+                <function_calls> block is open or was completed by the same delta.
+        """
+        self._in_block = False
+        self._parts: List[str] = []
+        self._tail = ""
+        self._legacy_extractor = legacy_extractor
+        self._legacy_buffer = ""
+        # End tag the unclosed legacy tag at the start of the buffer waits for, and how far it was searched
+        self._legacy_end_tag: Optional[str] = None
+        self._legacy_searched = 0
+        self._ready: List[str] = self._scan(initial_content) if initial_content else []
+        if not self._ready:
+            self._ready = self._feed_legacy(initial_content)
+    
+    @property
+    def in_block(self) -> bool:
+        """Whether an opened <function_calls> block is still waiting for its closing tag."""
+        return self._in_block
+    
+    def feed(self, delta: str) -> List[str]:
+        """Consume a content delta and return the blocks completed by it."""
+        chunks = self._scan(delta) if delta else []
+        if chunks:
+            self._reset_legacy()
+        else:
+            chunks = self._feed_legacy(delta)
+        if self._ready:
+            chunks = self._ready + chunks
+            self._ready = []
+        return chunks
+    
+    def _reset_legacy(self):
+        self._legacy_buffer = ""
+        self._legacy_end_tag = None
+        self._legacy_searched = 0
+    
+    def _feed_legacy(self, text: str) -> List[str]:
+        if self._legacy_extractor is None or not text:
+            return []
+        if self._in_block:
+            # The new format is in use; legacy tags are only looked for outside of it
+            self._reset_legacy()
+            return []
+        self._legacy_buffer += text
+        if '>' not in text:
+            # No tag can have been closed by this delta
+            return []
+        if self._legacy_end_tag is not None:
+            # Only the end tag of the open tag can complete a chunk; the end tag may straddle the previous delta
+            search_from = max(0, self._legacy_searched - len(self._legacy_end_tag) + 1)
+            self._legacy_searched = len(self._legacy_buffer)
+            if self._legacy_buffer.find(self._legacy_end_tag, search_from) == -1:
+                return []
+        chunks, keep_from, end_tag = self._legacy_extractor(self._legacy_buffer)
+        remaining = self._legacy_buffer[keep_from:]
+        for chunk in chunks:
+            remaining = remaining.replace(chunk, "", 1)
+        self._legacy_buffer = remaining
+        self._legacy_end_tag = end_tag
+        self._legacy_searched = len(remaining)
+        return chunks
+    
+    def _scan(self, text: str) -> List[str]:
+        chunks = []
+        start_len = len(self.START_TAG)
+        end_len = len(self.END_TAG)
+        
+        while text:
+            window = self._tail + text
+            
+            if not self._in_block:
+                start_pos = window.find(self.START_TAG)
+                if start_pos == -1:
+                    self._tail = window[-(start_len - 1):]
+                    break
+                # The start tag may begin inside the tail; everything before it is plain text
+                self._in_block = True
+                self._parts = [self.START_TAG]
+                self._tail = ""
+                text = window[start_pos + start_len:]
+                continue
+            
+            end_pos = window.find(self.END_TAG)
+            if end_pos == -1:
+                self._parts.append(text)
+                self._tail = window[-(end_len - 1):]
+                break
+            
+            # The tail is already in _parts, so only take the remainder from text
+            consumed = end_pos + end_len - len(self._tail)
+            self._parts.append(text[:consumed])
+            chunks.append(''.join(self._parts))
+            self._in_block = False
+            self._parts = []
+            self._tail = ""
+            text = text[consumed:]
+        
+        return chunks
+
+
 # Convenience function for quick parsing
 def parse_xml_tool_calls(content: str) -> List[XMLToolCall]:
     """
@@ -17,7 +17,7 @@ from .config import (
     TIERS,
     CREDITS_PER_DOLLAR
 )
-from .credit_manager import credit_manager
+from .credit_manager import credit_manager, invalidate_balance_cache
 from .webhook_service import webhook_service
 from .subscription_service import subscription_service
 from .trial_service import trial_service
@@ -1691,7 +1691,7 @@ async def sync_revenuecat_customer(
         result = await revenuecat_service.sync_customer_info(account_id, customer_info)
         
         await Cache.invalidate(f"subscription_tier:{account_id}")
-        await Cache.invalidate(f"credit_balance:{account_id}")
+        await invalidate_balance_cache(account_id)
         await Cache.invalidate(f"credit_summary:{account_id}")
         
         return result
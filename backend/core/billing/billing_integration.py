@@ -2,6 +2,7 @@ from decimal import Decimal
 from typing import Optional, Dict, Tuple, List
 from core.billing.api import calculate_token_cost
 from core.billing.credit_manager import credit_manager
+from core.billing.usage_ledger import usage_ledger
 from core.utils.config import config, EnvMode
 from core.utils.logger import logger
 from core.services.supabase import DBConnection
@@ -19,8 +20,15 @@ class BillingIntegration:
         if config.ENV_MODE == EnvMode.LOCAL:
             return True, "Local mode", None
         
-        balance_info = await credit_manager.get_balance(account_id)
+        balance_info = await credit_manager.get_cached_balance(account_id)
         balance = Decimal(str(balance_info.get('total', 0)))
+
+        # Usage recorded but not settled yet still counts against the balance
+        if usage_ledger.enabled:
+            try:
+                balance -= await usage_ledger.reserved(account_id)
+            except Exception as e:
+                logger.warning(f"Could not read unsettled usage for {account_id}: {e}")
         
         # Block if already in debt
         if balance < 0:
@@ -31,21 +39,13 @@ class BillingIntegration:
         return True, f"Credits available: ${balance:.2f}", None
     
     @staticmethod
-    async def deduct_usage(
-        account_id: str,
+    def calculate_usage_cost(
         prompt_tokens: int,
         completion_tokens: int,
         model: str,
-        message_id: Optional[str] = None,
-        thread_id: Optional[str] = None,
-        cache_read_tokens: int = 0,
-        cache_creation_tokens: int = 0
-    ) -> Dict:
-        if config.ENV_MODE == EnvMode.LOCAL:
-            return {'success': True, 'cost': 0, 'new_balance': 999999}
-
+        cache_read_tokens: int = 0
+    ) -> Decimal:
         if cache_read_tokens > 0:
-            from decimal import Decimal
             non_cached_prompt_tokens = prompt_tokens - cache_read_tokens
             
             # Handle None model gracefully
@@ -63,8 +63,68 @@ class BillingIntegration:
             cost = cached_cost + non_cached_cost
             
             logger.info(f"[BILLING] Cost breakdown: cached=${cached_cost:.6f} + regular=${non_cached_cost:.6f} = total=${cost:.6f}")
-        else:
-            cost = calculate_token_cost(prompt_tokens, completion_tokens, model)
+            return cost
+        return calculate_token_cost(prompt_tokens, completion_tokens, model)
+
+    @staticmethod
+    async def record_usage(
+        account_id: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        model: str,
+        message_id: str,
+        thread_id: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0
+    ) -> Dict:
+        """
+        Charge an LLM response without blocking on the credit_accounts row lock.
+
+        The usage is queued in the usage ledger and settled in the background;
+        if the ledger is disabled or Redis is unavailable it is deducted directly.
+        """
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return {'success': True, 'cost': 0, 'new_balance': 999999}
+
+        if usage_ledger.enabled:
+            cost = BillingIntegration.calculate_usage_cost(prompt_tokens, completion_tokens, model, cache_read_tokens)
+            if cost <= 0:
+                logger.warning(f"Zero cost calculated for {model} with {prompt_tokens}+{completion_tokens} tokens")
+                return {'success': True, 'cost': 0}
+            try:
+                queued = await usage_ledger.record(account_id, message_id, thread_id, model, cost)
+                logger.info(f"[BILLING] Queued ${cost:.6f} for {model} usage of user {account_id}" if queued
+                            else f"[BILLING] Usage for message {message_id} already recorded")
+                return {'success': True, 'cost': float(cost), 'deferred': True}
+            except Exception as e:
+                logger.warning(f"[BILLING] Usage ledger unavailable, deducting directly: {e}")
+
+        return await BillingIntegration.deduct_usage(
+            account_id=account_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            model=model,
+            message_id=message_id,
+            thread_id=thread_id,
+            cache_read_tokens=cache_read_tokens,
+            cache_creation_tokens=cache_creation_tokens
+        )
+
+    @staticmethod
+    async def deduct_usage(
+        account_id: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        model: str,
+        message_id: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0
+    ) -> Dict:
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return {'success': True, 'cost': 0, 'new_balance': 999999}
+
+        cost = BillingIntegration.calculate_usage_cost(prompt_tokens, completion_tokens, model, cache_read_tokens)
         
         if cost <= 0:
             logger.warning(f"Zero cost calculated for {model} with {prompt_tokens}+{completion_tokens} tokens")
@@ -1,4 +1,4 @@
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from decimal import Decimal
 from datetime import datetime, timezone, timedelta
 from core.services.supabase import DBConnection
@@ -7,6 +7,12 @@ from core.utils.cache import Cache
 import uuid
 
 
+async def invalidate_balance_cache(account_id: str):
+    """Drop the cached balance (CreditService) and balance info (get_cached_balance) of an account."""
+    await Cache.invalidate(f"credit_balance:{account_id}")
+    await Cache.invalidate(f"credit_balance_info:{account_id}")
+
+
 class CreditManager:
     def __init__(self):
         self.db = DBConnection()
@@ -44,7 +50,7 @@ class CreditManager:
                     data = result.data
                     logger.info(f"[ATOMIC] Added ${amount} credits to {account_id} atomically")
                     
-                    await Cache.invalidate(f"credit_balance:{account_id}")
+                    await invalidate_balance_cache(account_id)
                     await Cache.invalidate(f"credit_summary:{account_id}")
                     
                     return {
@@ -177,7 +183,7 @@ class CreditManager:
         
         await client.from_('credit_ledger').insert(ledger_entry).execute()
         
-        await Cache.invalidate(f"credit_balance:{account_id}")
+        await invalidate_balance_cache(account_id)
         await Cache.invalidate(f"credit_summary:{account_id}")
         
         return {
@@ -212,7 +218,7 @@ class CreditManager:
                     
                     if data.get('success'):
                         logger.info(f"[ATOMIC] Deducted ${amount} credits from {account_id} atomically")
-                        await Cache.invalidate(f"credit_balance:{account_id}")
+                        await invalidate_balance_cache(account_id)
                         
                         return {
                             'success': True,
@@ -241,7 +247,39 @@ class CreditManager:
             "Atomic credit operations are disabled. Cannot safely deduct credits without race condition protection. "
             "Please ensure database atomic functions (atomic_use_credits) are available."
         )
-    
+
+    async def settle_usage_batch(
+        self,
+        account_id: str,
+        entries: List[Dict],
+        description: Optional[str] = None
+    ) -> Dict:
+        """Deduct a batch of usage entries ({message_id, thread_id, model, amount}) in one transaction.
+
+        Entries whose message_id was settled before are skipped, so a batch can be retried safely.
+        """
+        client = await self.db.client
+        result = await client.rpc('atomic_settle_usage_batch', {
+            'p_account_id': account_id,
+            'p_entries': entries,
+            'p_description': description or 'LLM usage'
+        }).execute()
+
+        data = result.data or {}
+        if data.get('success'):
+            logger.info(f"[ATOMIC] Settled {data.get('settled', 0)}/{len(entries)} usage entries (${data.get('amount_deducted', 0)}) for {account_id}")
+            await invalidate_balance_cache(account_id)
+            return {
+                'success': True,
+                'settled': data.get('settled', 0),
+                'amount_deducted': data.get('amount_deducted', 0),
+                'new_total': data.get('new_total', 0)
+            }
+        return {
+            'success': False,
+            'error': data.get('error', 'Unknown error')
+        }
+
     async def reset_expiring_credits(
         self,
         account_id: str,
@@ -265,7 +303,7 @@ class CreditManager:
                     if data.get('success'):
                         logger.info(f"[ATOMIC] Reset expiring credits to ${new_credits} for {account_id} atomically")
                         
-                        await Cache.invalidate(f"credit_balance:{account_id}")
+                        await invalidate_balance_cache(account_id)
                         await Cache.invalidate(f"credit_summary:{account_id}")
                         
                         return {
@@ -331,7 +369,7 @@ class CreditManager:
         
         await client.from_('credit_ledger').insert(ledger_entry).execute()
         
-        await Cache.invalidate(f"credit_balance:{account_id}")
+        await invalidate_balance_cache(account_id)
         await Cache.invalidate(f"credit_summary:{account_id}")
         
         return {
@@ -341,6 +379,15 @@ class CreditManager:
             'total_balance': float(new_total)
         }
     
+    async def get_cached_balance(self, account_id: str) -> Dict:
+        """Balance for hot-path credit checks; invalidated whenever credits change through this manager."""
+        # Not `credit_balance:`, which CreditService.get_balance caches as a plain string
+        return await Cache.get_or_set(
+            f"credit_balance_info:{account_id}",
+            lambda: self.get_balance(account_id),
+            ttl=60
+        )
+
     async def get_balance(self, account_id: str) -> Dict:
         client = await self.db.client
         
@@ -19,7 +19,7 @@ from .config import (
     get_commitment_duration_months,
     get_price_type
 )
-from .credit_manager import credit_manager
+from .credit_manager import credit_manager, invalidate_balance_cache
 from .idempotency import (
     generate_checkout_idempotency_key,
     generate_subscription_modify_idempotency_key
@@ -354,7 +354,7 @@ class SubscriptionService:
             await self.handle_subscription_change(updated_subscription)
 
             await Cache.invalidate(f"subscription_tier:{account_id}")
-            await Cache.invalidate(f"credit_balance:{account_id}")
+            await invalidate_balance_cache(account_id)
             await Cache.invalidate(f"credit_summary:{account_id}")
             
             old_price_id = subscription['items']['data'][0].price.id
@@ -435,7 +435,7 @@ class SubscriptionService:
             await self.handle_subscription_change(subscription)
             
             await Cache.invalidate(f"subscription_tier:{account_id}")
-            await Cache.invalidate(f"credit_balance:{account_id}")
+            await invalidate_balance_cache(account_id)
             await Cache.invalidate(f"credit_summary:{account_id}")
             
             return {
@@ -1031,11 +1031,13 @@ class SubscriptionService:
             await lock.release()
 
     async def get_user_subscription_tier(self, account_id: str) -> Dict:
-        cache_key = f"subscription_tier:{account_id}"
-        cached = await Cache.get(cache_key)
-        if cached:
-            return cached
-        
+        return await Cache.get_or_set(
+            f"subscription_tier:{account_id}",
+            lambda: self._load_user_subscription_tier(account_id),
+            ttl=60
+        )
+
+    async def _load_user_subscription_tier(self, account_id: str) -> Dict:
         db = DBConnection()
         client = await db.client
 
@@ -1075,7 +1077,6 @@ class SubscriptionService:
             'is_trial': trial_status == 'active'
         }
         
-        await Cache.set(cache_key, tier_info, ttl=60)
         return tier_info
 
     async def get_allowed_models_for_user(self, user_id: str, client=None) -> List[str]:
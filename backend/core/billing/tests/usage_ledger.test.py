@@ -0,0 +1,115 @@
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+
+from core.billing import usage_ledger as usage_ledger_module
+from core.billing.usage_ledger import GROUP, STREAM_KEY, UsageLedger, _reserved_key
+
+
+class TestUsageLedger:
+    @pytest_asyncio.fixture
+    async def client(self, monkeypatch):
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+        async def get_client():
+            return client
+
+        monkeypatch.setattr(usage_ledger_module.redis, "get_client", get_client)
+        yield client
+        await client.aclose()
+
+    @pytest.fixture
+    def settle(self, monkeypatch):
+        settle = AsyncMock(return_value={'success': True})
+        monkeypatch.setattr(usage_ledger_module.credit_manager, "settle_usage_batch", settle)
+        return settle
+
+    @pytest_asyncio.fixture
+    async def ledger(self, client, monkeypatch):
+        monkeypatch.setattr(UsageLedger, "batch_size", property(lambda self: 100))
+        monkeypatch.setattr(UsageLedger, "claim_idle_ms", property(lambda self: 0))
+        ledger = UsageLedger()
+        await ledger._ensure_group(client)
+        return ledger
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_duplicate_message_id_is_recorded_once(self, ledger, client):
+        assert await ledger.record('acct-1', 'msg-1', 'thread-1', 'model-a', Decimal('1.5'))
+        assert not await ledger.record('acct-1', 'msg-1', 'thread-1', 'model-a', Decimal('1.5'))
+
+        assert await client.xlen(STREAM_KEY) == 1
+        assert await ledger.reserved('acct-1') == Decimal('1.5')
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_settlement_releases_reserved_amount(self, ledger, client, settle):
+        await ledger.record('acct-1', 'msg-1', None, None, Decimal('1.5'))
+        await ledger.record('acct-1', 'msg-2', None, None, Decimal('2.25'))
+        await ledger.record('acct-2', 'msg-3', None, None, Decimal('0.5'))
+
+        await ledger.flush()
+
+        assert settle.await_count == 2
+        settled = {call.args[0]: call.args[1] for call in settle.await_args_list}
+        assert [entry['message_id'] for entry in settled['acct-1']] == ['msg-1', 'msg-2']
+        assert await ledger.reserved('acct-1') == Decimal('0')
+        assert await ledger.reserved('acct-2') == Decimal('0')
+        assert not await client.exists(_reserved_key('acct-1'))
+        assert await client.xlen(STREAM_KEY) == 0
+        assert ledger.settled_entries == 3
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_only_settled_usage_is_released(self, ledger, settle):
+        await ledger.record('acct-1', 'msg-1', None, None, Decimal('1.5'))
+        await ledger.flush()
+        await ledger.record('acct-1', 'msg-2', None, None, Decimal('2.25'))
+
+        assert await ledger.reserved('acct-1') == Decimal('2.25')
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_settlement_stays_pending_until_reclaimed(self, ledger, client, settle):
+        settle.side_effect = [RuntimeError("database unavailable"), {'success': True}]
+        await ledger.record('acct-1', 'msg-1', None, None, Decimal('1.5'))
+
+        await ledger.flush()
+
+        assert ledger.settle_failures == 1
+        assert (await client.xpending(STREAM_KEY, GROUP))['pending'] == 1
+        assert await ledger.reserved('acct-1') == Decimal('1.5')
+
+        other = UsageLedger()
+        other.consumer = "other-settler"
+        await other._reclaim()
+
+        assert settle.await_count == 2
+        assert settle.await_args.args[1][0]['message_id'] == 'msg-1'
+        assert (await client.xpending(STREAM_KEY, GROUP))['pending'] == 0
+        assert await client.xlen(STREAM_KEY) == 0
+        assert await ledger.reserved('acct-1') == Decimal('0')
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_expired_reservation_is_not_driven_negative(self, ledger, client, settle):
+        await ledger.record('acct-1', 'msg-1', None, None, Decimal('1.5'))
+        await client.delete(_reserved_key('acct-1'))
+
+        await ledger.flush()
+
+        assert not await client.exists(_reserved_key('acct-1'))
+        assert await client.xlen(STREAM_KEY) == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_release_larger_than_reservation_removes_it(self, ledger, client, settle):
+        await ledger.record('acct-1', 'msg-1', None, None, Decimal('1.5'))
+        await client.set(_reserved_key('acct-1'), '0.5', ex=60)
+
+        await ledger.flush()
+
+        assert await client.get(_reserved_key('acct-1')) is None
@@ -0,0 +1,240 @@
+"""
+Write-behind usage ledger.
+
+Every saved llm_response_end used to run a synchronous `atomic_use_credits`
+RPC, which locks the account's `credit_accounts` row, from the agent's hot
+path. Parallel runs of one account serialized on that row lock and each
+response paid a full database round trip before the run could continue.
+
+Usage is now recorded in Redis and settled in the background:
+
+- `record()` appends the event to the `usage_ledger:stream` stream and adds
+  its cost to the account's reserved amount (`usage_ledger:reserved:{id}`) in
+  one script; a `usage_ledger:seen:{message_id}` marker makes it a no-op for a
+  message that was already recorded
+- the settler reads the stream as a consumer group, aggregates the entries of
+  a USAGE_LEDGER_FLUSH_INTERVAL_MS window per account and settles each
+  account with one `atomic_settle_usage_batch` RPC; the RPC records every
+  message_id, so a batch that is retried after a crash is never charged twice
+- entries are acknowledged (and the reserved amount released) only after the
+  RPC succeeds; entries left pending by a dead settler are reclaimed after
+  USAGE_LEDGER_CLAIM_IDLE_MS. A reservation that expired in the meantime is
+  not released again, and one that drops to zero is removed
+- credit checks subtract the reserved amount from the settled balance, so
+  unsettled usage still counts against the account
+
+If Redis is unavailable, usage is deducted synchronously as before.
+"""
+
+import asyncio
+import os
+import socket
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from core.billing.credit_manager import credit_manager
+from core.services import redis
+from core.utils.config import config
+from core.utils.logger import logger
+
+STREAM_KEY = "usage_ledger:stream"
+GROUP = "settlers"
+SEEN_PREFIX = "usage_ledger:seen:"
+RESERVED_PREFIX = "usage_ledger:reserved:"
+# Long enough to outlive any redelivery of the same message
+SEEN_TTL_SECONDS = 7 * 24 * 3600
+RESERVED_TTL_SECONDS = 24 * 3600
+
+# Records an event once per message_id: seen marker, stream entry and reservation together
+_RECORD_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+redis.call('XADD', KEYS[2], '*', 'account_id', ARGV[2], 'message_id', ARGV[3],
+           'thread_id', ARGV[4], 'model', ARGV[5], 'amount', ARGV[6])
+redis.call('INCRBYFLOAT', KEYS[3], ARGV[6])
+redis.call('EXPIRE', KEYS[3], ARGV[7])
+return 1
+"""
+
+# Acknowledges settled entries and releases their amount from a reservation that still exists
+_SETTLE_SCRIPT = """
+redis.call('XACK', KEYS[1], ARGV[1], unpack(ARGV, 3))
+redis.call('XDEL', KEYS[1], unpack(ARGV, 3))
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    local remaining = tonumber(redis.call('INCRBYFLOAT', KEYS[2], ARGV[2]))
+    if remaining <= 0 then
+        redis.call('DEL', KEYS[2])
+    end
+end
+return 1
+"""
+
+Entry = Tuple[str, Dict[str, str]]
+
+
+def _reserved_key(account_id: str) -> str:
+    return f"{RESERVED_PREFIX}{account_id}"
+
+
+class UsageLedger:
+    """Records LLM usage in Redis and settles it into credit_accounts in batches."""
+
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._settler: Optional[asyncio.Task] = None
+        self.settled_entries = 0
+        self.settle_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(config.USAGE_LEDGER_ENABLED)
+
+    @property
+    def flush_interval(self) -> float:
+        return int(config.USAGE_LEDGER_FLUSH_INTERVAL_MS or 1000) / 1000
+
+    @property
+    def batch_size(self) -> int:
+        return int(config.USAGE_LEDGER_BATCH_SIZE or 500)
+
+    @property
+    def claim_idle_ms(self) -> int:
+        return int(config.USAGE_LEDGER_CLAIM_IDLE_MS or 60000)
+
+    async def record(self, account_id: str, message_id: str, thread_id: Optional[str],
+                     model: Optional[str], cost: Decimal) -> bool:
+        """Queue a usage event for settlement. Returns False if message_id was already recorded."""
+        client = await redis.get_client()
+        record = client.register_script(_RECORD_SCRIPT)
+        added = await record(
+            keys=[f"{SEEN_PREFIX}{message_id}", STREAM_KEY, _reserved_key(account_id)],
+            args=[SEEN_TTL_SECONDS, account_id, message_id, thread_id or '', model or '',
+                  str(cost), RESERVED_TTL_SECONDS],
+        )
+        return bool(added)
+
+    async def reserved(self, account_id: str) -> Decimal:
+        """Usage recorded for the account that has not been settled yet."""
+        client = await redis.get_client()
+        value = await client.get(_reserved_key(account_id))
+        return max(Decimal(value), Decimal('0')) if value else Decimal('0')
+
+    def start(self):
+        """Start the background settler in this process."""
+        if not self.enabled:
+            return
+        if self._settler is None or self._settler.done():
+            self._settler = asyncio.create_task(self._settle_loop())
+
+    async def close(self):
+        """Stop the settler after one last flush."""
+        if self._settler and not self._settler.done():
+            self._settler.cancel()
+            try:
+                await self._settler
+            except asyncio.CancelledError:
+                pass
+        self._settler = None
+        if not self.enabled:
+            return
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final usage ledger flush failed: {e}")
+
+    async def _ensure_group(self, client):
+        try:
+            await client.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _settle_loop(self):
+        logger.info(f"Usage ledger settler started ({self.consumer})")
+        loop = asyncio.get_running_loop()
+        last_claim = 0.0
+        group_ready = False
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                if not group_ready:
+                    await self._ensure_group(await redis.get_client())
+                    group_ready = True
+                if loop.time() - last_claim >= self.claim_idle_ms / 1000:
+                    last_claim = loop.time()
+                    await self._reclaim()
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Usage ledger settler error: {e}", exc_info=True)
+
+    async def flush(self):
+        """Settle everything delivered to this consumer so far."""
+        client = await redis.get_client()
+        while True:
+            response = await client.xreadgroup(GROUP, self.consumer, {STREAM_KEY: '>'}, count=self.batch_size)
+            entries = response[0][1] if response else []
+            if entries:
+                await self._settle(client, entries)
+            if len(entries) < self.batch_size:
+                return
+
+    async def _reclaim(self):
+        """Take over entries another settler read but never acknowledged."""
+        client = await redis.get_client()
+        start_id = '0-0'
+        while True:
+            result = await client.xautoclaim(STREAM_KEY, GROUP, self.consumer, self.claim_idle_ms,
+                                             start_id=start_id, count=self.batch_size)
+            start_id, entries = result[0], [entry for entry in result[1] if entry and entry[1]]
+            if entries:
+                logger.warning(f"Reclaimed {len(entries)} unsettled usage entries")
+                await self._settle(client, entries)
+            if start_id in ('0-0', b'0-0'):
+                return
+
+    async def _settle(self, client, entries: List[Entry]):
+        by_account: Dict[str, List[Entry]] = defaultdict(list)
+        for entry in entries:
+            by_account[entry[1]['account_id']].append(entry)
+
+        for account_id, account_entries in by_account.items():
+            payload = [
+                {
+                    'message_id': fields['message_id'],
+                    'thread_id': fields.get('thread_id') or None,
+                    'model': fields.get('model') or None,
+                    'amount': fields['amount'],
+                }
+                for _, fields in account_entries
+            ]
+            try:
+                result = await credit_manager.settle_usage_batch(account_id, payload)
+            except Exception as e:
+                # Left pending; retried when it is reclaimed
+                self.settle_failures += 1
+                logger.error(f"[BILLING] Failed to settle {len(payload)} usage entries for {account_id}: {e}")
+                continue
+
+            if not result.get('success'):
+                # Same outcome as a failed direct deduction: logged, not retried
+                logger.error(f"[BILLING] Usage settlement rejected for {account_id}: {result.get('error')}")
+
+            entry_ids = [entry_id for entry_id, _ in account_entries]
+            total = sum(Decimal(fields['amount']) for _, fields in account_entries)
+            settle = client.register_script(_SETTLE_SCRIPT)
+            await settle(keys=[STREAM_KEY, _reserved_key(account_id)], args=[GROUP, str(-total), *entry_ids])
+            self.settled_entries += len(entry_ids)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": int(self._settler is not None and not self._settler.done()),
+            "settled_entries": self.settled_entries,
+            "settle_failures": self.settle_failures,
+        }
+
+
+usage_ledger = UsageLedger()
@@ -18,7 +18,7 @@ from .config import (
     is_commitment_price_id,
     get_commitment_duration_months
 )
-from .credit_manager import credit_manager
+from .credit_manager import credit_manager, invalidate_balance_cache
 from .stripe_circuit_breaker import StripeAPIWrapper
 
 
@@ -1579,7 +1579,7 @@ class WebhookService:
                             'trial_status': 'none'
                         }).eq('account_id', account_id).execute()
                     
-                    await Cache.invalidate(f"credit_balance:{account_id}")
+                    await invalidate_balance_cache(account_id)
                     await Cache.invalidate(f"credit_summary:{account_id}")
                     await Cache.invalidate(f"subscription_tier:{account_id}")
                 elif is_true_renewal and result and hasattr(result, 'data') and result.data and result.data.get('duplicate_prevented'):
@@ -1593,7 +1593,7 @@ class WebhookService:
                 elif not is_true_renewal and result and result.get('success'):
                     logger.info(f"[INITIAL GRANT SUCCESS] ✅ Granted ${monthly_credits} initial subscription credits to {account_id}")
                     
-                    await Cache.invalidate(f"credit_balance:{account_id}")
+                    await invalidate_balance_cache(account_id)
                     await Cache.invalidate(f"credit_summary:{account_id}")
                     await Cache.invalidate(f"subscription_tier:{account_id}")
             
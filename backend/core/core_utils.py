@@ -8,6 +8,7 @@ from .utils.logger import logger
 from .utils.icon_generator import RELEVANT_ICONS, generate_icon_and_colors as generate_agent_icon_and_colors
 from .utils.limits_checker import (
     check_agent_run_limit,
+    acquire_agent_run_slot,
     check_agent_count_limit, 
     check_project_count_limit
 )
@@ -110,6 +110,7 @@ class CreditService:
             
             if self.cache:
                 await self.cache.invalidate(f"credit_balance:{user_id}")
+                await self.cache.invalidate(f"credit_balance_info:{user_id}")
             
             if result.data and len(result.data) > 0:
                 row = result.data[0]
@@ -164,6 +165,7 @@ class CreditService:
                 
                 if self.cache:
                     await self.cache.invalidate(f"credit_balance:{user_id}")
+                    await self.cache.invalidate(f"credit_balance_info:{user_id}")
                 
                 logger.info(f"Added {amount} credits to user {user_id}. New balance: {new_balance}")
                 return new_balance
@@ -204,6 +206,7 @@ class CreditService:
             
             if self.cache:
                 await self.cache.invalidate(f"credit_balance:{user_id}")
+                await self.cache.invalidate(f"credit_balance_info:{user_id}")
             
             logger.info(f"Granted {amount} {tier_name} credits to user {user_id}")
             return bool(result.data)
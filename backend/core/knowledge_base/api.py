@@ -5,6 +5,7 @@ from core.utils.auth_utils import verify_and_get_user_id_from_jwt, require_agent
 from core.services.supabase import DBConnection
 from .file_processor import FileProcessor
 from core.utils.logger import logger
+from core.utils.cache import Cache
 from .validation import FileNameValidator, ValidationError, validate_folder_name_unique, validate_file_name_unique_in_folder
 
 # Constants
@@ -45,6 +46,28 @@ async def check_total_file_size_limit(account_id: str, new_file_size: int):
         logger.error(f"Error checking file size limit: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to check file size limit")
 
+# Agents cache their knowledge base prompt context (see PromptManager.get_knowledge_base_context)
+async def get_assigned_agent_ids(client, entry_ids: List[str]) -> List[str]:
+    """IDs of the agents assigned to any of the given entries."""
+    if not entry_ids:
+        return []
+    try:
+        result = await client.table('agent_knowledge_entry_assignments').select(
+            'agent_id'
+        ).in_('entry_id', entry_ids).execute()
+        return list({row['agent_id'] for row in result.data or []})
+    except Exception as e:
+        logger.warning(f"Failed to look up agents assigned to knowledge base entries: {str(e)}")
+        return []
+
+async def invalidate_agent_kb_context(agent_ids: List[str]):
+    """Drop the cached knowledge base context of the given agents so new runs rebuild it."""
+    for agent_id in agent_ids:
+        try:
+            await Cache.invalidate(f"agent_kb_context:{agent_id}")
+        except Exception as e:
+            logger.warning(f"Failed to invalidate knowledge base context for agent {agent_id}: {str(e)}")
+
 # Models
 class FolderRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -232,6 +255,11 @@ async def update_folder(
             'entry_id', count='exact'
         ).eq('folder_id', folder_id).execute()
         
+        # The folder name appears in the context of agents using its entries
+        if 'name' in update_data and count_result.data:
+            entry_ids = [entry['entry_id'] for entry in count_result.data]
+            await invalidate_agent_kb_context(await get_assigned_agent_ids(client, entry_ids))
+        
         return FolderResponse(
             folder_id=updated_folder['folder_id'],
             name=updated_folder['name'],
@@ -280,9 +308,14 @@ async def delete_folder(
             except Exception as e:
                 logger.warning(f"Failed to delete some files from S3: {str(e)}")
         
+        # Look up affected agents before the cascade removes their assignments
+        agent_ids = await get_assigned_agent_ids(client, [entry['entry_id'] for entry in entries_result.data or []])
+        
         # Delete folder (cascade will handle entries and assignments in DB)
         await client.table('knowledge_base_folders').delete().eq('folder_id', folder_id).execute()
         
+        await invalidate_agent_kb_context(agent_ids)
+        
         return {"success": True}
         
     except HTTPException:
@@ -422,9 +455,14 @@ async def delete_entry(
         except Exception as e:
             logger.warning(f"Failed to delete file from S3: {str(e)}")
         
+        # Look up affected agents before the cascade removes their assignments
+        agent_ids = await get_assigned_agent_ids(client, [entry_id])
+        
         # Delete from database
         await client.table('knowledge_base_entries').delete().eq('entry_id', entry_id).execute()
         
+        await invalidate_agent_kb_context(agent_ids)
+        
         return {"success": True}
         
     except HTTPException:
@@ -460,6 +498,8 @@ async def update_entry(
         if not update_result.data:
             raise HTTPException(status_code=500, detail="Failed to update entry")
         
+        await invalidate_agent_kb_context(await get_assigned_agent_ids(client, [entry_id]))
+        
         # Return the updated entry
         updated_entry = update_result.data[0]
         return EntryResponse(
@@ -521,6 +561,8 @@ async def update_agent_assignments(
                 'enabled': True
             }).execute()
         
+        await invalidate_agent_kb_context([agent_id])
+        
         return {"success": True, "message": "Assignments updated successfully"}
         
     except Exception as e:
@@ -593,6 +635,9 @@ async def move_file(
             'file_path': new_file_path
         }).eq('entry_id', entry_id).execute()
         
+        # The entry is listed under its folder's name in the agents' context
+        await invalidate_agent_kb_context(await get_assigned_agent_ids(client, [entry_id]))
+        
         return {"success": True, "message": "File moved successfully"}
         
     except HTTPException:
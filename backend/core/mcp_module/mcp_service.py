@@ -14,6 +14,7 @@ from mcp.client.streamable_http import streamablehttp_client
 
 from core.utils.logger import logger
 from core.credentials import EncryptionService
+from core.tools.utils.mcp_session_pool import MCPServerSpec
 
 
 class MCPException(Exception):
@@ -115,6 +116,20 @@ class MCPService:
         )
         return await self._connect_server_internal(request)
     
+    async def resolve_server_endpoint(self, mcp_config: Dict[str, Any], external_user_id: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        """Resolve the streamable HTTP URL and headers of a configured MCP server without connecting."""
+        provider = mcp_config.get('type', mcp_config.get('provider', 'custom'))
+        qualified_name = mcp_config.get('qualifiedName', mcp_config.get('name', ''))
+        server_config = mcp_config.get('config', {})
+        server_url = await self._get_server_url(qualified_name, server_config, provider)
+        headers = self._get_headers(qualified_name, server_config, provider, external_user_id or mcp_config.get('external_user_id'))
+        return server_url, headers
+    
+    async def resolve_server_spec(self, mcp_config: Dict[str, Any], external_user_id: Optional[str] = None) -> MCPServerSpec:
+        """Session pool spec of a configured MCP server, over the transport _connect_server_internal uses."""
+        server_url, headers = await self.resolve_server_endpoint(mcp_config, external_user_id)
+        return MCPServerSpec.http(server_url, headers)
+    
     async def _connect_server_internal(self, request: MCPConnectionRequest) -> MCPConnection:
         self._logger.debug(f"Connecting to MCP server: {request.qualified_name}")
         
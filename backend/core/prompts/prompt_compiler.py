@@ -0,0 +1,241 @@
+"""
+Compiled system prompt sections.
+
+The system prompt used to be rebuilt from scratch for every agent run: the
+base prompt, the agent builder prompt, the knowledge base context, the MCP tool
+list and a pretty-printed JSON dump of every registered tool schema. All of
+that only changes when the agent, its tools or its MCP servers change, so the
+compiler renders it once per distinct input and keeps the result in an
+in-process LRU. Only the dynamic tail (date/time, user locale) is appended per
+run.
+
+The cache key covers everything the static text depends on: the agent id and
+version, a hash of its system prompt, the knowledge base context, the
+registered tool set (function names and the classes providing them, in
+registration order) and the MCP tool schemas. Identical inputs therefore give
+a byte-identical prefix across runs and processes, which keeps provider-side
+prompt caching hitting.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from core.agentpress.tool import SchemaType
+from core.prompts.agent_builder_prompt import get_agent_builder_prompt
+from core.prompts.prompt import get_system_prompt
+from core.utils.config import config
+from core.utils.logger import logger
+
+BUILDER_TOOLS = ['agent_config_tool', 'mcp_search_tool', 'credential_profile_tool', 'trigger_tool']
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _has_mcp_section(agent_config: Optional[dict], mcp_wrapper_instance) -> bool:
+    return bool(
+        agent_config
+        and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps'))
+        and mcp_wrapper_instance
+        and mcp_wrapper_instance._initialized
+    )
+
+
+def mcp_schema_hash(mcp_wrapper_instance) -> str:
+    """Hash of the MCP tool schemas a wrapper exposes."""
+    if not mcp_wrapper_instance:
+        return ""
+    schemas = {
+        method_name: [schema.schema for schema in schema_list if schema.schema_type == SchemaType.OPENAPI]
+        for method_name, schema_list in mcp_wrapper_instance.get_schemas().items()
+    }
+    return _sha256(json.dumps(schemas, sort_keys=True))
+
+
+def tool_set_hash(tool_registry) -> str:
+    """Hash of the registered functions and the tool classes providing them, in registration order.
+
+    Regular tool schemas are defined by class decorators, so the class identifies
+    the schema; MCP schemas are covered by mcp_schema_hash.
+    """
+    if not tool_registry:
+        return ""
+    entries = []
+    for function_name, tool_info in tool_registry.tools.items():
+        tool_class = tool_info.get('class') or type(tool_info['instance'])
+        entries.append(f"{function_name}:{tool_class.__module__}.{tool_class.__qualname__}")
+    return _sha256("\n".join(entries))
+
+
+def _knowledge_base_section(kb_context: str) -> str:
+    return f"""
+
+                    === AGENT KNOWLEDGE BASE ===
+                    NOTICE: The following is your specialized knowledge base. This information should be considered authoritative for your responses and should take precedence over general knowledge when relevant.
+
+                    {kb_context}
+
+                    === END AGENT KNOWLEDGE BASE ===
+
+                    IMPORTANT: Always reference and utilize the knowledge base information above when it's relevant to user queries. This knowledge is specific to your role and capabilities."""
+
+
+def _mcp_section(mcp_wrapper_instance) -> str:
+    mcp_info = "\n\n--- MCP Tools Available ---\n"
+    mcp_info += "You have access to external MCP (Model Context Protocol) server tools.\n"
+    mcp_info += "MCP tools can be called directly using their native function names in the standard function calling format:\n"
+    mcp_info += '<function_calls>\n'
+    mcp_info += '<invoke name="{tool_name}">\n'
+    mcp_info += '<parameter name="param1">value1</parameter>\n'
+    mcp_info += '<parameter name="param2">value2</parameter>\n'
+    mcp_info += '</invoke>\n'
+    mcp_info += '</function_calls>\n\n'
+
+    mcp_info += "Available MCP tools:\n"
+    try:
+        registered_schemas = mcp_wrapper_instance.get_schemas()
+        for method_name, schema_list in registered_schemas.items():
+            for schema in schema_list:
+                if schema.schema_type == SchemaType.OPENAPI:
+                    func_info = schema.schema.get('function', {})
+                    description = func_info.get('description', 'No description available')
+                    mcp_info += f"- **{method_name}**: {description}\n"
+
+                    params = func_info.get('parameters', {})
+                    props = params.get('properties', {})
+                    if props:
+                        mcp_info += f"  Parameters: {', '.join(props.keys())}\n"
+
+    except Exception as e:
+        logger.error(f"Error listing MCP tools: {e}")
+        mcp_info += "- Error loading MCP tool list\n"
+
+    mcp_info += "\n🚨 CRITICAL MCP TOOL RESULT INSTRUCTIONS 🚨\n"
+    mcp_info += "When you use ANY MCP (Model Context Protocol) tools:\n"
+    mcp_info += "1. ALWAYS read and use the EXACT results returned by the MCP tool\n"
+    mcp_info += "2. For search tools: ONLY cite URLs, sources, and information from the actual search results\n"
+    mcp_info += "3. For any tool: Base your response entirely on the tool's output - do NOT add external information\n"
+    mcp_info += "4. DO NOT fabricate, invent, hallucinate, or make up any sources, URLs, or data\n"
+    mcp_info += "5. If you need more information, call the MCP tool again with different parameters\n"
+    mcp_info += "6. When writing reports/summaries: Reference ONLY the data from MCP tool results\n"
+    mcp_info += "7. If the MCP tool doesn't return enough information, explicitly state this limitation\n"
+    mcp_info += "8. Always double-check that every fact, URL, and reference comes from the MCP tool output\n"
+    mcp_info += "\nIMPORTANT: MCP tool results are your PRIMARY and ONLY source of truth for external data!\n"
+    mcp_info += "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.\n"
+    return mcp_info
+
+
+def _xml_tools_section(openapi_schemas) -> str:
+    # Convert schemas to JSON string
+    schemas_json = json.dumps(openapi_schemas, indent=2)
+
+    return f"""
+
+In this environment you have access to a set of tools you can use to answer the user's question.
+
+You can invoke functions by writing a <function_calls> block like the following as part of your reply to the user:
+
+<function_calls>
+<invoke name="function_name">
+<parameter name="param_name">param_value</parameter>
+...
+</invoke>
+</function_calls>
+
+String and scalar parameters should be specified as-is, while lists and objects should use JSON format.
+
+Here are the functions available in JSON Schema format:
+
+```json
+{schemas_json}
+```
+
+When using the tools:
+- Use the exact function names from the JSON schema above
+- Include all required parameters as specified in the schema
+- Format complex data (objects, arrays) as JSON strings within the parameter tags
+- Boolean values should be "true" or "false" (lowercase)
+"""
+
+
+class SystemPromptCompiler:
+    """Renders the static part of the system prompt, memoized per distinct input."""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self._max_entries = max_entries or int(config.PROMPT_CACHE_SIZE or 128)
+        self._compiled: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, agent_config: Optional[dict], kb_context: Optional[str], mcp_wrapper_instance,
+                  tool_registry, xml_tool_calling: bool) -> str:
+        agent_config = agent_config or {}
+        has_mcp = _has_mcp_section(agent_config, mcp_wrapper_instance)
+        parts: Dict[str, Any] = {
+            'agent_id': agent_config.get('agent_id'),
+            'version_id': agent_config.get('current_version_id'),
+            'system_prompt': _sha256(agent_config.get('system_prompt') or ""),
+            'agentpress_tools': sorted(
+                tool for tool in BUILDER_TOOLS if (agent_config.get('agentpress_tools') or {}).get(tool, False)
+            ),
+            'kb': _sha256(kb_context or ""),
+            'mcp': mcp_schema_hash(mcp_wrapper_instance),
+            'mcp_section': has_mcp,
+            'tools': tool_set_hash(tool_registry) if xml_tool_calling else "",
+        }
+        return _sha256(json.dumps(parts, sort_keys=True))
+
+    def compile(self, agent_config: Optional[dict], kb_context: Optional[str], mcp_wrapper_instance,
+                tool_registry, xml_tool_calling: bool = True) -> str:
+        """The static system prompt: base/agent prompt, builder prompt, knowledge base, MCP tools and tool schemas."""
+        key = self.cache_key(agent_config, kb_context, mcp_wrapper_instance, tool_registry, xml_tool_calling)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+        self.misses += 1
+        compiled = self._render(agent_config, kb_context, mcp_wrapper_instance, tool_registry, xml_tool_calling)
+        self._compiled[key] = compiled
+        while len(self._compiled) > self._max_entries:
+            self._compiled.popitem(last=False)
+        logger.debug(f"Compiled system prompt {key[:12]} ({len(compiled)} chars)")
+        return compiled
+
+    def _render(self, agent_config: Optional[dict], kb_context: Optional[str], mcp_wrapper_instance,
+                tool_registry, xml_tool_calling: bool) -> str:
+        # Start with agent's normal system prompt or default
+        if agent_config and agent_config.get('system_prompt'):
+            system_content = agent_config['system_prompt'].strip()
+        else:
+            system_content = get_system_prompt()
+
+        # Check if agent has builder tools enabled - append the full builder prompt
+        if agent_config:
+            agentpress_tools = agent_config.get('agentpress_tools', {})
+            if any(agentpress_tools.get(tool, False) for tool in BUILDER_TOOLS):
+                system_content += f"\n\n{get_agent_builder_prompt()}"
+
+        if kb_context:
+            system_content += _knowledge_base_section(kb_context)
+
+        if _has_mcp_section(agent_config, mcp_wrapper_instance):
+            system_content += _mcp_section(mcp_wrapper_instance)
+
+        # Add XML tool calling instructions to system prompt if requested
+        if xml_tool_calling and tool_registry:
+            openapi_schemas = tool_registry.get_openapi_schemas()
+            if openapi_schemas:
+                system_content += _xml_tools_section(openapi_schemas)
+
+        return system_content
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._compiled), "hits": self.hits, "misses": self.misses}
+
+
+system_prompt_compiler = SystemPromptCompiler()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Shared Chromium browser pool for the render routers.
+
+The PDF and PPTX converters used to start Playwright and launch Chromium for
+every request and close it afterwards, which added 1-2s to each export. The
+pool keeps one Chromium process alive for the lifetime of the server:
+
+- pages are handed out with `async with browser_pool.page(viewport=...)`
+- browser contexts are reused per (viewport, device scale factor) and recycled
+  after BROWSER_POOL_CONTEXT_MAX_USES pages so long-lived state doesn't pile up
+- at most BROWSER_POOL_MAX_PAGES pages are open at once across all requests
+- if Chromium crashes or disconnects it is relaunched on the next request
+- `start()` warms the browser up when the server starts
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+except ImportError:
+    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+
+
+LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--force-device-scale-factor=1',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-extensions',
+    '--disable-plugins',
+    '--disable-web-security',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection'
+]
+
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+ContextKey = Tuple[int, int, float]
+
+
+class _PooledContext:
+    def __init__(self, context: BrowserContext, browser: Browser):
+        self.context = context
+        self.browser = browser
+        self.uses = 0
+
+
+class BrowserPool:
+    """One long-lived Chromium shared by every render request in this process."""
+
+    def __init__(self, max_pages: Optional[int] = None, max_idle_contexts: Optional[int] = None, context_max_uses: Optional[int] = None):
+        self.max_pages = max_pages or int(os.getenv('BROWSER_POOL_MAX_PAGES', '8'))
+        self.max_idle_contexts = max_idle_contexts or int(os.getenv('BROWSER_POOL_MAX_IDLE_CONTEXTS', '4'))
+        self.context_max_uses = context_max_uses or int(os.getenv('BROWSER_POOL_CONTEXT_MAX_USES', '50'))
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._launch_lock = asyncio.Lock()
+        self._pages = asyncio.Semaphore(self.max_pages)
+        self._idle: Dict[ContextKey, List[_PooledContext]] = {}
+        self.launches = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self):
+        """Launch Chromium ahead of the first request."""
+        await self._get_browser()
+
+    async def _get_browser(self) -> Browser:
+        if self.connected:
+            return self._browser
+        async with self._launch_lock:
+            if self.connected:
+                return self._browser
+            await self._discard_browser()
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            print("🌐 Launching shared browser...")
+            browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+            browser.on("disconnected", lambda _: self._on_disconnected(browser))
+            self._browser = browser
+            self.launches += 1
+            return browser
+
+    def _on_disconnected(self, browser: Browser):
+        if self._browser is browser:
+            print("⚠️ Shared browser disconnected, it will be relaunched on the next request")
+            self._browser = None
+            self._idle.clear()
+
+    async def _discard_browser(self):
+        # Contexts of a dead browser are unusable; drop them with it
+        self._idle.clear()
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _checkout_context(self, key: ContextKey) -> _PooledContext:
+        browser = await self._get_browser()
+        idle = self._idle.get(key, [])
+        while idle:
+            pooled = idle.pop()
+            if pooled.browser is browser and browser.is_connected():
+                return pooled
+        width, height, scale = key
+        context = await browser.new_context(viewport={'width': width, 'height': height}, device_scale_factor=scale)
+        return _PooledContext(context, browser)
+
+    async def _checkin_context(self, key: ContextKey, pooled: _PooledContext, healthy: bool):
+        pooled.uses += 1
+        idle = self._idle.setdefault(key, [])
+        reusable = (
+            healthy
+            and pooled.browser is self._browser
+            and pooled.uses < self.context_max_uses
+            and len(idle) < self.max_idle_contexts
+        )
+        if reusable:
+            idle.append(pooled)
+            return
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+
+    async def _open_page(self, key: ContextKey) -> Tuple[_PooledContext, Page]:
+        pooled = await self._checkout_context(key)
+        try:
+            return pooled, await pooled.context.new_page()
+        except Exception:
+            # The context is checked out and no longer tracked: don't leak it
+            try:
+                await pooled.context.close()
+            except Exception:
+                pass
+            raise
+
+    @asynccontextmanager
+    async def page(self, viewport: Optional[Dict[str, int]] = None, device_scale_factor: float = 1) -> AsyncIterator[Page]:
+        """Yield a fresh page from a pooled context; the page is closed on exit."""
+        viewport = viewport or DEFAULT_VIEWPORT
+        key = (viewport['width'], viewport['height'], device_scale_factor)
+        async with self._pages:
+            try:
+                pooled, page = await self._open_page(key)
+            except Exception:
+                if self.connected:
+                    raise
+                # Chromium died under us: relaunch once and retry
+                pooled, page = await self._open_page(key)
+
+            healthy = True
+            try:
+                yield page
+            except Exception:
+                healthy = self.connected
+                raise
+            finally:
+                try:
+                    await page.close()
+                except Exception:
+                    healthy = False
+                await self._checkin_context(key, pooled, healthy)
+
+    async def close(self):
+        """Close every context, the browser and Playwright."""
+        contexts = [pooled.context for idle in self._idle.values() for pooled in idle]
+        self._idle.clear()
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        await self._discard_browser()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connected": int(self.connected),
+            "launches": self.launches,
+            "idle_contexts": sum(len(idle) for idle in self._idle.values()),
+            "max_pages": self.max_pages,
+        }
+
+
+browser_pool = BrowserPool()
@@ -8,17 +8,16 @@ Provides PDF conversion endpoints as a FastAPI router that can be included in ot
 import json
 import asyncio
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 import tempfile
+import shutil
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+from browser_pool import browser_pool
+from slide_render_cache import SlideRenderCache
 
 try:
     from PyPDF2 import PdfWriter, PdfReader
@@ -34,6 +33,9 @@ workspace_dir = "/workspace"
 output_dir = Path(workspace_dir) / "downloads"
 output_dir.mkdir(parents=True, exist_ok=True)
 
+# Bump when the slide rendering changes so cached slide PDFs are re-rendered
+PDF_RENDERER_VERSION = "pdf-1"
+
 
 class ConvertRequest(BaseModel):
     presentation_path: str = Field(..., description="Path to the presentation folder containing metadata.json")
@@ -107,16 +109,37 @@ class PresentationToPDFAPI:
         except Exception as e:
             raise ValueError(f"Error loading metadata: {e}")
     
-    async def render_slide_to_pdf(self, browser, slide_info: Dict, temp_dir: Path) -> Path:
-        """Render a single HTML slide to PDF using Playwright."""
+    async def render_slide_to_pdf(self, slide_info: Dict, temp_dir: Path) -> Path:
+        """Render a single HTML slide to PDF using a page from the shared browser pool."""
         html_path = slide_info['path']
         slide_num = slide_info['number']
         
         print(f"Rendering slide {slide_num}: {slide_info['title']}")
         
-        # Create new page with exact presentation dimensions
-        page = await browser.new_page()
+        # Page with exact presentation dimensions
+        async with browser_pool.page(viewport={"width": 1920, "height": 1080}) as page:
+            temp_pdf_path = await self._render_page_to_pdf(page, html_path, slide_num, temp_dir)
         
+        print(f"  ✓ Slide {slide_num} rendered")
+        return temp_pdf_path
+    
+    async def render_slide_cached(self, cache: SlideRenderCache, key: Optional[str], slide_info: Dict, temp_dir: Path) -> Path:
+        """Reuse the cached PDF of an unchanged slide, otherwise render and cache it."""
+        slide_num = slide_info['number']
+        temp_pdf_path = temp_dir / f"slide_{slide_num:02d}.pdf"
+        
+        entry = cache.lookup(key)
+        manifest = cache.load_manifest(entry) if entry else None
+        if manifest and (entry / manifest['pdf']).exists():
+            shutil.copy2(entry / manifest['pdf'], temp_pdf_path)
+            print(f"  ✓ Slide {slide_num} unchanged, using cached render")
+            return temp_pdf_path
+        
+        pdf_path = await self.render_slide_to_pdf(slide_info, temp_dir)
+        cache.store(key, [pdf_path], {'pdf': pdf_path.name})
+        return pdf_path
+    
+    async def _render_page_to_pdf(self, page, html_path: Path, slide_num: int, temp_dir: Path) -> Path:
         try:
             # Set exact viewport to 1920x1080
             await page.set_viewport_size({"width": 1920, "height": 1080})
@@ -171,14 +194,10 @@ class PresentationToPDFAPI:
                 print_background=True,
                 prefer_css_page_size=False
             )
-            
-            print(f"  ✓ Slide {slide_num} rendered")
             return temp_pdf_path
             
         except Exception as e:
             raise RuntimeError(f"Error rendering slide {slide_num}: {e}")
-        finally:
-            await page.close()
     
     def combine_pdfs(self, pdf_paths: List[Path], output_path: Path) -> None:
         """Combine multiple PDF files into a single PDF."""
@@ -214,35 +233,22 @@ class PresentationToPDFAPI:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser
-            async with async_playwright() as p:
-                print("🌐 Launching browser...")
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling'
-                    ]
-                )
-                
-                try:
-                    # Process all slides concurrently using asyncio.gather
-                    print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
-                    
-                    tasks = [
-                        self.render_slide_to_pdf(browser, slide_info, temp_path)
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for all slides to be processed concurrently
-                    pdf_paths = await asyncio.gather(*tasks)
-                    
-                finally:
-                    await browser.close()
+            # Only slides whose HTML or assets changed since the last export are rendered
+            cache = SlideRenderCache(self.presentation_dir, "pdf", PDF_RENDERER_VERSION)
+            keys = [cache.key(slide_info['path']) for slide_info in self.slides_info]
+            
+            # Process all slides concurrently; the shared browser pool caps open pages
+            print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
+            
+            tasks = [
+                self.render_slide_cached(cache, key, slide_info, temp_path)
+                for key, slide_info in zip(keys, self.slides_info)
+            ]
+            
+            # Wait for all slides to be processed concurrently
+            pdf_paths = await asyncio.gather(*tasks)
+            cache.prune(keys)
+            print(f"🗂️ Slides: {cache.summary()}")
             
             # Create output path
             presentation_name = self.metadata.get('presentation_name', 'presentation')
@@ -257,7 +263,6 @@ class PresentationToPDFAPI:
                 timestamp = int(asyncio.get_event_loop().time())
                 filename = f"{presentation_name}_{timestamp}.pdf"
                 final_output = output_dir / filename
-                import shutil
                 shutil.copy2(temp_output_path, final_output)
                 return final_output, len(self.slides_info)
             else:
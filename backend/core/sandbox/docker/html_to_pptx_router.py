@@ -13,16 +13,14 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import tempfile
 import shutil
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+from browser_pool import browser_pool
+from slide_render_cache import SlideRenderCache
 
 try:
     from pptx import Presentation
@@ -41,6 +39,9 @@ workspace_dir = "/workspace"
 output_dir = Path(workspace_dir) / "downloads"
 output_dir.mkdir(parents=True, exist_ok=True)
 
+# Bump when slide analysis changes so cached analyses are redone
+PPTX_RENDERER_VERSION = "pptx-1"
+
 
 class ConvertRequest(BaseModel):
     presentation_path: str = Field(..., description="Path to the presentation folder containing metadata.json")
@@ -1287,6 +1288,45 @@ class OptimizedHTMLToPPTXConverter:
                 except Exception:
                     pass
     
+    def load_cached_analysis(self, cache: SlideRenderCache, key: Optional[str], slide_info: Dict) -> Optional[Dict]:
+        """Slide analysis from the render cache, with image paths pointing into the cache entry."""
+        entry = cache.lookup(key)
+        manifest = cache.load_manifest(entry) if entry else None
+        if not manifest:
+            return None
+        
+        visual_elements = [
+            {**element, 'image_path': entry / element['image_path']}
+            for element in manifest['visual_elements']
+        ]
+        background_path = entry / manifest['background'] if manifest.get('background') else None
+        if any(not element['image_path'].exists() for element in visual_elements):
+            return None
+        
+        return {
+            'slide_info': slide_info,
+            'visual_elements': visual_elements,
+            'background_path': background_path,
+            'text_elements': [TextElement(**element) for element in manifest['text_elements']]
+        }
+    
+    def store_analysis(self, cache: SlideRenderCache, key: Optional[str], slide_analysis: Dict) -> None:
+        """Cache a slide analysis together with the images it references."""
+        visual_elements = slide_analysis['visual_elements']
+        background_path = slide_analysis['background_path']
+        
+        files = [element['image_path'] for element in visual_elements if element['image_path'].exists()]
+        if len(files) != len(visual_elements):
+            return
+        if background_path and background_path.exists():
+            files.append(background_path)
+        
+        cache.store(key, files, {
+            'visual_elements': [{**element, 'image_path': element['image_path'].name} for element in visual_elements],
+            'background': background_path.name if background_path and background_path.exists() else None,
+            'text_elements': [asdict(element) for element in slide_analysis['text_elements']]
+        })
+    
     async def convert_to_pptx(self, store_locally: bool = True) -> tuple:
         """Main conversion method - optimized and reliable."""
         # Load metadata
@@ -1296,131 +1336,104 @@ class OptimizedHTMLToPPTXConverter:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser for processing
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling',
-                        '--disable-backgrounding-occluded-windows',
-                        '--disable-renderer-backgrounding',
-                        '--disable-features=VizDisplayCompositor',
-                        '--disable-extensions',
-                        '--disable-plugins',
-                        '--disable-web-security',
-                        '--disable-features=TranslateUI',
-                        '--disable-ipc-flooding-protection'
-                    ]
-                )
+            # Only slides whose HTML or assets changed since the last export are analyzed
+            cache = SlideRenderCache(self.presentation_dir, "pptx", PPTX_RENDERER_VERSION)
+            keys = [cache.key(slide_info['path']) for slide_info in self.slides_info]
+            
+            # Process all slides in parallel on the shared browser pool
+            # Create semaphore to limit concurrent operations
+            semaphore = asyncio.Semaphore(5)
+            
+            async def process_single_slide(slide_info: Dict, key: Optional[str]) -> Dict:
+                """Process a single slide with controlled concurrency."""
+                cached_analysis = self.load_cached_analysis(cache, key, slide_info)
+                if cached_analysis:
+                    return cached_analysis
                 
-                try:
-                    # Process all slides in parallel
-                    # Create semaphore to limit concurrent operations
-                    semaphore = asyncio.Semaphore(5)
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
-                    
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
+                async with semaphore:
+                    slide_num = slide_info['number']
                     
-                    async def process_single_slide(slide_info: Dict) -> Dict:
-                        """Process a single slide with controlled concurrency."""
-                        async with semaphore:
-                            slide_num = slide_info['number']
-                            
+                    try:
+                        # Create a new page for this slide
+                        async with browser_pool.page(viewport={'width': 1920, 'height': 1080}) as page:
+                            # Set exact viewport dimensions
+                            await page.set_viewport_size({"width": 1920, "height": 1080})
+                            await page.emulate_media(media='screen')
+                        
+                            # Force device pixel ratio to 1
+                            await page.evaluate(r"""
+                                () => {
+                                    Object.defineProperty(window, 'devicePixelRatio', {
+                                        get: () => 1
+                                    });
+                                }
+                            """)
+                        
                             try:
-                                # Create a new page for this slide
-                                page = await context.new_page()
-                                
-                                # Set exact viewport dimensions
-                                await page.set_viewport_size({"width": 1920, "height": 1080})
-                                await page.emulate_media(media='screen')
-                                
-                                # Force device pixel ratio to 1
-                                await page.evaluate(r"""
-                                    () => {
-                                        Object.defineProperty(window, 'devicePixelRatio', {
-                                            get: () => 1
-                                        });
-                                    }
-                                """)
-                                
-                                try:
-                                    # Extract visual elements
-                                    visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
-                                    
-                                    # Capture clean background
-                                    background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
-                                    
-                                    # Extract text elements
-                                    text_elements = await self.extract_text_elements(page, slide_info['path'])
-                                    
-                                    slide_analysis = {
-                                        'slide_info': slide_info,
-                                        'visual_elements': visual_elements,
-                                        'background_path': background_path,
-                                        'text_elements': text_elements
-                                    }
-                                    
-                                    return slide_analysis
-                                    
-                                except Exception as e:
-                                    return {
-                                        'slide_info': slide_info,
-                                        'visual_elements': [],
-                                        'background_path': None,
-                                        'text_elements': [],
-                                        'error': str(e)
-                                    }
-                                    
-                                finally:
-                                    # Always close the page to free memory
-                                    await page.close()
-                                    
+                                # Extract visual elements
+                                visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
+                            
+                                # Capture clean background
+                                background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
+                            
+                                # Extract text elements
+                                text_elements = await self.extract_text_elements(page, slide_info['path'])
+                            
+                                slide_analysis = {
+                                    'slide_info': slide_info,
+                                    'visual_elements': visual_elements,
+                                    'background_path': background_path,
+                                    'text_elements': text_elements
+                                }
+                                self.store_analysis(cache, key, slide_analysis)
+                            
+                                return slide_analysis
+                            
                             except Exception as e:
                                 return {
                                     'slide_info': slide_info,
                                     'visual_elements': [],
                                     'background_path': None,
                                     'text_elements': [],
-                                    'error': f"Page creation failed: {str(e)}"
+                                    'error': str(e)
                                 }
-                    
-                    # Launch ALL slides in parallel
-                    parallel_tasks = [
-                        process_single_slide(slide_info) 
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for ALL slides to complete in parallel
-                    slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
-                    
-                    # Handle any top-level exceptions
-                    processed_analyses = []
-                    for i, result in enumerate(slide_analyses):
-                        if isinstance(result, Exception):
-                            error_analysis = {
-                                'slide_info': self.slides_info[i],
-                                'visual_elements': [],
-                                'background_path': None,
-                                'text_elements': [],
-                                'error': str(result)
-                            }
-                            processed_analyses.append(error_analysis)
-                        else:
-                            processed_analyses.append(result)
-                    
-                    all_slide_analyses = processed_analyses
-                    
-                finally:
-                    await browser.close()
+                            
+                    except Exception as e:
+                        return {
+                            'slide_info': slide_info,
+                            'visual_elements': [],
+                            'background_path': None,
+                            'text_elements': [],
+                            'error': f"Page creation failed: {str(e)}"
+                        }
+            
+            # Launch ALL slides in parallel
+            parallel_tasks = [
+                process_single_slide(slide_info, key) 
+                for key, slide_info in zip(keys, self.slides_info)
+            ]
+            
+            # Wait for ALL slides to complete in parallel
+            slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
+            
+            # Handle any top-level exceptions
+            processed_analyses = []
+            for i, result in enumerate(slide_analyses):
+                if isinstance(result, Exception):
+                    error_analysis = {
+                        'slide_info': self.slides_info[i],
+                        'visual_elements': [],
+                        'background_path': None,
+                        'text_elements': [],
+                        'error': str(result)
+                    }
+                    processed_analyses.append(error_analysis)
+                else:
+                    processed_analyses.append(result)
+            
+            all_slide_analyses = processed_analyses
+            cache.prune(keys)
+            print(f"🗂️ Slides: {cache.summary()}")
             
             # Build PPTX presentation
             # Create new PowerPoint presentation
@@ -1,10 +1,13 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
 import os
 from pathlib import Path
 
+from browser_pool import browser_pool
+
 # Import PDF router, PPTX router, DOCX router, and Visual HTML Editor router
 from html_to_pdf_router import router as pdf_router
 from visual_html_editor_router import router as editor_router
@@ -22,7 +25,17 @@ class WorkspaceDirMiddleware(BaseHTTPMiddleware):
             os.makedirs(workspace_dir, exist_ok=True)
         return await call_next(request)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up the shared render browser so the first export doesn't pay for the launch
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        print(f"⚠️ Browser warm-up failed, it will be launched on first use: {e}")
+    yield
+    await browser_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(WorkspaceDirMiddleware)
 
 # Include routers
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Per-slide render cache for the presentation converters.
+
+Every export used to render (PDF) or analyze (PPTX: visual elements, clean
+background, text elements) every slide again, even when only one slide of the
+deck had changed. The cache stores each slide's render output in
+`<presentation>/.render-cache/<kind>/<key>/`, where the key is a hash of the
+slide HTML, the local assets it references (images, stylesheets, scripts) and
+the renderer version. A re-export only renders slides whose key is missing and
+reassembles the output from the cached entries.
+
+Entries are written to a staging directory and renamed into place, so a
+crashed or concurrent render never leaves a half-written entry behind. Entries
+no longer referenced by the deck are pruned after each export.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import unquote
+
+CACHE_DIR_NAME = ".render-cache"
+MANIFEST_NAME = "entry.json"
+# Staging directories older than this belong to a render that died
+STALE_STAGING_SECONDS = 3600
+
+# src="...", href="..." and url(...) references in HTML and inline CSS
+_ASSET_PATTERN = re.compile(r"""(?:src|href)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+)["']?\s*\)""", re.IGNORECASE)
+_REMOTE_PREFIXES = ("http://", "https://", "//", "data:", "blob:", "mailto:", "javascript:", "#")
+
+
+def _local_assets(html: str, base_dir: Path) -> Iterable[Path]:
+    seen = set()
+    for match in _ASSET_PATTERN.finditer(html):
+        ref = (match.group(1) or match.group(2) or "").strip()
+        if not ref or ref.lower().startswith(_REMOTE_PREFIXES):
+            continue
+        if ref.startswith("file://"):
+            ref = ref[len("file://"):]
+        ref = unquote(ref.split("#", 1)[0].split("?", 1)[0])
+        if not ref or ref in seen:
+            continue
+        seen.add(ref)
+        yield Path(ref) if os.path.isabs(ref) else base_dir / ref
+
+
+def slide_fingerprint(html_path: Path, renderer_version: str) -> str:
+    """Hash of the slide HTML, its local assets and the renderer version."""
+    digest = hashlib.sha256(renderer_version.encode())
+    html_bytes = html_path.read_bytes()
+    digest.update(html_bytes)
+    html = html_bytes.decode("utf-8", errors="ignore")
+    for asset in sorted(_local_assets(html, html_path.parent), key=str):
+        digest.update(str(asset).encode())
+        try:
+            digest.update(hashlib.sha256(asset.read_bytes()).digest() if asset.is_file() else b"-")
+        except OSError:
+            digest.update(b"-")
+    return digest.hexdigest()
+
+
+class SlideRenderCache:
+    """Render outputs of one kind ("pdf", "pptx") for one presentation."""
+
+    def __init__(self, presentation_dir: Path, kind: str, renderer_version: str):
+        self.root = Path(presentation_dir) / CACHE_DIR_NAME / kind
+        self.renderer_version = renderer_version
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, html_path: Path) -> Optional[str]:
+        try:
+            return slide_fingerprint(html_path, self.renderer_version)
+        except OSError as e:
+            print(f"⚠️ Could not fingerprint {html_path}, rendering without cache: {e}")
+            return None
+
+    def lookup(self, key: Optional[str]) -> Optional[Path]:
+        """Directory of the cached entry for `key`, or None on a miss."""
+        entry = self.root / key if key else None
+        if entry is not None and entry.is_dir():
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: Optional[str], files: Iterable[Path], manifest: Optional[Dict] = None) -> Optional[Path]:
+        """Copy render outputs (and an optional JSON manifest) into the entry for `key`.
+
+        Returns the entry directory, or None if nothing was cached.
+        """
+        if not key:
+            return None
+        staging = self.root / f".tmp-{uuid.uuid4().hex}"
+        entry = self.root / key
+        try:
+            staging.mkdir(parents=True, exist_ok=True)
+            for path in files:
+                shutil.copy2(path, staging / path.name)
+            if manifest is not None:
+                (staging / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+            os.rename(staging, entry)
+        except OSError as e:
+            # Usually another render of the same content got there first
+            if not entry.is_dir():
+                print(f"⚠️ Could not cache slide render {key[:12]}: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+        return entry if entry.is_dir() else None
+
+    @staticmethod
+    def load_manifest(entry: Path) -> Optional[Dict]:
+        try:
+            return json.loads((entry / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def prune(self, keep: Iterable[Optional[str]]):
+        """Remove entries not in `keep` and staging dirs left behind by dead renders."""
+        if not self.root.is_dir():
+            return
+        keep = {key for key in keep if key}
+        now = time.time()
+        for child in self.root.iterdir():
+            if child.name in keep:
+                continue
+            if child.name.startswith(".tmp-"):
+                try:
+                    if now - child.stat().st_mtime < STALE_STAGING_SECONDS:
+                        continue  # A concurrent render is still writing it
+                except OSError:
+                    continue
+            shutil.rmtree(child, ignore_errors=True)
+
+    def summary(self) -> str:
+        return f"{self.hits} cached, {self.misses} rendered"
@@ -0,0 +1,225 @@
+"""
+In-memory stand-in for daytona_sdk.AsyncDaytona.
+
+Selected with SANDBOX_BACKEND=fake. It implements the subset of the Daytona
+client and sandbox API the backend uses (create/get/start/stop/delete/list,
+preview links, labels, sessions, exec and a small in-memory filesystem), so the
+sandbox pool and the tools' sandbox plumbing can be exercised without a Daytona
+account. Nothing actually runs: commands succeed with empty output.
+
+`create_delay` / `start_delay` simulate provisioning latency, and `calls` counts
+API calls per method.
+"""
+
+import asyncio
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+from daytona_sdk import SandboxState
+
+
+@dataclass
+class FakePreviewLink:
+    url: str
+    token: str
+
+
+@dataclass
+class FakeExecuteResponse:
+    exit_code: int = 0
+    result: str = ""
+
+    @property
+    def output(self) -> str:
+        return self.result
+
+
+@dataclass
+class FakeSessionExecuteResponse:
+    cmd_id: str
+    exit_code: Optional[int] = None
+    output: str = ""
+    stdout: str = ""
+    stderr: str = ""
+
+
+@dataclass
+class FakeCommand:
+    id: str
+    command: str
+    exit_code: Optional[int] = 0
+
+
+@dataclass
+class FakeSessionCommandLogsResponse:
+    output: str = ""
+    stdout: str = ""
+    stderr: str = ""
+
+
+@dataclass
+class FakeSession:
+    session_id: str
+    commands: List[FakeCommand] = field(default_factory=list)
+
+
+class FakeProcess:
+    def __init__(self):
+        self.sessions: Dict[str, FakeSession] = {}
+
+    def _session(self, session_id: str) -> FakeSession:
+        if session_id not in self.sessions:
+            raise RuntimeError(f"Session {session_id} not found")
+        return self.sessions[session_id]
+
+    def _command(self, session_id: str, command_id: str) -> FakeCommand:
+        for command in self._session(session_id).commands:
+            if command.id == command_id:
+                return command
+        raise RuntimeError(f"Command {command_id} not found in session {session_id}")
+
+    async def create_session(self, session_id: str, request_timeout: Optional[float] = None):
+        if session_id in self.sessions:
+            raise RuntimeError(f"Session {session_id} already exists")
+        self.sessions[session_id] = FakeSession(session_id)
+
+    async def get_session(self, session_id: str, request_timeout: Optional[float] = None) -> FakeSession:
+        return self._session(session_id)
+
+    async def list_sessions(self, request_timeout: Optional[float] = None) -> List[FakeSession]:
+        return list(self.sessions.values())
+
+    async def delete_session(self, session_id: str, request_timeout: Optional[float] = None):
+        self.sessions.pop(session_id, None)
+
+    async def execute_session_command(self, session_id: str, req, timeout: Optional[int] = None) -> FakeSessionExecuteResponse:
+        command = FakeCommand(id=uuid.uuid4().hex, command=req.command)
+        self._session(session_id).commands.append(command)
+        # Async commands report their exit code through get_session_command
+        return FakeSessionExecuteResponse(cmd_id=command.id, exit_code=None if getattr(req, "run_async", None) or getattr(req, "var_async", None) else command.exit_code)
+
+    async def get_session_command(self, session_id: str, command_id: str, request_timeout: Optional[float] = None) -> FakeCommand:
+        return self._command(session_id, command_id)
+
+    async def get_session_command_logs(self, session_id: str, command_id: str, request_timeout: Optional[float] = None) -> FakeSessionCommandLogsResponse:
+        self._command(session_id, command_id)
+        return FakeSessionCommandLogsResponse()
+
+    async def get_session_command_logs_async(
+        self,
+        session_id: str,
+        command_id: str,
+        on_stdout: Callable[[str], None],
+        on_stderr: Callable[[str], None],
+    ) -> None:
+        # Commands produce no output and have already exited, so the stream ends at once
+        self._command(session_id, command_id)
+
+    async def exec(self, command: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None, timeout: Optional[int] = None) -> FakeExecuteResponse:
+        return FakeExecuteResponse()
+
+
+class FakeFileSystem:
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+
+    async def upload_file(self, src: Union[str, bytes], dst: str, timeout: int = 1800):
+        # As in the SDK, a str source is a local file path
+        if isinstance(src, str):
+            with open(src, 'rb') as f:
+                src = f.read()
+        self.files[dst] = src
+
+    async def download_file(self, remote_path: str, timeout: int = 1800) -> bytes:
+        if remote_path not in self.files:
+            raise FileNotFoundError(remote_path)
+        return self.files[remote_path]
+
+    async def delete_file(self, path: str, recursive: bool = False, request_timeout: Optional[float] = None):
+        self.files.pop(path, None)
+
+    async def create_folder(self, path: str, mode: str, request_timeout: Optional[float] = None):
+        return None
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id: str, labels: Optional[Dict[str, str]], env: Optional[Dict[str, str]], backend: "FakeAsyncDaytona"):
+        self.id = sandbox_id
+        self.labels = dict(labels or {})
+        self.env = dict(env or {})
+        self.state = SandboxState.STARTED
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.process = FakeProcess()
+        self.fs = FakeFileSystem()
+        self._backend = backend
+
+    async def get_preview_link(self, port: int, request_timeout: Optional[float] = None) -> FakePreviewLink:
+        self._backend.calls["get_preview_link"] += 1
+        return FakePreviewLink(url=f"https://{port}-{self.id}.fake.daytona.local", token=f"token-{self.id}")
+
+    async def set_labels(self, labels: Dict[str, str], request_timeout: Optional[float] = None) -> Dict[str, str]:
+        self._backend.calls["set_labels"] += 1
+        self.labels = dict(labels)
+        return self.labels
+
+
+class FakeAsyncDaytona:
+    """Drop-in replacement for AsyncDaytona backed by a dict of FakeSandbox objects."""
+
+    def __init__(self, create_delay: float = 0.0, start_delay: float = 0.0):
+        self.create_delay = create_delay
+        self.start_delay = start_delay
+        self.sandboxes: Dict[str, FakeSandbox] = {}
+        self.calls: Counter = Counter()
+
+    async def create(self, params: Any = None, *, timeout: float = 60, on_snapshot_create_logs: Optional[Callable[[str], None]] = None) -> FakeSandbox:
+        self.calls["create"] += 1
+        if self.create_delay:
+            await asyncio.sleep(self.create_delay)
+        sandbox = FakeSandbox(
+            sandbox_id=str(uuid.uuid4()),
+            labels=getattr(params, "labels", None),
+            env=getattr(params, "env_vars", None),
+            backend=self,
+        )
+        self.sandboxes[sandbox.id] = sandbox
+        return sandbox
+
+    async def get(self, sandbox_id_or_name: str, request_timeout: Optional[float] = None) -> FakeSandbox:
+        self.calls["get"] += 1
+        sandbox = self.sandboxes.get(sandbox_id_or_name)
+        if sandbox is None:
+            raise Exception(f"Sandbox with ID {sandbox_id_or_name} not found")
+        return sandbox
+
+    async def start(self, sandbox: FakeSandbox, timeout: float = 60):
+        self.calls["start"] += 1
+        if self.start_delay:
+            await asyncio.sleep(self.start_delay)
+        sandbox.state = SandboxState.STARTED
+
+    async def stop(self, sandbox: FakeSandbox, timeout: float = 60):
+        self.calls["stop"] += 1
+        sandbox.state = SandboxState.STOPPED
+
+    async def delete(self, sandbox: FakeSandbox, timeout: float = 60):
+        self.calls["delete"] += 1
+        self.sandboxes.pop(sandbox.id, None)
+
+    async def list(self, query: Any = None, request_timeout: Optional[float] = None) -> AsyncIterator[FakeSandbox]:
+        """Iterate over the sandboxes matching a ListSandboxesQuery (labels and created_at_before only)."""
+        self.calls["list"] += 1
+        labels = getattr(query, "labels", None) or {}
+        created_before = getattr(query, "created_at_before", None)
+        for sandbox in list(self.sandboxes.values()):
+            if any(sandbox.labels.get(k) != v for k, v in labels.items()):
+                continue
+            if created_before and datetime.fromisoformat(sandbox.created_at) >= created_before:
+                continue
+            yield sandbox
+
+    async def close(self):
+        return None
@@ -0,0 +1,180 @@
+"""
+Batched file transfer between the backend and a sandbox.
+
+Writing a file used to take a create_folder, an upload_file and a
+set_file_permissions round trip, and reading N files took N downloads. These
+helpers move many files in a single transfer instead:
+
+- upload_files packs the files (with their modes) into one tar archive,
+  uploads it and extracts it with a single exec; parent directories are
+  created by tar
+- download_files has the sandbox tar the requested paths, downloads the
+  archive once and unpacks it in memory
+
+If the tar path fails (for example `tar` is missing from a custom image) both
+fall back to per-file calls run with bounded parallelism
+(SANDBOX_FILE_TRANSFER_CONCURRENCY).
+"""
+
+import asyncio
+import io
+import posixpath
+import shlex
+import tarfile
+import time
+import uuid
+from typing import Awaitable, Dict, Iterable, List, Optional, TypeVar, Union
+
+from daytona_sdk import AsyncSandbox
+
+from core.utils.config import config
+from core.utils.logger import logger
+
+T = TypeVar("T")
+
+
+def _archive_path() -> str:
+    return f"/tmp/.kortix-transfer-{uuid.uuid4().hex}.tar"
+
+
+def _concurrency(limit: Optional[int]) -> int:
+    return limit or int(config.SANDBOX_FILE_TRANSFER_CONCURRENCY or 8)
+
+
+async def gather_bounded(aws: Iterable[Awaitable[T]], limit: Optional[int] = None) -> List[T]:
+    """Await all awaitables with at most `limit` in flight; results keep their order."""
+    semaphore = asyncio.Semaphore(_concurrency(limit))
+
+    async def run(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
+
+
+def _encode(content: Union[str, bytes]) -> bytes:
+    return content.encode() if isinstance(content, str) else content
+
+
+def _build_tar(files: Dict[str, bytes], mode: int) -> bytes:
+    buffer = io.BytesIO()
+    mtime = time.time()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for path, content in files.items():
+            info = tarfile.TarInfo(name=path.lstrip("/"))
+            info.size = len(content)
+            info.mode = mode
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+async def _exec(sandbox: AsyncSandbox, command: str, timeout: int = 120) -> str:
+    response = await sandbox.process.exec(command, timeout=timeout)
+    if response.exit_code != 0:
+        raise RuntimeError(f"Sandbox command failed ({response.exit_code}): {response.result}")
+    return response.result
+
+
+async def _upload_individually(sandbox: AsyncSandbox, files: Dict[str, bytes], permissions: Optional[str], limit: Optional[int]):
+    parents = sorted({posixpath.dirname(path) for path in files} - {"", "/"})
+
+    async def ensure_folder(folder: str):
+        try:
+            await sandbox.fs.create_folder(folder, "755")
+        except Exception:
+            pass  # Directory might already exist
+
+    async def upload(path: str, content: bytes):
+        await sandbox.fs.upload_file(content, path)
+        if permissions:
+            await sandbox.fs.set_file_permissions(path, permissions)
+
+    await gather_bounded((ensure_folder(folder) for folder in parents), limit)
+    await gather_bounded((upload(path, content) for path, content in files.items()), limit)
+
+
+async def upload_files(
+    sandbox: AsyncSandbox,
+    files: Dict[str, Union[str, bytes]],
+    permissions: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """Write several files (absolute paths) into the sandbox, creating parent directories.
+
+    `permissions` is an octal string such as "644" applied to every file.
+    """
+    if not files:
+        return
+    payload = {path: _encode(content) for path, content in files.items()}
+
+    if len(payload) == 1 and not permissions:
+        # A bare single-file write is already one round trip
+        path, content = next(iter(payload.items()))
+        try:
+            await sandbox.fs.upload_file(content, path)
+            return
+        except Exception:
+            pass  # Parent directory may be missing; the tar path creates it
+
+    archive = _archive_path()
+    try:
+        await sandbox.fs.upload_file(_build_tar(payload, int(permissions or "644", 8)), archive)
+        await _exec(sandbox, f"tar -xpf {archive} -C / --no-same-owner; status=$?; rm -f {archive}; exit $status")
+    except Exception as e:
+        logger.warning(f"Batched upload of {len(payload)} files failed, falling back to per-file uploads: {e}")
+        await _upload_individually(sandbox, payload, permissions, limit)
+
+
+async def download_files(
+    sandbox: AsyncSandbox,
+    paths: Iterable[str],
+    limit: Optional[int] = None,
+) -> Dict[str, bytes]:
+    """Read several files (absolute paths) from the sandbox in one transfer.
+
+    Paths that don't exist or can't be read are left out of the result.
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    if len(paths) == 1:
+        try:
+            return {paths[0]: await sandbox.fs.download_file(paths[0])}
+        except Exception:
+            return {}
+
+    archive = _archive_path()
+    members = " ".join(shlex.quote(path.lstrip("/")) for path in paths)
+    try:
+        # tar exits non-zero when some paths are missing but still writes the rest
+        await _exec(sandbox, f"tar -cf {archive} -C / --ignore-failed-read {members} 2>/dev/null; test -f {archive}")
+        try:
+            data = await sandbox.fs.download_file(archive)
+        finally:
+            try:
+                await sandbox.process.exec(f"rm -f {archive}")
+            except Exception:
+                pass
+    except Exception as e:
+        logger.warning(f"Batched download of {len(paths)} files failed, falling back to per-file downloads: {e}")
+        return await _download_individually(sandbox, paths, limit)
+
+    wanted = {path.lstrip("/"): path for path in paths}
+    result: Dict[str, bytes] = {}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tar:
+        for member in tar.getmembers():
+            if member.isfile() and member.name in wanted:
+                result[wanted[member.name]] = tar.extractfile(member).read()
+    return result
+
+
+async def _download_individually(sandbox: AsyncSandbox, paths: List[str], limit: Optional[int]) -> Dict[str, bytes]:
+    async def download(path: str) -> Optional[bytes]:
+        try:
+            return await sandbox.fs.download_file(path)
+        except Exception:
+            return None
+
+    contents = await gather_bounded((download(path) for path in paths), limit)
+    return {path: content for path, content in zip(paths, contents) if content is not None}
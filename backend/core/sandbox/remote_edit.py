@@ -0,0 +1,211 @@
+"""
+File edits executed inside the sandbox.
+
+str_replace and edit_file used to download the whole file, edit it in the API
+worker and upload the whole file back. For large generated files (CSV, HTML,
+logs) that moves the payload over the network twice per edit. The primitives
+here ship only the edit to the sandbox, apply it there with a small Python
+helper and return a summary:
+
+- replace: exact, unique match replacement
+- patch_lines: replace line ranges (hunks), optionally guarded by the sha256
+  of the content the hunks were computed against
+- append: append text
+
+Each returns an EditResult with the changed line counts, the first changed
+line and the sha256/size of the new content. The file is rewritten atomically
+with its mode preserved. A return value of None means the primitive could not
+run (no python3 in the image, unexpected output...), and callers should fall
+back to the whole-file path.
+"""
+
+import base64
+import difflib
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from daytona_sdk import AsyncSandbox
+
+from core.utils.logger import logger
+
+# Requests larger than this are uploaded as a file instead of passed on the command line
+MAX_INLINE_REQUEST_BYTES = 64 * 1024
+
+_EDIT_SCRIPT = r'''
+import base64, hashlib, json, os, sys, tempfile
+
+def load_request(arg):
+    if arg.startswith("@"):
+        with open(arg[1:], "rb") as f:
+            raw = f.read()
+        os.unlink(arg[1:])
+        return json.loads(raw)
+    return json.loads(base64.b64decode(arg))
+
+def apply(req):
+    path = req["path"]
+    if not os.path.isfile(path):
+        return {"error": "missing"}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        content = f.read()
+    op = req["op"]
+    if op == "replace":
+        old, new = req["old"], req["new"]
+        count = content.count(old)
+        if count == 0:
+            return {"error": "not_found"}
+        if count > 1:
+            return {"error": "multiple", "lines": [i + 1 for i, line in enumerate(content.split("\n")) if old in line]}
+        index = content.index(old)
+        updated = content[:index] + new + content[index + len(old):]
+        first_line = content.count("\n", 0, index) + 1
+        removed, added = old.count("\n") + 1, new.count("\n") + 1
+    elif op == "patch":
+        expected = req.get("expect_sha256")
+        if expected and hashlib.sha256(content.encode("utf-8")).hexdigest() != expected:
+            return {"error": "conflict"}
+        lines = content.splitlines(keepends=True)
+        hunks = sorted(req["hunks"], key=lambda h: h[0], reverse=True)
+        removed = added = 0
+        for start, end, text in hunks:
+            if start < 0 or end < start or end > len(lines):
+                return {"error": "out_of_range"}
+            replacement = text.splitlines(keepends=True)
+            removed += end - start
+            added += len(replacement)
+            lines[start:end] = replacement
+        updated = "".join(lines)
+        first_line = min(h[0] for h in hunks) + 1 if hunks else 1
+    elif op == "append":
+        updated = content + req["content"]
+        first_line = content.count("\n") + 1
+        removed, added = 0, req["content"].count("\n") + (0 if req["content"].endswith("\n") else 1)
+    else:
+        return {"error": "unknown_op"}
+
+    data = updated.encode("utf-8")
+    mode = os.stat(path).st_mode & 0o7777
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".edit-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return {
+        "ok": True,
+        "line": first_line,
+        "lines_added": added,
+        "lines_removed": removed,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+    }
+
+try:
+    result = apply(load_request(sys.argv[1]))
+except UnicodeDecodeError:
+    result = {"error": "binary"}
+except Exception as e:
+    result = {"error": "failed", "detail": str(e)}
+print("EDIT_RESULT " + json.dumps(result))
+'''
+
+_EDIT_SCRIPT_B64 = base64.b64encode(_EDIT_SCRIPT.encode()).decode()
+_RESULT_PREFIX = "EDIT_RESULT "
+
+
+@dataclass
+class EditResult:
+    """Outcome of a remote edit. `error` is None on success."""
+    error: Optional[str] = None
+    line: Optional[int] = None
+    lines_added: int = 0
+    lines_removed: int = 0
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    match_lines: List[int] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def summary(self) -> str:
+        return f"+{self.lines_added} -{self.lines_removed} lines at line {self.line} (sha256 {self.sha256[:12] if self.sha256 else '?'}, {self.size} bytes)"
+
+
+async def _run(sandbox: AsyncSandbox, request: Dict[str, Any]) -> Optional[EditResult]:
+    encoded = base64.b64encode(json.dumps(request).encode()).decode()
+    try:
+        if len(encoded) > MAX_INLINE_REQUEST_BYTES:
+            request_path = f"/tmp/.kortix-edit-{uuid.uuid4().hex}.json"
+            await sandbox.fs.upload_file(json.dumps(request).encode(), request_path)
+            argument = f"@{request_path}"
+        else:
+            argument = encoded
+        response = await sandbox.process.exec(f"echo {_EDIT_SCRIPT_B64} | base64 -d | python3 - {argument}", timeout=60)
+    except Exception as e:
+        logger.debug(f"Remote {request['op']} on {request['path']} could not run: {e}")
+        return None
+
+    output = response.result or ""
+    line = next((line for line in reversed(output.splitlines()) if line.startswith(_RESULT_PREFIX)), None)
+    if line is None:
+        logger.debug(f"Remote {request['op']} on {request['path']} returned no result (exit {response.exit_code}): {output[:200]}")
+        return None
+    data = json.loads(line[len(_RESULT_PREFIX):])
+    if data.get("error") in ("failed", "binary"):
+        logger.debug(f"Remote {request['op']} on {request['path']} failed: {data}")
+        return None
+    return EditResult(
+        error=data.get("error"),
+        line=data.get("line"),
+        lines_added=data.get("lines_added", 0),
+        lines_removed=data.get("lines_removed", 0),
+        sha256=data.get("sha256"),
+        size=data.get("size"),
+        match_lines=data.get("lines", []),
+    )
+
+
+async def replace(sandbox: AsyncSandbox, path: str, old: str, new: str) -> Optional[EditResult]:
+    """Replace the single occurrence of `old` with `new`.
+
+    Errors: "missing" (no such file), "not_found", "multiple" (see match_lines).
+    """
+    return await _run(sandbox, {"op": "replace", "path": path, "old": old, "new": new})
+
+
+async def patch_lines(
+    sandbox: AsyncSandbox,
+    path: str,
+    hunks: List[Tuple[int, int, str]],
+    expected_sha256: Optional[str] = None,
+) -> Optional[EditResult]:
+    """Replace 0-based, end-exclusive line ranges with new text.
+
+    With `expected_sha256` the patch is refused ("conflict") if the file no
+    longer has the content the hunks were computed against.
+    """
+    return await _run(sandbox, {"op": "patch", "path": path, "hunks": [list(h) for h in hunks], "expect_sha256": expected_sha256})
+
+
+async def append(sandbox: AsyncSandbox, path: str, content: str) -> Optional[EditResult]:
+    """Append `content` to the file."""
+    return await _run(sandbox, {"op": "append", "path": path, "content": content})
+
+
+def line_hunks(original: str, updated: str) -> List[Tuple[int, int, str]]:
+    """Line-range hunks that turn `original` into `updated` (for patch_lines)."""
+    old_lines = original.splitlines(keepends=True)
+    new_lines = updated.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        (i1, i2, "".join(new_lines[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
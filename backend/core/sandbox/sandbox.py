@@ -29,7 +29,24 @@ if daytona_config.target:
 else:
     logger.warning("No Daytona target found in environment variables")
 
-daytona = AsyncDaytona(daytona_config)
+_daytona = None
+
+def get_daytona():
+    """The process-wide Daytona client, built on first use.
+
+    Building AsyncDaytona needs credentials, so it is deferred until a sandbox
+    is actually touched: importing this module works offline.
+    """
+    global _daytona
+    if _daytona is None:
+        if config.SANDBOX_BACKEND == "fake":
+            # In-memory backend for offline development and testing
+            from core.sandbox.fake_daytona import FakeAsyncDaytona
+            logger.warning("Using the in-memory fake Daytona backend (SANDBOX_BACKEND=fake)")
+            _daytona = FakeAsyncDaytona()
+        else:
+            _daytona = AsyncDaytona(daytona_config)
+    return _daytona
 
 async def get_or_start_sandbox(sandbox_id: str) -> AsyncSandbox:
     """Retrieve a sandbox by ID, check its state, and start it if needed."""
@@ -37,18 +54,18 @@ async def get_or_start_sandbox(sandbox_id: str) -> AsyncSandbox:
     logger.info(f"Getting or starting sandbox with ID: {sandbox_id}")
 
     try:
-        sandbox = await daytona.get(sandbox_id)
+        sandbox = await get_daytona().get(sandbox_id)
         
         # Check if sandbox needs to be started
         if sandbox.state in [SandboxState.ARCHIVED, SandboxState.STOPPED, SandboxState.ARCHIVING]:
             logger.info(f"Sandbox is in {sandbox.state} state. Starting...")
             try:
-                await daytona.start(sandbox)
+                await get_daytona().start(sandbox)
                 
                 # Wait for sandbox to reach STARTED state
                 for _ in range(30):
                     await asyncio.sleep(1)
-                    sandbox = await daytona.get(sandbox_id)
+                    sandbox = await get_daytona().get(sandbox_id)
                     if sandbox.state == SandboxState.STARTED:
                         break
                 
@@ -79,18 +96,9 @@ async def start_supervisord_session(sandbox: AsyncSandbox):
         # Don't fail if supervisord already running
         logger.warning(f"Could not start supervisord: {str(e)}")
 
-async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
-    """Create a new sandbox with all required services configured and running."""
-    
-    logger.info("Creating new Daytona sandbox environment")
-    # logger.debug("Configuring sandbox with snapshot and environment variables")
-    
-    labels = None
-    if project_id:
-        # logger.debug(f"Using sandbox_id as label: {project_id}")
-        labels = {'id': project_id}
-        
-    params = CreateSandboxFromSnapshotParams(
+def build_sandbox_params(password: str, labels: dict = None) -> CreateSandboxFromSnapshotParams:
+    """Creation parameters for a sandbox from the configured snapshot."""
+    return CreateSandboxFromSnapshotParams(
         snapshot=Configuration.SANDBOX_SNAPSHOT_NAME,
         public=True,
         labels=labels,
@@ -115,9 +123,24 @@ async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
         auto_stop_interval=15,
         auto_archive_interval=30,
     )
+
+async def create_sandbox(password: str, project_id: str = None, labels: dict = None, backend=None) -> AsyncSandbox:
+    """Create a new sandbox with all required services configured and running.
+
+    `backend` overrides the module's Daytona client (the sandbox pool passes its own).
+    """
+    
+    logger.info("Creating new Daytona sandbox environment")
+    # logger.debug("Configuring sandbox with snapshot and environment variables")
+    
+    if labels is None and project_id:
+        # logger.debug(f"Using sandbox_id as label: {project_id}")
+        labels = {'id': project_id}
+        
+    params = build_sandbox_params(password, labels)
     
     # Create the sandbox
-    sandbox = await daytona.create(params)
+    sandbox = await (backend or get_daytona()).create(params)
     logger.info(f"Sandbox created with ID: {sandbox.id}")
     
     # Start supervisord in a session for new sandbox
@@ -132,10 +155,10 @@ async def delete_sandbox(sandbox_id: str) -> bool:
 
     try:
         # Get the sandbox
-        sandbox = await daytona.get(sandbox_id)
+        sandbox = await get_daytona().get(sandbox_id)
         
         # Delete the sandbox
-        await daytona.delete(sandbox)
+        await get_daytona().delete(sandbox)
         
         logger.info(f"Successfully deleted sandbox {sandbox_id}")
         return True
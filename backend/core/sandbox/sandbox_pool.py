@@ -0,0 +1,382 @@
+"""
+Pre-warmed sandbox pool.
+
+Creating a sandbox on a project's first sandbox tool call (or when a trigger
+starts a run) used to cost a Daytona create, a fixed 5s sleep and two
+sequential preview-link lookups. SandboxPool keeps a few started, unassigned
+sandboxes from the configured snapshot ready and binds one to a project when
+it needs a sandbox:
+
+- sandboxes are created ahead of time with the `pool=warm` label, supervisord
+  started and preview links fetched (concurrently), so binding is a label
+  update plus the `projects` row write
+- the pool is sized to recent demand: the number of sandboxes expected to be
+  claimed within SANDBOX_POOL_MAX_IDLE_SECONDS at the rate seen over
+  SANDBOX_POOL_DEMAND_WINDOW_SECONDS, clamped to
+  [SANDBOX_POOL_MIN_SIZE, SANDBOX_POOL_MAX_SIZE]
+- warm sandboxes unclaimed for SANDBOX_POOL_MAX_IDLE_SECONDS are deleted
+  before Daytona's auto-stop would put them to sleep
+- a warm sandbox is taken off the pool synchronously, so two concurrent
+  callers can never be handed the same one; each process owns its own pool
+- warm sandboxes only live in process memory, so the refiller also sweeps
+  `pool=warm` sandboxes older than SANDBOX_POOL_MAX_IDLE_SECONDS: a live pool
+  would already have recycled them, so they were left by a process that died
+
+The pool is opt-in: SANDBOX_POOL_MAX_SIZE defaults to 0, which disables it.
+When it is disabled or empty a sandbox is created on demand as before. Instead
+of the fixed 5s sleep, provisioning polls the sandbox until its VNC and website
+services accept connections.
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from daytona_sdk import AsyncSandbox, ListSandboxesQuery
+
+from core.sandbox.sandbox import create_sandbox, get_daytona
+from core.utils.config import config
+from core.utils.logger import logger
+
+POOL_LABEL = "pool"
+POOL_LABEL_WARM = "warm"
+
+# Ports of the services supervisord starts: noVNC and the website server
+SERVICE_PORTS = (6080, 8080)
+SERVICES_READY_TIMEOUT = 30.0
+SERVICES_POLL_INTERVAL = 0.5
+
+
+@dataclass
+class ProvisionedSandbox:
+    """A started sandbox together with the metadata stored on its project."""
+    sandbox: AsyncSandbox
+    sandbox_id: str
+    sandbox_pass: str
+    vnc_url: Optional[str]
+    website_url: Optional[str]
+    token: Optional[str]
+    created_at: float = field(default_factory=time.monotonic)
+    from_pool: bool = False
+
+    def project_metadata(self) -> Dict[str, Optional[str]]:
+        """The `projects.sandbox` JSON for this sandbox."""
+        return {
+            'id': self.sandbox_id,
+            'pass': self.sandbox_pass,
+            'vnc_preview': self.vnc_url,
+            'sandbox_url': self.website_url,
+            'token': self.token,
+        }
+
+
+def _link_url(link) -> str:
+    return link.url if hasattr(link, 'url') else str(link).split("url='")[1].split("'")[0]
+
+
+def _link_token(link) -> Optional[str]:
+    if hasattr(link, 'token'):
+        return link.token
+    if "token='" in str(link):
+        return str(link).split("token='")[1].split("'")[0]
+    return None
+
+
+async def wait_for_services(
+    sandbox: AsyncSandbox,
+    ports: Tuple[int, ...] = SERVICE_PORTS,
+    timeout: float = SERVICES_READY_TIMEOUT,
+    interval: float = SERVICES_POLL_INTERVAL,
+) -> bool:
+    """Poll until every port in `ports` accepts connections inside the sandbox.
+
+    Returns False if they are not all up within `timeout`; the sandbox is still
+    usable then, only its preview links may not answer yet.
+    """
+    probe = "bash -c '" + "; ".join(
+        f"(echo > /dev/tcp/127.0.0.1/{port}) 2>/dev/null || exit 1" for port in ports
+    ) + "'"
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            response = await sandbox.process.exec(probe, timeout=5)
+            if response.exit_code == 0:
+                return True
+        except Exception as e:
+            logger.debug(f"Service readiness probe failed for sandbox {sandbox.id}: {e}")
+        if loop.time() + interval > deadline:
+            logger.warning(f"Sandbox {sandbox.id} services on ports {ports} not ready after {timeout}s")
+            return False
+        await asyncio.sleep(interval)
+
+
+def _created_at(sandbox) -> Optional[datetime]:
+    created_at = getattr(sandbox, 'created_at', None)
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(created_at, datetime) and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at if isinstance(created_at, datetime) else None
+
+
+async def fetch_preview_links(sandbox: AsyncSandbox) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return (vnc_url, website_url, token) for a sandbox, best effort."""
+    try:
+        vnc_link, website_link = await asyncio.gather(sandbox.get_preview_link(6080), sandbox.get_preview_link(8080))
+        return _link_url(vnc_link), _link_url(website_link), _link_token(vnc_link)
+    except Exception:
+        # If preview link extraction fails, still proceed but leave fields None
+        logger.warning(f"Failed to extract preview links for sandbox {sandbox.id}", exc_info=True)
+        return None, None, None
+
+
+class SandboxPool:
+    """Per-process pool of started, unassigned sandboxes."""
+
+    def __init__(
+        self,
+        backend=None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        demand_window: Optional[float] = None,
+        max_idle: Optional[float] = None,
+        refill_interval: float = 5.0,
+    ):
+        self._backend = backend
+        self.min_size = min_size if min_size is not None else int(config.SANDBOX_POOL_MIN_SIZE or 0)
+        self.max_size = max_size if max_size is not None else int(config.SANDBOX_POOL_MAX_SIZE or 0)
+        self.demand_window = demand_window or float(config.SANDBOX_POOL_DEMAND_WINDOW_SECONDS or 900)
+        self.max_idle = max_idle or float(config.SANDBOX_POOL_MAX_IDLE_SECONDS or 600)
+        self.refill_interval = refill_interval
+        self._ready: Deque[ProvisionedSandbox] = deque()
+        self._demand: Deque[float] = deque()
+        self._warming = 0
+        self._refiller: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._deleting: Set[asyncio.Task] = set()
+        self._closed = False
+        self._next_sweep = 0.0
+        self._foreign_warm = 0
+        self.hits = 0
+        self.misses = 0
+        self.swept = 0
+
+    @property
+    def backend(self):
+        # Resolved lazily: the Daytona client needs credentials and honours SANDBOX_BACKEND=fake
+        return self._backend or get_daytona()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    async def provision(self, labels: Optional[Dict[str, str]] = None) -> ProvisionedSandbox:
+        """Create and start a sandbox, wait for its services and fetch its preview links."""
+        sandbox_pass = str(uuid.uuid4())
+        sandbox = await create_sandbox(sandbox_pass, labels=labels, backend=self.backend)
+        try:
+            _, (vnc_url, website_url, token) = await asyncio.gather(
+                wait_for_services(sandbox), fetch_preview_links(sandbox)
+            )
+        except Exception:
+            await self.discard(sandbox)
+            raise
+        return ProvisionedSandbox(sandbox, sandbox.id, sandbox_pass, vnc_url, website_url, token)
+
+    def _trim_demand(self, now: float):
+        while self._demand and now - self._demand[0] > self.demand_window:
+            self._demand.popleft()
+
+    def target_size(self) -> int:
+        """Warm sandboxes to keep: expected claims within one idle lifetime, clamped."""
+        if not self.enabled:
+            return 0
+        self._trim_demand(time.monotonic())
+        expected = math.ceil(len(self._demand) * self.max_idle / self.demand_window)
+        return max(self.min_size, min(self.max_size, expected))
+
+    def _take(self) -> Optional[ProvisionedSandbox]:
+        """Pop the oldest warm sandbox that is still fresh (no awaits: atomic within the process)."""
+        now = time.monotonic()
+        while self._ready:
+            entry = self._ready.popleft()
+            if now - entry.created_at < self.max_idle:
+                return entry
+            self._schedule_delete(entry.sandbox)
+        return None
+
+    async def acquire(self, project_id: str) -> ProvisionedSandbox:
+        """Return a started sandbox labelled for `project_id`, from the pool if one is warm."""
+        entry = None
+        if self.enabled:
+            # Only tracked when enabled: target_size(), which trims it, returns early otherwise
+            self._demand.append(time.monotonic())
+            entry = self._take()
+            self.start()
+
+        if entry is None:
+            self.misses += 1
+            return await self.provision({'id': project_id})
+
+        self.hits += 1
+        entry.from_pool = True
+        try:
+            await entry.sandbox.set_labels({'id': project_id})
+        except Exception as e:
+            logger.warning(f"Failed to relabel pooled sandbox {entry.sandbox_id} for project {project_id}: {e}")
+        logger.info(f"Bound warm sandbox {entry.sandbox_id} to project {project_id}")
+        return entry
+
+    def start(self):
+        """Start (or wake) the background refiller."""
+        if self._closed:
+            return
+        self._wake.set()
+        if self._refiller is None or self._refiller.done():
+            self._refiller = asyncio.create_task(self._refill_loop())
+
+    async def _refill_loop(self):
+        failures = 0
+        try:
+            while not self._closed:
+                if time.monotonic() >= self._next_sweep:
+                    await self.sweep_orphans()
+                    self._next_sweep = time.monotonic() + self.max_idle
+                self._evict_expired()
+                target = self.target_size()
+                missing = target - len(self._ready) - self._warming
+                if missing > 0:
+                    warmed = await asyncio.gather(*(self._warm_one() for _ in range(missing)))
+                    # Back off while Daytona keeps refusing (quota, outage)
+                    failures = 0 if any(warmed) else failures + 1
+                elif target == 0 and not self._ready and not self._foreign_warm:
+                    # Kept running while other warm sandboxes exist, in case they are orphans the next sweep deletes
+                    break
+
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=min(self.refill_interval * 2 ** failures, 300))
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+
+    async def _warm_one(self) -> bool:
+        self._warming += 1
+        try:
+            entry = await self.provision({POOL_LABEL: POOL_LABEL_WARM})
+            self._ready.append(entry)
+            logger.debug(f"Warm sandbox {entry.sandbox_id} added to pool ({len(self._ready)} ready)")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to warm a pooled sandbox: {e}")
+            return False
+        finally:
+            self._warming -= 1
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        keep = target = self.target_size()
+        fresh: Deque[ProvisionedSandbox] = deque()
+        for entry in self._ready:
+            if now - entry.created_at >= self.max_idle or keep <= 0:
+                self._schedule_delete(entry.sandbox)
+            else:
+                fresh.append(entry)
+                keep -= 1
+        if len(fresh) != len(self._ready):
+            logger.debug(f"Recycled {len(self._ready) - len(fresh)} warm sandboxes (target {target})")
+        self._ready = fresh
+
+    async def sweep_orphans(self) -> int:
+        """Delete `pool=warm` sandboxes older than max_idle; return how many were deleted.
+
+        Live pools recycle their warm sandboxes before they reach max_idle, so an
+        older one belongs to a pool whose process crashed or restarted. Younger
+        warm sandboxes owned by other processes are counted, not touched.
+        """
+        own = {entry.sandbox_id for entry in self._ready}
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_idle)
+        orphans, foreign = [], 0
+        try:
+            async for sandbox in self.backend.list(ListSandboxesQuery(labels={POOL_LABEL: POOL_LABEL_WARM})):
+                if sandbox.id in own:
+                    continue
+                created_at = _created_at(sandbox)
+                if created_at is not None and created_at < cutoff:
+                    orphans.append(sandbox)
+                else:
+                    foreign += 1
+        except Exception as e:
+            logger.warning(f"Failed to list warm sandboxes for the orphan sweep: {e}")
+            return 0
+
+        self._foreign_warm = foreign
+        if orphans:
+            await asyncio.gather(*(self.discard(sandbox) for sandbox in orphans))
+            self.swept += len(orphans)
+            logger.info(f"Deleted {len(orphans)} orphaned warm sandboxes")
+        return len(orphans)
+
+    def _schedule_delete(self, sandbox: AsyncSandbox):
+        task = asyncio.create_task(self.discard(sandbox))
+        self._deleting.add(task)
+        task.add_done_callback(self._deleting.discard)
+
+    async def discard(self, sandbox: AsyncSandbox):
+        """Delete a sandbox through the pool's backend, logging failures."""
+        try:
+            await self.backend.delete(sandbox)
+        except Exception as e:
+            logger.warning(f"Failed to delete pooled sandbox {sandbox.id}: {e}")
+
+    async def close(self):
+        """Stop refilling and delete every unclaimed warm sandbox."""
+        # Also checked by the loop: wait_for can swallow a cancel that races the wake event
+        self._closed = True
+        if self._refiller and not self._refiller.done():
+            self._refiller.cancel()
+            try:
+                await self._refiller
+            except asyncio.CancelledError:
+                pass
+        ready, self._ready = list(self._ready), deque()
+        await asyncio.gather(*(self.discard(entry.sandbox) for entry in ready))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "ready": len(self._ready),
+            "warming": self._warming,
+            "target": self.target_size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "swept": self.swept,
+        }
+
+
+sandbox_pool = SandboxPool()
+
+
+async def bind_project_sandbox(client, project_id: str) -> ProvisionedSandbox:
+    """Give a project a started sandbox (warm from the pool when possible) and persist it on the project."""
+    provisioned = await sandbox_pool.acquire(project_id)
+
+    update_result = await client.table('projects').update({
+        'sandbox': provisioned.project_metadata()
+    }).eq('project_id', project_id).execute()
+
+    if not update_result.data:
+        # Cleanup the sandbox if the DB update failed
+        await sandbox_pool.discard(provisioned.sandbox)
+        raise Exception("Database update failed when storing sandbox metadata")
+
+    return provisioned
@@ -0,0 +1,127 @@
+"""
+Run-scoped sandbox handles shared by all sandbox tools.
+
+Every SandboxToolsBase subclass used to resolve its sandbox on its own: one
+`projects` query plus one `get_or_start_sandbox` Daytona round trip per tool
+class per run. SandboxHandleRegistry resolves a project's sandbox once per run
+and hands the same handle to every tool:
+
+- single-flight: concurrent tool calls for the same project wait on one
+  lookup/creation instead of racing to create or start the sandbox
+- a resolved handle is trusted for SANDBOX_HANDLE_REVALIDATE_SECONDS; after
+  that the next access re-checks the sandbox (and restarts it if it was
+  stopped or archived) without touching the database again
+
+Registries are attached to the run's ThreadManager, so a handle never
+outlives its run.
+"""
+
+import asyncio
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from daytona_sdk import AsyncSandbox
+
+from core.sandbox.sandbox import get_or_start_sandbox
+from core.sandbox.sandbox_pool import bind_project_sandbox
+from core.utils.config import config
+from core.utils.logger import logger
+
+
+@dataclass
+class SandboxHandle:
+    """A project's resolved sandbox and its access metadata."""
+    project_id: str
+    sandbox: AsyncSandbox
+    sandbox_id: str
+    sandbox_pass: Optional[str]
+    sandbox_url: Optional[str]
+    validated_at: float
+
+
+async def create_project_sandbox(client, project_id: str) -> SandboxHandle:
+    """Bind a started sandbox to a project (see SandboxPool) and return its handle."""
+    provisioned = await bind_project_sandbox(client, project_id)
+    sandbox = provisioned.sandbox
+    if provisioned.from_pool:
+        # Warm sandboxes may have been idle for a while; make sure it is still running
+        sandbox = await get_or_start_sandbox(provisioned.sandbox_id)
+    return SandboxHandle(project_id, sandbox, provisioned.sandbox_id, provisioned.sandbox_pass, provisioned.website_url, time.monotonic())
+
+
+class SandboxHandleRegistry:
+    """Per-run map of project_id -> SandboxHandle with single-flight resolution."""
+
+    def __init__(self, db=None, revalidate_after: Optional[float] = None):
+        self.db = db
+        self.revalidate_after = revalidate_after if revalidate_after is not None else float(config.SANDBOX_HANDLE_REVALIDATE_SECONDS or 30)
+        self._handles: Dict[str, SandboxHandle] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _is_fresh(self, handle: Optional[SandboxHandle]) -> bool:
+        return handle is not None and time.monotonic() - handle.validated_at < self.revalidate_after
+
+    async def get(self, project_id: str) -> SandboxHandle:
+        """Resolve the project's sandbox, creating or starting it if needed."""
+        handle = self._handles.get(project_id)
+        if self._is_fresh(handle):
+            return handle
+
+        lock = self._locks.setdefault(project_id, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(project_id)
+            if self._is_fresh(handle):
+                return handle
+
+            if handle is not None:
+                handle = await self._revalidate(handle)
+            else:
+                handle = await self._resolve(project_id)
+            self._handles[project_id] = handle
+            return handle
+
+    async def _revalidate(self, handle: SandboxHandle) -> SandboxHandle:
+        """Re-check a known sandbox (starting it if it went to sleep); no DB access."""
+        handle.sandbox = await get_or_start_sandbox(handle.sandbox_id)
+        handle.validated_at = time.monotonic()
+        return handle
+
+    async def _resolve(self, project_id: str) -> SandboxHandle:
+        if self.db is None:
+            raise RuntimeError("SandboxHandleRegistry has no database connection")
+
+        client = await self.db.client
+        project = await client.table('projects').select('*').eq('project_id', project_id).execute()
+        if not project.data or len(project.data) == 0:
+            raise ValueError(f"Project {project_id} not found")
+
+        sandbox_info = project.data[0].get('sandbox') or {}
+
+        # If there is no sandbox recorded for this project, create one lazily
+        if not sandbox_info.get('id'):
+            logger.debug(f"No sandbox recorded for project {project_id}; creating lazily")
+            return await create_project_sandbox(client, project_id)
+
+        sandbox = await get_or_start_sandbox(sandbox_info['id'])
+        return SandboxHandle(
+            project_id=project_id,
+            sandbox=sandbox,
+            sandbox_id=sandbox_info['id'],
+            sandbox_pass=sandbox_info.get('pass'),
+            sandbox_url=sandbox_info.get('sandbox_url'),
+            validated_at=time.monotonic(),
+        )
+
+
+_run_registries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_sandbox_registry(thread_manager) -> SandboxHandleRegistry:
+    """Return the registry shared by all sandbox tools of the run owning `thread_manager`."""
+    registry = _run_registries.get(thread_manager)
+    if registry is None:
+        registry = SandboxHandleRegistry(db=thread_manager.db)
+        _run_registries[thread_manager] = registry
+    return registry
@@ -0,0 +1,50 @@
+import inspect
+
+import pytest
+from daytona_sdk import AsyncDaytona, SessionExecuteRequest
+from daytona_sdk._async.filesystem import AsyncFileSystem
+from daytona_sdk._async.process import AsyncProcess
+from daytona_sdk._async.sandbox import AsyncSandbox
+
+from core.sandbox.fake_daytona import FakeAsyncDaytona, FakeFileSystem, FakeProcess, FakeSandbox
+
+
+def _parameters(method):
+    return list(inspect.signature(method).parameters)
+
+
+class TestFakeDaytona:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("fake, real, methods", [
+        (FakeAsyncDaytona, AsyncDaytona, ["create", "get", "start", "stop", "delete", "list"]),
+        (FakeSandbox, AsyncSandbox, ["get_preview_link", "set_labels"]),
+        (FakeProcess, AsyncProcess, [
+            "create_session", "get_session", "list_sessions", "delete_session", "execute_session_command",
+            "get_session_command", "get_session_command_logs", "get_session_command_logs_async", "exec",
+        ]),
+        (FakeFileSystem, AsyncFileSystem, ["upload_file", "delete_file", "create_folder"]),
+    ])
+    def test_signatures_match_the_sdk(self, fake, real, methods):
+        for method in methods:
+            assert _parameters(getattr(fake, method)) == _parameters(getattr(real, method)), method
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_session_commands_can_be_followed(self):
+        sandbox = await FakeAsyncDaytona().create()
+        process = sandbox.process
+        await process.create_session("session-1")
+
+        response = await process.execute_session_command(
+            session_id="session-1",
+            req=SessionExecuteRequest(command="ls", var_async=True),
+        )
+        received = []
+        await process.get_session_command_logs_async("session-1", response.cmd_id, received.append, received.append)
+        command = await process.get_session_command("session-1", response.cmd_id)
+        logs = await process.get_session_command_logs(session_id="session-1", command_id=response.cmd_id)
+
+        assert response.exit_code is None
+        assert received == []
+        assert command.command == "ls" and command.exit_code == 0
+        assert logs.output == ""
@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+from core.sandbox import sandbox_pool as sandbox_pool_module
+from core.sandbox.fake_daytona import FakeAsyncDaytona, FakeExecuteResponse, FakeProcess
+from core.sandbox.sandbox_pool import POOL_LABEL, POOL_LABEL_WARM, SandboxPool, wait_for_services
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+class TestSandboxPool:
+    @pytest.fixture
+    def backend(self):
+        return FakeAsyncDaytona()
+
+    @pytest_asyncio.fixture
+    async def pool(self, backend):
+        pool = SandboxPool(backend=backend, min_size=2, max_size=3, refill_interval=0.05)
+        yield pool
+        await pool.close()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_provision_starts_supervisord_and_fetches_links(self, backend):
+        pool = SandboxPool(backend=backend, max_size=0)
+        provisioned = await pool.provision({'id': 'project-1'})
+
+        sandbox = backend.sandboxes[provisioned.sandbox_id]
+        assert sandbox.labels == {'id': 'project-1'}
+        assert "supervisord-session" in sandbox.process.sessions
+        assert provisioned.vnc_url == f"https://6080-{sandbox.id}.fake.daytona.local"
+        assert provisioned.website_url == f"https://8080-{sandbox.id}.fake.daytona.local"
+        assert provisioned.token == f"token-{sandbox.id}"
+        assert sandbox.env["VNC_PASSWORD"] == provisioned.sandbox_pass
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_disabled_pool_creates_on_demand(self, backend):
+        pool = SandboxPool(backend=backend, max_size=0)
+        provisioned = await pool.acquire('project-1')
+
+        assert not provisioned.from_pool
+        assert pool.stats()["misses"] == 1
+        assert pool.target_size() == 0
+        assert backend.calls["create"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_warm_sandbox_is_bound_to_project(self, pool, backend):
+        pool.start()
+        await _wait_for(lambda: len(pool._ready) == 2)
+        warm_ids = {entry.sandbox_id for entry in pool._ready}
+        assert all(backend.sandboxes[sandbox_id].labels == {POOL_LABEL: POOL_LABEL_WARM} for sandbox_id in warm_ids)
+
+        provisioned = await pool.acquire('project-1')
+
+        assert provisioned.from_pool
+        assert provisioned.sandbox_id in warm_ids
+        assert backend.sandboxes[provisioned.sandbox_id].labels == {'id': 'project-1'}
+        assert pool.stats()["hits"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_acquires_get_distinct_sandboxes(self, pool):
+        pool.start()
+        await _wait_for(lambda: len(pool._ready) == 2)
+
+        results = await asyncio.gather(*(pool.acquire(f'project-{i}') for i in range(4)))
+
+        assert len({result.sandbox_id for result in results}) == 4
+        assert sum(result.from_pool for result in results) == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_expired_warm_sandboxes_are_deleted(self, backend):
+        pool = SandboxPool(backend=backend, min_size=1, max_size=1, max_idle=0.05, refill_interval=0.05)
+        try:
+            pool.start()
+            await _wait_for(lambda: len(pool._ready) == 1)
+            first = pool._ready[0].sandbox_id
+
+            await _wait_for(lambda: first not in backend.sandboxes)
+            assert backend.calls["delete"] >= 1
+        finally:
+            await pool.close()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_close_deletes_unclaimed_sandboxes(self, backend):
+        pool = SandboxPool(backend=backend, min_size=2, max_size=2, refill_interval=0.05)
+        pool.start()
+        await _wait_for(lambda: len(pool._ready) == 2)
+        claimed = await pool.acquire('project-1')
+
+        await pool.close()
+
+        assert list(backend.sandboxes) == [claimed.sandbox_id]
+        assert pool.stats()["ready"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_preview_links_discard_the_sandbox(self, backend, monkeypatch):
+        async def failing_links(sandbox):
+            raise RuntimeError("preview service down")
+
+        monkeypatch.setattr(sandbox_pool_module, "fetch_preview_links", failing_links)
+        pool = SandboxPool(backend=backend, max_size=0)
+
+        with pytest.raises(RuntimeError):
+            await pool.provision({'id': 'project-1'})
+        assert backend.sandboxes == {}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_disabled_pool_does_not_record_demand(self, backend):
+        pool = SandboxPool(backend=backend, max_size=0)
+
+        for i in range(3):
+            await pool.acquire(f'project-{i}')
+
+        assert len(pool._demand) == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_sweep_deletes_orphaned_warm_sandboxes(self, backend):
+        pool = SandboxPool(backend=backend, min_size=1, max_size=1, max_idle=60)
+        orphan = await backend.create()
+        orphan.labels = {POOL_LABEL: POOL_LABEL_WARM}
+        orphan.created_at = (datetime.now(timezone.utc) - timedelta(seconds=120)).isoformat()
+        young = await backend.create()
+        young.labels = {POOL_LABEL: POOL_LABEL_WARM}
+        project = await backend.create()
+        project.labels = {'id': 'project-1'}
+        project.created_at = orphan.created_at
+
+        assert await pool.sweep_orphans() == 1
+
+        assert set(backend.sandboxes) == {young.id, project.id}
+        assert pool._foreign_warm == 1
+        assert pool.stats()["swept"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_wait_for_services_polls_until_ready(self, backend, monkeypatch):
+        probes = []
+
+        async def exec_(self, command, cwd=None, env=None, timeout=None):
+            probes.append(command)
+            return FakeExecuteResponse(exit_code=0 if len(probes) >= 3 else 1)
+
+        monkeypatch.setattr(FakeProcess, "exec", exec_)
+        sandbox = await backend.create()
+
+        assert await wait_for_services(sandbox, timeout=1, interval=0.01)
+        assert len(probes) == 3
+        assert "/dev/tcp/127.0.0.1/6080" in probes[0] and "/dev/tcp/127.0.0.1/8080" in probes[0]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_wait_for_services_gives_up_after_timeout(self, backend, monkeypatch):
+        async def exec_(self, command, cwd=None, env=None, timeout=None):
+            raise RuntimeError("toolbox not reachable")
+
+        monkeypatch.setattr(FakeProcess, "exec", exec_)
+        sandbox = await backend.create()
+
+        assert not await wait_for_services(sandbox, timeout=0.05, interval=0.01)
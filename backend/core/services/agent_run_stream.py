@@ -0,0 +1,337 @@
+"""
+Redis transports for agent run output.
+
+Two transports are supported, selected with AGENT_RUN_STREAM_TRANSPORT:
+
+list (default)
+    Responses are RPUSHed to `agent_run:{id}:responses` and every write is
+    announced with a "new" message on `agent_run:{id}:new_response`. Viewers
+    keep a pub/sub connection and re-read the list tail on each ping. Control
+    signals (STOP/END_STREAM/ERROR) travel on `agent_run:{id}:control`.
+
+stream
+    Responses are XADDed to `agent_run:{id}:stream`. Viewers wait for entries
+    after the last entry ID they saw, so an SSE client resumes from its
+    `Last-Event-ID` and needs no pub/sub connection. Control signals are
+    appended to the stream as well (and still published on the control channel
+    for the worker).
+
+    Waiting viewers don't each block a pooled connection in XREAD: the
+    process's StreamReadMultiplexer issues one XREAD BLOCK over every watched
+    stream on its own dedicated connection and hands the entries to the
+    viewers waiting on them.
+
+    Like the list, the stream keeps every entry of the run by default. With
+    AGENT_RUN_STREAM_MAXLEN set it is trimmed to roughly that many entries, and
+    late joiners and load_run_responses (the final DB update) then only see
+    the most recent ones.
+
+The worker and the API must be configured with the same transport.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.services import redis
+from core.utils.config import config
+from core.utils.logger import logger
+
+TRANSPORT_LIST = "list"
+TRANSPORT_STREAM = "stream"
+TRANSPORTS = (TRANSPORT_LIST, TRANSPORT_STREAM)
+
+# Stream entry fields
+STREAM_DATA_FIELD = "data"
+STREAM_STATUS_FIELD = "status"
+STREAM_CONTROL_FIELD = "control"
+
+STREAM_START_ID = "0-0"
+STREAM_READ_COUNT = 500
+# Block timeout of the shared XREAD; bounds how long a newly watched stream can go unread
+MULTIPLEXED_READ_BLOCK_MS = 1000
+
+
+def get_transport() -> str:
+    """Configured transport for agent run output."""
+    transport = (config.AGENT_RUN_STREAM_TRANSPORT or TRANSPORT_LIST).lower()
+    if transport not in TRANSPORTS:
+        logger.warning(f"Invalid AGENT_RUN_STREAM_TRANSPORT '{config.AGENT_RUN_STREAM_TRANSPORT}', using {TRANSPORT_LIST}")
+        return TRANSPORT_LIST
+    return transport
+
+
+def get_stream_maxlen() -> Optional[int]:
+    """Approximate number of entries a run stream is trimmed to, or None to keep them all."""
+    return int(config.AGENT_RUN_STREAM_MAXLEN or 0) or None
+
+
+def get_stream_block_ms() -> int:
+    return int(config.AGENT_RUN_STREAM_BLOCK_MS or 5000)
+
+
+def response_list_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:responses"
+
+
+def response_channel(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:new_response"
+
+
+def response_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:stream"
+
+
+@dataclass
+class StreamEntry:
+    """A single entry of a run output stream."""
+    id: str
+    data: Optional[str] = None
+    status: Optional[str] = None
+    control: Optional[str] = None
+
+    @classmethod
+    def from_fields(cls, entry_id: str, fields: Dict[str, str]) -> "StreamEntry":
+        return cls(
+            id=entry_id,
+            data=fields.get(STREAM_DATA_FIELD),
+            status=fields.get(STREAM_STATUS_FIELD),
+            control=fields.get(STREAM_CONTROL_FIELD),
+        )
+
+
+def _parse_xread_streams(result: Any) -> Dict[str, List[StreamEntry]]:
+    """Entries of an XREAD reply by stream key (RESP2 list or RESP3 dict)."""
+    if not result:
+        return {}
+    is_resp3 = isinstance(result, dict)
+    streams = result.items() if is_resp3 else result
+    entries: Dict[str, List[StreamEntry]] = {}
+    for key, stream_entries in streams:
+        if is_resp3:
+            # RESP3 wraps each stream's entries in an extra list
+            stream_entries = stream_entries[0] if stream_entries else []
+        entries.setdefault(key, []).extend(
+            StreamEntry.from_fields(entry_id, fields or {}) for entry_id, fields in stream_entries
+        )
+    return entries
+
+
+def _parse_xread(result: Any) -> List[StreamEntry]:
+    """Flatten an XREAD reply for a single stream."""
+    return [entry for entries in _parse_xread_streams(result).values() for entry in entries]
+
+
+def _id_key(entry_id: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+@dataclass
+class _Waiter:
+    last_id: str
+    count: int
+    future: asyncio.Future
+
+
+class StreamReadMultiplexer:
+    """Shares one blocking XREAD between every viewer of the process.
+
+    A viewer first reads what is already there with a non-blocking XREAD
+    (skipped when the reader has already seen the viewer's position). If there
+    is nothing new it registers as a waiter; a single reader task blocks
+    in XREAD on a dedicated connection over all streams that have waiters
+    (from the oldest position any waiter of a stream has seen) and resolves
+    each waiter with the entries after its own position. When a stream that
+    isn't part of the blocked XREAD gets a waiter, the XREAD is interrupted
+    with CLIENT UNBLOCK so the reader picks it up.
+    """
+
+    def __init__(self, read_block_ms: int = MULTIPLEXED_READ_BLOCK_MS, read_count: int = STREAM_READ_COUNT):
+        self.read_block_ms = read_block_ms
+        self.read_count = read_count
+        self._waiters: Dict[str, List[_Waiter]] = {}
+        # Newest entry ID the reader has seen per watched stream
+        self._latest: Dict[str, str] = {}
+        self._client = None
+        self._client_id: Optional[int] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._reading: Set[str] = set()
+
+    async def read(self, key: str, last_id: str, block_ms: int, count: int = STREAM_READ_COUNT) -> List[StreamEntry]:
+        """Entries of `key` after last_id, waiting up to block_ms for new ones."""
+        latest = self._latest.get(key)
+        if latest is None or _id_key(last_id) < _id_key(latest):
+            result = await redis.xread({key: last_id}, count=count)
+            entries = _parse_xread(result)
+            if entries:
+                return entries
+
+        waiter = _Waiter(last_id=last_id, count=count, future=asyncio.get_running_loop().create_future())
+        self._waiters.setdefault(key, []).append(waiter)
+        self._ensure_reader()
+        if self._reading and key not in self._reading:
+            await self._interrupt()
+        try:
+            return await asyncio.wait_for(waiter.future, timeout=block_ms / 1000)
+        except asyncio.TimeoutError:
+            return []
+        finally:
+            self._remove(key, waiter)
+
+    def _remove(self, key: str, waiter: _Waiter):
+        waiters = self._waiters.get(key)
+        if waiters is None:
+            return
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[key]
+            self._latest.pop(key, None)
+
+    def _ensure_reader(self):
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def _ensure_client(self):
+        if self._client is None:
+            client = redis.create_dedicated_client()
+            try:
+                self._client_id = await client.client_id()
+            except Exception:
+                await client.aclose()
+                raise
+            self._client = client
+        return self._client
+
+    async def _reset_client(self):
+        client, self._client, self._client_id = self._client, None, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+    async def _interrupt(self):
+        """Make the reader rebuild its XREAD to include newly watched streams."""
+        if self._client_id is None:
+            return
+        try:
+            redis_client = await redis.get_client()
+            await redis_client.client_unblock(self._client_id)
+        except Exception as e:
+            logger.warning(f"Failed to interrupt the multiplexed stream read: {e}")
+
+    async def _read_loop(self):
+        failures = 0
+        while self._waiters:
+            streams = {
+                key: min((waiter.last_id for waiter in waiters), key=_id_key)
+                for key, waiters in self._waiters.items()
+            }
+            try:
+                client = await self._ensure_client()
+                self._reading = set(streams)
+                result = await client.xread(streams, count=self.read_count, block=self.read_block_ms)
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Multiplexed stream read failed (attempt {failures}): {e}")
+                self._fail_waiters(streams, e)
+                await self._reset_client()
+                await asyncio.sleep(min(2 ** (failures - 1) * 0.5, 30))
+                continue
+            finally:
+                self._reading = set()
+
+            for key, entries in _parse_xread_streams(result).items():
+                self._deliver(key, entries)
+
+    def _deliver(self, key: str, entries: List[StreamEntry]):
+        if entries and key in self._waiters:
+            self._latest[key] = entries[-1].id
+        for waiter in tuple(self._waiters.get(key, ())):
+            if waiter.future.done():
+                continue
+            last = _id_key(waiter.last_id)
+            newer = [entry for entry in entries if _id_key(entry.id) > last]
+            if newer:
+                waiter.future.set_result(newer[:waiter.count])
+
+    def _fail_waiters(self, keys, error: Exception):
+        for key in keys:
+            for waiter in tuple(self._waiters.get(key, ())):
+                if not waiter.future.done():
+                    waiter.future.set_exception(error)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "streams": len(self._waiters),
+            "waiters": sum(len(waiters) for waiters in self._waiters.values()),
+        }
+
+    async def close(self):
+        """Stop the reader and close its connection; pending reads return nothing."""
+        if self._reader and not self._reader.done():
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        self._reader = None
+        for waiters in tuple(self._waiters.values()):
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_result([])
+        await self._reset_client()
+
+
+stream_read_multiplexer = StreamReadMultiplexer()
+
+
+async def read_stream_entries(
+    agent_run_id: str,
+    last_id: str = STREAM_START_ID,
+    block_ms: Optional[int] = None,
+    count: int = STREAM_READ_COUNT,
+) -> List[StreamEntry]:
+    """Read entries newer than last_id. With block_ms, wait up to that long for new ones."""
+    key = response_stream_key(agent_run_id)
+    if block_ms:
+        return await stream_read_multiplexer.read(key, last_id, block_ms, count=count)
+    result = await redis.xread({key: last_id}, count=count)
+    return _parse_xread(result)
+
+
+async def append_control_entry(agent_run_id: str, signal: str):
+    """Append a control signal to the run stream so stream viewers see it in order.
+
+    No-op for the list transport, where viewers receive signals via pub/sub.
+    """
+    if get_transport() != TRANSPORT_STREAM:
+        return
+    try:
+        await redis.xadd(response_stream_key(agent_run_id), {STREAM_CONTROL_FIELD: signal}, maxlen=get_stream_maxlen())
+    except Exception as e:
+        logger.warning(f"Failed to append control signal {signal} to stream for {agent_run_id}: {e}")
+
+
+async def load_run_responses(agent_run_id: str) -> List[Dict[str, Any]]:
+    """Return every response currently stored for a run by the configured transport."""
+    if get_transport() == TRANSPORT_STREAM:
+        entries = await redis.xrange(response_stream_key(agent_run_id))
+        return [json.loads(fields[STREAM_DATA_FIELD]) for _, fields in entries if fields.get(STREAM_DATA_FIELD)]
+    responses_json = await redis.lrange(response_list_key(agent_run_id), 0, -1)
+    return [json.loads(r) for r in responses_json]
+
+
+async def expire_run_output(agent_run_id: str, ttl: int):
+    """Set a TTL on the run output of both transports (runs may predate a transport switch)."""
+    for key in (response_list_key(agent_run_id), response_stream_key(agent_run_id)):
+        try:
+            await redis.expire(key, ttl)
+        except Exception as e:
+            logger.warning(f"Failed to set TTL on run output {key}: {str(e)}")
@@ -0,0 +1,257 @@
+"""
+Per-process Redis pub/sub multiplexer.
+
+Instead of every SSE stream opening its own pub/sub connection (one pooled
+connection per viewer), all subscriptions in the process share a single
+pub/sub connection:
+
+- channels are subscribed on Redis once and reference counted across
+  in-process subscribers
+- each message is fanned out to the asyncio queue of every Subscription
+  watching its channel
+- channels nobody watches any more are unsubscribed after
+  PUBSUB_IDLE_UNSUBSCRIBE_SECONDS (so a reconnecting viewer doesn't churn
+  SUBSCRIBE/UNSUBSCRIBE)
+- if the connection drops it is re-created, all channels are re-subscribed and
+  every subscriber receives a {"type": "reconnect"} message, since pub/sub
+  messages published in between are lost
+
+Usage:
+    subscription = await pubsub_multiplexer.subscribe(channel_a, channel_b)
+    try:
+        message = await subscription.get()  # {"type": "message", "channel": ..., "data": ...}
+    finally:
+        await subscription.close()
+
+Subscribers that only need to react to a message can pass `callback=` instead
+of consuming the queue; the callback runs inline in the reader task, so it
+must be quick and must not block.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from core.services import redis
+from core.utils.config import config
+from core.utils.logger import logger
+
+RECONNECT_MESSAGE_TYPE = "reconnect"
+
+
+class Subscription:
+    """A subscriber's view of one or more multiplexed channels."""
+
+    def __init__(
+        self,
+        multiplexer: "PubSubMultiplexer",
+        channels: Iterable[str],
+        callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.channels = tuple(dict.fromkeys(channels))
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.callback = callback
+        self._multiplexer = multiplexer
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for the next message on any of the subscribed channels."""
+        return await self.queue.get()
+
+    def _deliver(self, message: Dict[str, Any]):
+        if self._closed:
+            return
+        if self.callback is None:
+            self.queue.put_nowait(message)
+            return
+        try:
+            self.callback(message)
+        except Exception as e:
+            logger.warning(f"Pub/sub subscriber callback failed for {self.channels}: {e}")
+
+    async def close(self):
+        """Stop receiving messages; the channels are released in the multiplexer."""
+        if self._closed:
+            return
+        self._closed = True
+        await self._multiplexer._release(self)
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class PubSubMultiplexer:
+    """Shares one Redis pub/sub connection between all subscribers of a process."""
+
+    def __init__(self, idle_unsubscribe_seconds: Optional[float] = None, read_timeout: float = 1.0):
+        self._idle_unsubscribe_seconds = idle_unsubscribe_seconds
+        self.read_timeout = read_timeout
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._subscribed: Set[str] = set()
+        self._idle_since: Dict[str, float] = {}
+        self._has_channels = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    @property
+    def idle_unsubscribe_seconds(self) -> float:
+        if self._idle_unsubscribe_seconds is None:
+            self._idle_unsubscribe_seconds = float(config.PUBSUB_IDLE_UNSUBSCRIBE_SECONDS or 30)
+        return self._idle_unsubscribe_seconds
+
+    async def _ensure_started(self):
+        if self._pubsub is None:
+            self._pubsub = await redis.create_pubsub()
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def subscribe(self, *channels: str, callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Subscription:
+        """Subscribe to channels, sharing the Redis subscription with other subscribers.
+
+        Messages go to the subscription's queue, or to `callback` when given.
+        """
+        subscription = Subscription(self, channels, callback=callback)
+        async with self._lock:
+            await self._ensure_started()
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+                self._idle_since.pop(channel, None)
+
+            new_channels = [channel for channel in subscription.channels if channel not in self._subscribed]
+            if new_channels:
+                try:
+                    await self._pubsub.subscribe(*new_channels)
+                except Exception:
+                    self._forget(subscription)
+                    raise
+                self._subscribed.update(new_channels)
+                self._has_channels.set()
+        return subscription
+
+    def _forget(self, subscription: Subscription):
+        """Drop a subscription from the refcounts, marking channels without subscribers idle."""
+        now = time.monotonic()
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[channel]
+                if channel in self._subscribed:
+                    self._idle_since[channel] = now
+
+    async def _release(self, subscription: Subscription):
+        self._forget(subscription)
+        if self.idle_unsubscribe_seconds <= 0:
+            await self._unsubscribe_idle()
+
+    async def _unsubscribe_idle(self):
+        if not self._idle_since:
+            return
+        now = time.monotonic()
+        idle = [channel for channel, since in self._idle_since.items() if now - since >= self.idle_unsubscribe_seconds]
+        if not idle:
+            return
+        async with self._lock:
+            # Re-check under the lock: a subscriber may have come back meanwhile
+            idle = [channel for channel in idle if channel in self._idle_since and channel not in self._subscribers]
+            if not idle:
+                return
+            for channel in idle:
+                self._idle_since.pop(channel, None)
+                self._subscribed.discard(channel)
+            if not self._subscribed:
+                self._has_channels.clear()
+            try:
+                await self._pubsub.unsubscribe(*idle)
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe idle channels {idle}: {e}")
+
+    def _dispatch(self, message: Dict[str, Any]):
+        channel = message.get("channel")
+        data = message.get("data")
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        for subscription in tuple(self._subscribers.get(channel, ())):
+            subscription._deliver({"type": "message", "channel": channel, "data": data})
+
+    async def _read_loop(self):
+        failures = 0
+        while True:
+            try:
+                if not self._subscribed:
+                    await self._has_channels.wait()
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=self.read_timeout)
+                if message and message.get("type") == "message":
+                    self._dispatch(message)
+                await self._unsubscribe_idle()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Pub/sub multiplexer connection error (attempt {failures}): {e}")
+                await asyncio.sleep(min(2 ** (failures - 1) * 0.5, 30))
+                await self._reconnect()
+
+    async def _reconnect(self):
+        """Replace the pub/sub connection and re-subscribe to every live channel."""
+        async with self._lock:
+            old_pubsub, self._pubsub = self._pubsub, None
+            if old_pubsub is not None:
+                try:
+                    await old_pubsub.close()
+                except Exception:
+                    pass
+            try:
+                self._pubsub = await redis.create_pubsub()
+                if self._subscribed:
+                    await self._pubsub.subscribe(*self._subscribed)
+            except Exception as e:
+                logger.warning(f"Pub/sub multiplexer failed to reconnect: {e}")
+                return
+        logger.info(f"Pub/sub multiplexer reconnected with {len(self._subscribed)} channels")
+        for subscribers in tuple(self._subscribers.values()):
+            for subscription in tuple(subscribers):
+                subscription._deliver({"type": RECONNECT_MESSAGE_TYPE, "channel": None, "data": None})
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._subscribed),
+            "idle_channels": len(self._idle_since),
+            "subscriptions": len({s for subs in self._subscribers.values() for s in subs}),
+        }
+
+    async def close(self):
+        """Stop the reader and close the shared connection."""
+        if self._reader and not self._reader.done():
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        self._reader = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe()
+                await self._pubsub.close()
+            except Exception as e:
+                logger.warning(f"Error closing pub/sub multiplexer: {e}")
+            self._pubsub = None
+        self._subscribed.clear()
+        self._idle_since.clear()
+        self._has_channels.clear()
+
+
+pubsub_multiplexer = PubSubMultiplexer()
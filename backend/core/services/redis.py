@@ -16,46 +16,55 @@ _init_lock = asyncio.Lock()
 REDIS_KEY_TTL = 3600 * 24  # 24 hour TTL as safety mechanism
 
 
-def initialize():
-    """Initialize Redis connection pool and client using environment variables."""
-    global client, pool
-
+def _connection_settings() -> dict:
+    """Connection settings shared by the pool and dedicated clients, from environment variables."""
     # Load environment variables if not already loaded
     load_dotenv()
 
-    # Get Redis configuration
-    redis_host = os.getenv("REDIS_HOST", "redis")
-    redis_port = int(os.getenv("REDIS_PORT", 6379))
-    redis_password = os.getenv("REDIS_PASSWORD", "")
-    
-    # Connection pool configuration - optimized for production
-    max_connections = 128            # Reasonable limit for production
-    socket_timeout = 15.0            # 15 seconds socket timeout
-    connect_timeout = 10.0           # 10 seconds connection timeout
-    retry_on_timeout = not (os.getenv("REDIS_RETRY_ON_TIMEOUT", "True").lower() != "true")
-
-    logger.info(f"Initializing Redis connection pool to {redis_host}:{redis_port} with max {max_connections} connections")
-
-    # Create connection pool with production-optimized settings
-    pool = redis.ConnectionPool(
-        host=redis_host,
-        port=redis_port,
-        password=redis_password,
+    return dict(
+        host=os.getenv("REDIS_HOST", "redis"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        password=os.getenv("REDIS_PASSWORD", ""),
         decode_responses=True,
-        socket_timeout=socket_timeout,
-        socket_connect_timeout=connect_timeout,
+        socket_timeout=15.0,            # 15 seconds socket timeout
+        socket_connect_timeout=10.0,    # 10 seconds connection timeout
         socket_keepalive=True,
-        retry_on_timeout=retry_on_timeout,
+        retry_on_timeout=not (os.getenv("REDIS_RETRY_ON_TIMEOUT", "True").lower() != "true"),
         health_check_interval=30,
-        max_connections=max_connections,
     )
 
+
+def initialize():
+    """Initialize Redis connection pool and client using environment variables."""
+    global client, pool
+
+    settings = _connection_settings()
+    
+    # Connection pool configuration - optimized for production
+    max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", 128))  # Reasonable limit for production
+    pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT", 10))  # Seconds to wait for a free connection
+
+    logger.info(f"Initializing Redis connection pool to {settings['host']}:{settings['port']} with max {max_connections} connections")
+
+    # Create connection pool with production-optimized settings; bursts wait for
+    # a free connection instead of failing with "Too many connections"
+    pool = redis.BlockingConnectionPool(max_connections=max_connections, timeout=pool_timeout, **settings)
+
     # Create Redis client from connection pool
     client = redis.Redis(connection_pool=pool)
 
     return client
 
 
+def create_dedicated_client() -> redis.Redis:
+    """Create a client with its own connection, outside the shared pool.
+
+    For long blocking commands (e.g. XREAD BLOCK) that would otherwise hold a
+    pooled connection for their whole duration. The caller must close it.
+    """
+    return redis.Redis(single_connection_client=True, **_connection_settings())
+
+
 async def initialize_async():
     """Initialize Redis connection asynchronously."""
     global client, _initialized
@@ -166,6 +175,25 @@ async def lrange(key: str, start: int, end: int) -> List[str]:
     return await redis_client.lrange(key, start, end)
 
 
+# Stream operations
+async def xadd(key: str, fields: dict, maxlen: int = None, approximate: bool = True) -> str:
+    """Append an entry to a stream, optionally trimming it to about maxlen entries."""
+    redis_client = await get_client()
+    return await redis_client.xadd(key, fields, maxlen=maxlen, approximate=approximate)
+
+
+async def xread(streams: dict, count: int = None, block: int = None):
+    """Read entries after the given IDs from one or more streams."""
+    redis_client = await get_client()
+    return await redis_client.xread(streams, count=count, block=block)
+
+
+async def xrange(key: str, min: str = "-", max: str = "+", count: int = None):
+    """Get a range of entries from a stream."""
+    redis_client = await get_client()
+    return await redis_client.xrange(key, min=min, max=max, count=count)
+
+
 # Key management
 
 
@@ -0,0 +1,202 @@
+"""
+Coalesced publishing of agent run responses to Redis.
+
+The worker used to issue one RPUSH and one PUBLISH per streamed chunk. During
+token streaming that is hundreds of round trips per second per run.
+ResponsePublisher buffers responses and writes them in batches:
+
+- a batch is flushed when it reaches AGENT_RESPONSE_BATCH_MAX_ITEMS responses,
+  or AGENT_RESPONSE_BATCH_WINDOW_MS after its first response was buffered
+- each flush is a single pipeline: one RPUSH carrying every buffered response
+  followed by one "new" notification on the response channel
+- terminal status messages (completed/failed/stopped/error) are flushed
+  immediately so stream readers and the DB status update never wait on a timer
+
+Stream readers already fetch everything after their last seen index on each
+"new" notification, so a batch needs no changes on the reading side.
+
+StreamResponsePublisher applies the same batching to the Redis Streams
+transport (see core.services.agent_run_stream): a flush is one pipeline of
+XADDs and needs no notification, since viewers block on XREAD.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from core.services import redis
+from core.services.agent_run_stream import (
+    TRANSPORT_STREAM, STREAM_DATA_FIELD, STREAM_STATUS_FIELD,
+    get_transport, get_stream_maxlen, response_list_key, response_channel, response_stream_key,
+)
+from core.utils.config import config
+from core.utils.logger import logger
+
+TERMINAL_STATUSES = ('completed', 'failed', 'stopped', 'error')
+# Latency percentiles are computed over the most recent samples only
+LATENCY_SAMPLE_LIMIT = 1000
+
+
+def is_terminal_response(response: Dict[str, Any]) -> bool:
+    """Whether a response ends the run and must reach readers without delay."""
+    return response.get('type') == 'status' and response.get('status') in TERMINAL_STATUSES
+
+
+@dataclass
+class PublisherStats:
+    """Batch size and enqueue-to-publish latency metrics for one publisher."""
+    batches: int = 0
+    items: int = 0
+    max_batch_size: int = 0
+    failed_flushes: int = 0
+    max_latency_ms: float = 0.0
+    latencies_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLE_LIMIT))
+
+    def record(self, batch_size: int, latencies_ms: List[float]):
+        self.batches += 1
+        self.items += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.latencies_ms.extend(latencies_ms)
+        if latencies_ms:
+            self.max_latency_ms = max(self.max_latency_ms, max(latencies_ms))
+
+    def _percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_size,
+            "failed_flushes": self.failed_flushes,
+            "latency_p50_ms": round(self._percentile(50), 2),
+            "latency_p95_ms": round(self._percentile(95), 2),
+            "latency_max_ms": round(self.max_latency_ms, 2),
+        }
+
+
+class ResponsePublisher:
+    """Buffers an agent run's responses and publishes them to Redis in batches.
+
+    Flushes are serialized, so responses land in the list in the order they
+    were published. A failed flush puts its batch back at the head of the
+    buffer so the next flush retries it; flushes triggered by publish() log
+    the failure instead of raising, so a transient Redis error doesn't abort
+    the run.
+    """
+
+    def __init__(
+        self,
+        agent_run_id: str,
+        max_batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+    ):
+        self.agent_run_id = agent_run_id
+        self.response_list_key = response_list_key(agent_run_id)
+        self.response_channel = response_channel(agent_run_id)
+        self.max_batch_size = max(1, int(max_batch_size or config.AGENT_RESPONSE_BATCH_MAX_ITEMS or 50))
+        self.flush_interval = int(flush_interval_ms if flush_interval_ms is not None else (config.AGENT_RESPONSE_BATCH_WINDOW_MS or 20)) / 1000
+        self.stats = PublisherStats()
+        self._buffer: List[Tuple[str, Optional[str], float]] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def publish(self, response: Dict[str, Any], flush: bool = False):
+        """Buffer a response, flushing when the batch is full, on request, or when the run ends."""
+        status = response.get('status') if response.get('type') == 'status' else None
+        self._buffer.append((json.dumps(response), status, time.monotonic()))
+
+        if flush or len(self._buffer) >= self.max_batch_size or is_terminal_response(response) or self.flush_interval <= 0:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Flush of {len(self._buffer)} responses for {self.agent_run_id} failed, will retry on next flush: {e}")
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Timed flush of responses for {self.agent_run_id} failed, will retry on next flush: {e}")
+
+    def _cancel_timer(self):
+        timer = self._timer
+        self._timer = None
+        if timer and timer is not asyncio.current_task() and not timer.done():
+            timer.cancel()
+
+    async def flush(self):
+        """Write all buffered responses in a single pipeline."""
+        self._cancel_timer()
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            try:
+                redis_client = await redis.get_client()
+                pipe = redis_client.pipeline(transaction=False)
+                self._queue_batch(pipe, batch)
+                await pipe.execute()
+            except Exception:
+                self.stats.failed_flushes += 1
+                self._buffer[:0] = batch
+                raise
+
+            now = time.monotonic()
+            self.stats.record(len(batch), [(now - enqueued_at) * 1000 for _, _, enqueued_at in batch])
+
+    def _queue_batch(self, pipe, batch: List[Tuple[str, Optional[str], float]]):
+        """Queue the writes for one batch on a pipeline."""
+        pipe.rpush(self.response_list_key, *[payload for payload, _, _ in batch])
+        pipe.publish(self.response_channel, "new")
+
+    async def close(self):
+        """Flush whatever is left and log the publisher metrics."""
+        try:
+            await self.flush()
+        finally:
+            self._cancel_timer()
+            if self.stats.batches or self.stats.failed_flushes:
+                logger.info(f"Response publishing stats for {self.agent_run_id}", **self.stats.summary())
+
+
+class StreamResponsePublisher(ResponsePublisher):
+    """ResponsePublisher for the Redis Streams transport.
+
+    Each response becomes one XADD (trimmed to about AGENT_RUN_STREAM_MAXLEN
+    entries). Status responses also carry their status as a separate field so
+    viewers can detect the end of a run without decoding the payload.
+    """
+
+    def __init__(self, agent_run_id: str, max_batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None):
+        super().__init__(agent_run_id, max_batch_size=max_batch_size, flush_interval_ms=flush_interval_ms)
+        self.response_stream_key = response_stream_key(agent_run_id)
+        self.maxlen = get_stream_maxlen()
+
+    def _queue_batch(self, pipe, batch: List[Tuple[str, Optional[str], float]]):
+        for payload, status, _ in batch:
+            fields = {STREAM_DATA_FIELD: payload}
+            if status:
+                fields[STREAM_STATUS_FIELD] = status
+            pipe.xadd(self.response_stream_key, fields, maxlen=self.maxlen, approximate=True)
+
+
+def create_response_publisher(agent_run_id: str, transport: Optional[str] = None, **kwargs) -> ResponsePublisher:
+    """Create the publisher for the configured (or given) run output transport."""
+    if (transport or get_transport()) == TRANSPORT_STREAM:
+        return StreamResponsePublisher(agent_run_id, **kwargs)
+    return ResponsePublisher(agent_run_id, **kwargs)
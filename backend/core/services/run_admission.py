@@ -0,0 +1,172 @@
+"""
+Per-account concurrent run admission.
+
+The concurrent run limit used to be checked by loading every thread the
+account ever created and counting `running` agent_runs across them in
+batches of 100 IDs, on every /agent/start. The cost grew with the account's
+history and two simultaneous starts could both pass the check.
+
+Running runs are now tracked as leases in one sorted set per account
+(`run_leases:{account_id}`, member = agent_run_id, score = lease expiry):
+
+- admission is a single script that drops expired leases, compares the count
+  with the limit and adds the new lease, so concurrent starts can't overshoot
+- `run_lease:{agent_run_id}` maps a lease back to its account, so the worker
+  can release it in its finally block knowing only the run id
+- the worker renews its runs' leases together with their active_run keys
+  (see run_control); a crashed worker's leases expire after
+  RUN_LEASE_TTL_SECONDS
+- when an account is at its limit, its leases are reconciled against
+  agent_runs (at most once per RUN_ADMISSION_RECONCILE_SECONDS) and leases of
+  runs that already finished are dropped before the start is rejected
+"""
+
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from core.services import redis
+from core.utils.config import config
+from core.utils.logger import logger
+
+LEASES_PREFIX = "run_leases:"
+OWNER_PREFIX = "run_lease:"
+RECONCILE_PREFIX = "run_leases_reconciled:"
+
+# KEYS: leases, owner  ARGV: now, limit, run_id, expires_at, account_id, ttl
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local count = redis.call('ZCARD', KEYS[1])
+if redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+    return {1, count}
+end
+if ARGV[2] ~= '' and count >= tonumber(ARGV[2]) then
+    return {0, count}
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('SET', KEYS[2], ARGV[5], 'EX', ARGV[6])
+return {1, count + 1}
+"""
+
+# KEYS: owner  ARGV: prefix, run_id
+_RELEASE_SCRIPT = """
+local account_id = redis.call('GET', KEYS[1])
+if not account_id then
+    return 0
+end
+redis.call('ZREM', ARGV[1] .. account_id, ARGV[2])
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+# KEYS: owners  ARGV: prefix, expires_at, ttl, run_ids...
+_RENEW_SCRIPT = """
+local renewed = 0
+for i, owner_key in ipairs(KEYS) do
+    local account_id = redis.call('GET', owner_key)
+    if account_id then
+        local leases = ARGV[1] .. account_id
+        redis.call('ZADD', leases, 'XX', ARGV[2], ARGV[3 + i])
+        redis.call('EXPIRE', leases, ARGV[3])
+        redis.call('EXPIRE', owner_key, ARGV[3])
+        renewed = renewed + 1
+    end
+end
+return renewed
+"""
+
+
+def _leases_key(account_id: str) -> str:
+    return f"{LEASES_PREFIX}{account_id}"
+
+
+def _owner_key(agent_run_id: str) -> str:
+    return f"{OWNER_PREFIX}{agent_run_id}"
+
+
+class RunAdmission:
+    """Atomic check-and-increment of an account's running runs."""
+
+    @property
+    def lease_ttl(self) -> int:
+        return int(config.RUN_LEASE_TTL_SECONDS or 900)
+
+    @property
+    def reconcile_interval(self) -> int:
+        return int(config.RUN_ADMISSION_RECONCILE_SECONDS or 30)
+
+    async def _acquire(self, account_id: str, agent_run_id: str, limit: Optional[int]) -> Tuple[bool, int]:
+        client = await redis.get_client()
+        acquire = client.register_script(_ACQUIRE_SCRIPT)
+        now = time.time()
+        admitted, count = await acquire(
+            keys=[_leases_key(account_id), _owner_key(agent_run_id)],
+            args=[now, '' if limit is None else limit, agent_run_id, now + self.lease_ttl, account_id, self.lease_ttl],
+        )
+        return bool(admitted), int(count)
+
+    async def acquire(self, client, account_id: str, agent_run_id: str, limit: int) -> Tuple[bool, int]:
+        """Take a run slot for agent_run_id if the account is below `limit`.
+
+        Returns (admitted, running_count); running_count includes the new run when admitted.
+        """
+        admitted, count = await self._acquire(account_id, agent_run_id, limit)
+        if admitted:
+            return True, count
+        if await self.reconcile(client, account_id) > 0:
+            admitted, count = await self._acquire(account_id, agent_run_id, limit)
+        return admitted, count
+
+    async def track(self, account_id: str, agent_run_id: str):
+        """Count a run that was started without an admission check (e.g. by a trigger)."""
+        await self._acquire(account_id, agent_run_id, None)
+
+    async def release(self, agent_run_id: str) -> bool:
+        """Free the run's slot. Safe to call for runs that hold no lease."""
+        client = await redis.get_client()
+        release = client.register_script(_RELEASE_SCRIPT)
+        return bool(await release(keys=[_owner_key(agent_run_id)], args=[LEASES_PREFIX, agent_run_id]))
+
+    async def renew(self, agent_run_ids: Iterable[str]) -> int:
+        """Extend the leases of runs that are still alive."""
+        agent_run_ids = list(agent_run_ids)
+        if not agent_run_ids:
+            return 0
+        client = await redis.get_client()
+        renew = client.register_script(_RENEW_SCRIPT)
+        return int(await renew(
+            keys=[_owner_key(run_id) for run_id in agent_run_ids],
+            args=[LEASES_PREFIX, time.time() + self.lease_ttl, self.lease_ttl, *agent_run_ids],
+        ))
+
+    async def running_run_ids(self, account_id: str) -> List[str]:
+        client = await redis.get_client()
+        return await client.zrangebyscore(_leases_key(account_id), time.time(), '+inf')
+
+    async def reconcile(self, client, account_id: str, force: bool = False) -> int:
+        """Drop leases whose agent_runs row is no longer running. Returns the number dropped.
+
+        Leases without a row yet belong to starts still in flight and are left to expire.
+        """
+        redis_client = await redis.get_client()
+        if not force and not await redis_client.set(f"{RECONCILE_PREFIX}{account_id}", "1", nx=True, ex=self.reconcile_interval):
+            return 0
+        run_ids = await self.running_run_ids(account_id)
+        if not run_ids:
+            return 0
+        result = await client.table('agent_runs').select('id, status').in_('id', run_ids).execute()
+        finished = [row['id'] for row in (result.data or []) if row.get('status') != 'running']
+        for run_id in finished:
+            await self.release(run_id)
+        if finished:
+            logger.info(f"Reconciled run leases for {account_id}: released {len(finished)} finished runs")
+        return len(finished)
+
+    async def running_thread_ids(self, client, run_ids: List[str]) -> List[str]:
+        if not run_ids:
+            return []
+        result = await client.table('agent_runs').select('thread_id').in_('id', run_ids).execute()
+        return [row['thread_id'] for row in (result.data or [])]
+
+
+run_admission = RunAdmission()
@@ -0,0 +1,132 @@
+"""
+Worker-level control plane for running agents.
+
+Each agent run used to own a pub/sub connection plus a task polling it every
+~0.6s for a STOP signal. RunControlListener replaces that with:
+
+- one shared subscription per worker process (via the pub/sub multiplexer):
+  each run registers its control channels with a callback that sets the run's
+  cancellation_event the moment STOP arrives, with no per-run polling
+- a single timer that refreshes the TTL of every registered run's
+  `active_run:{instance_id}:{agent_run_id}` key in one pipeline, and renews
+  the runs' concurrent run leases (see run_admission), every
+  ACTIVE_RUN_TTL_REFRESH_SECONDS
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from core.services import redis
+from core.services.pubsub_multiplexer import PubSubMultiplexer, Subscription, pubsub_multiplexer
+from core.services.run_admission import run_admission
+from core.utils.config import config
+from core.utils.logger import logger
+
+STOP_SIGNAL = "STOP"
+
+
+@dataclass
+class RunControlHandle:
+    """Registration of a single run with the control listener."""
+    agent_run_id: str
+    cancellation_event: asyncio.Event
+    active_key: Optional[str]
+    subscription: Optional[Subscription] = None
+
+    @property
+    def stop_requested(self) -> bool:
+        return self.cancellation_event.is_set()
+
+
+class RunControlListener:
+    """Dispatches control signals to the runs of this worker and keeps their active keys alive."""
+
+    def __init__(self, multiplexer: Optional[PubSubMultiplexer] = None, ttl_refresh_interval: Optional[int] = None):
+        self._multiplexer = multiplexer or pubsub_multiplexer
+        self._ttl_refresh_interval = ttl_refresh_interval
+        self._runs: Dict[str, RunControlHandle] = {}
+        self._ttl_task: Optional[asyncio.Task] = None
+
+    @property
+    def ttl_refresh_interval(self) -> int:
+        if self._ttl_refresh_interval is None:
+            self._ttl_refresh_interval = int(config.ACTIVE_RUN_TTL_REFRESH_SECONDS or 300)
+        return self._ttl_refresh_interval
+
+    async def register(
+        self,
+        agent_run_id: str,
+        control_channels: List[str],
+        cancellation_event: asyncio.Event,
+        active_key: Optional[str] = None,
+    ) -> RunControlHandle:
+        """Start watching a run's control channels; STOP sets its cancellation_event."""
+        handle = RunControlHandle(agent_run_id=agent_run_id, cancellation_event=cancellation_event, active_key=active_key)
+
+        def on_message(message):
+            if message.get("type") == "message" and message.get("data") == STOP_SIGNAL and not cancellation_event.is_set():
+                logger.debug(f"Received STOP signal for agent run {agent_run_id} on {message.get('channel')}")
+                cancellation_event.set()
+
+        handle.subscription = await self._multiplexer.subscribe(*control_channels, callback=on_message)
+        self._runs[agent_run_id] = handle
+        self._ensure_ttl_refresher()
+        return handle
+
+    async def unregister(self, handle: RunControlHandle):
+        """Stop watching a run. Safe to call more than once."""
+        if self._runs.get(handle.agent_run_id) is handle:
+            del self._runs[handle.agent_run_id]
+        if handle.subscription:
+            await handle.subscription.close()
+
+    def _ensure_ttl_refresher(self):
+        if self._ttl_task is None or self._ttl_task.done():
+            self._ttl_task = asyncio.create_task(self._refresh_active_keys_loop())
+
+    async def _refresh_active_keys_loop(self):
+        try:
+            while self._runs:
+                await asyncio.sleep(self.ttl_refresh_interval)
+                await self.refresh_active_keys()
+                await self.renew_run_leases()
+        except asyncio.CancelledError:
+            pass
+
+    async def refresh_active_keys(self):
+        """Refresh the TTL of every registered run's active key in one round trip."""
+        keys = [handle.active_key for handle in self._runs.values() if handle.active_key]
+        if not keys:
+            return
+        try:
+            redis_client = await redis.get_client()
+            pipe = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.expire(key, redis.REDIS_KEY_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to refresh TTL for {len(keys)} active run keys: {e}")
+
+    async def renew_run_leases(self):
+        """Keep the concurrent run leases of this worker's runs from expiring."""
+        run_ids = list(self._runs)
+        if not run_ids:
+            return
+        try:
+            await run_admission.renew(run_ids)
+        except Exception as e:
+            logger.warning(f"Failed to renew {len(run_ids)} run leases: {e}")
+
+    async def close(self):
+        if self._ttl_task and not self._ttl_task.done():
+            self._ttl_task.cancel()
+            try:
+                await self._ttl_task
+            except asyncio.CancelledError:
+                pass
+        for handle in list(self._runs.values()):
+            await self.unregister(handle)
+
+
+run_control_listener = RunControlListener()
@@ -0,0 +1,176 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+from unittest.mock import MagicMock
+
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+
+from core.services import run_admission as run_admission_module
+from core.services.run_admission import RunAdmission, _leases_key, _owner_key
+
+
+class _FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class _FakeSupabase:
+    """Answers `agent_runs` status lookups from a dict of run id -> status."""
+
+    def __init__(self, statuses: Dict[str, str]):
+        self.statuses = statuses
+        self.queries: List[List[str]] = []
+
+    def table(self, name: str):
+        assert name == 'agent_runs'
+        supabase = self
+
+        class _Query:
+            def select(self, columns):
+                return self
+
+            def in_(self, column, run_ids):
+                self.run_ids = list(run_ids)
+                supabase.queries.append(self.run_ids)
+                return self
+
+            async def execute(self):
+                return MagicMock(data=[
+                    {'id': run_id, 'status': supabase.statuses[run_id], 'thread_id': f"thread-{run_id}"}
+                    for run_id in self.run_ids if run_id in supabase.statuses
+                ])
+
+        return _Query()
+
+
+class TestRunAdmission:
+    @pytest_asyncio.fixture
+    async def redis_client(self, monkeypatch):
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+        async def get_client():
+            return client
+
+        monkeypatch.setattr(run_admission_module.redis, "get_client", get_client)
+        yield client
+        await client.aclose()
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        clock = _FakeClock()
+        monkeypatch.setattr(run_admission_module, "time", SimpleNamespace(time=clock.time))
+        return clock
+
+    @pytest.fixture
+    def admission(self, monkeypatch, redis_client, clock):
+        monkeypatch.setattr(RunAdmission, "lease_ttl", property(lambda self: 60))
+        monkeypatch.setattr(RunAdmission, "reconcile_interval", property(lambda self: 30))
+        return RunAdmission()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_acquire_at_limit(self, admission, redis_client):
+        db = _FakeSupabase({f"run-{i}": 'running' for i in range(10)})
+
+        results = await asyncio.gather(*(
+            admission.acquire(db, 'acct-1', f"run-{i}", 3) for i in range(10)
+        ))
+
+        admitted = [i for i, (ok, _) in enumerate(results) if ok]
+        assert len(admitted) == 3
+        assert all(count == 3 for ok, count in results if not ok)
+        assert sorted(await admission.running_run_ids('acct-1')) == sorted(f"run-{i}" for i in admitted)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_acquire_is_idempotent_per_run(self, admission):
+        db = _FakeSupabase({})
+
+        assert await admission.acquire(db, 'acct-1', 'run-1', 1) == (True, 1)
+        assert await admission.acquire(db, 'acct-1', 'run-1', 1) == (True, 1)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_release_after_failed_start_frees_the_slot(self, admission, redis_client):
+        db = _FakeSupabase({'run-1': 'running'})
+        assert (await admission.acquire(db, 'acct-1', 'run-1', 1))[0]
+
+        # The start failed before the run was queued (see agent_runs._release_run_slot)
+        assert await admission.release('run-1')
+
+        assert not await redis_client.exists(_owner_key('run-1'))
+        assert await admission.running_run_ids('acct-1') == []
+        assert await admission.acquire(db, 'acct-1', 'run-2', 1) == (True, 1)
+        # Releasing again, or a run that never held a lease, is a no-op
+        assert not await admission.release('run-1')
+        assert not await admission.release('unknown-run')
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_expired_lease_frees_the_slot(self, admission, clock):
+        db = _FakeSupabase({'run-1': 'running', 'run-2': 'running'})
+        assert (await admission.acquire(db, 'acct-1', 'run-1', 1))[0]
+        assert not (await admission.acquire(db, 'acct-1', 'run-2', 1))[0]
+
+        # The worker holding run-1 died and stopped renewing
+        clock.now += 61
+
+        assert await admission.running_run_ids('acct-1') == []
+        assert await admission.acquire(db, 'acct-1', 'run-2', 1) == (True, 1)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_renewed_lease_survives(self, admission, clock):
+        db = _FakeSupabase({'run-1': 'running', 'run-2': 'running'})
+        assert (await admission.acquire(db, 'acct-1', 'run-1', 1))[0]
+
+        clock.now += 45
+        assert await admission.renew(['run-1', 'unknown-run']) == 1
+        clock.now += 45
+
+        assert await admission.running_run_ids('acct-1') == ['run-1']
+        assert not (await admission.acquire(db, 'acct-1', 'run-2', 1))[0]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reconcile_releases_finished_runs_at_limit(self, admission, redis_client):
+        db = _FakeSupabase({'run-1': 'completed', 'run-2': 'running'})
+        await admission.track('acct-1', 'run-1')
+        await admission.track('acct-1', 'run-2')
+
+        admitted, count = await admission.acquire(db, 'acct-1', 'run-3', 2)
+
+        assert (admitted, count) == (True, 2)
+        assert sorted(await admission.running_run_ids('acct-1')) == ['run-2', 'run-3']
+        assert not await redis_client.exists(_owner_key('run-1'))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reconcile_is_throttled_and_keeps_in_flight_starts(self, admission):
+        db = _FakeSupabase({'run-1': 'running'})
+        await admission.track('acct-1', 'run-1')
+        # run-2 has a lease but no agent_runs row yet: its start is still in flight
+        await admission.track('acct-1', 'run-2')
+
+        assert await admission.reconcile(db, 'acct-1') == 0
+        assert len(db.queries) == 1
+
+        db.statuses['run-1'] = 'failed'
+        assert await admission.reconcile(db, 'acct-1') == 0
+        assert len(db.queries) == 1
+
+        assert await admission.reconcile(db, 'acct-1', force=True) == 1
+        assert await admission.running_run_ids('acct-1') == ['run-2']
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_tracked_runs_ignore_the_limit(self, admission, redis_client):
+        for i in range(3):
+            await admission.track('acct-1', f"run-{i}")
+
+        assert await redis_client.zcard(_leases_key('acct-1')) == 3
@@ -3,12 +3,17 @@ import traceback
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Form, Query, Body, Request
+from fastapi import APIRouter, HTTPException, Depends, Form, Query, Body, Request, Response
 
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, verify_and_authorize_thread_access, require_thread_access, AuthorizedThreadAccess
 from core.utils.logger import logger
-from core.sandbox.sandbox import create_sandbox, delete_sandbox
+from core.sandbox.sandbox import delete_sandbox
+from core.sandbox.sandbox_pool import bind_project_sandbox
 from core.utils.config import config, EnvMode
+from core.utils.message_pagination import (
+    MAX_PAGE_SIZE, InvalidPaginationParameter, decode_cursor, encode_cursor, etag_matches,
+    fetch_message_page, parse_fields, sync_position, thread_messages_etag,
+)
 
 from .api_models import CreateThreadResponse, MessageCreateRequest
 from . import core_utils as utils
@@ -279,54 +284,15 @@ async def create_thread(
         project_id = project.data[0]['project_id']
         logger.debug(f"Created new project: {project_id}")
 
-        # 2. Create Sandbox
-        sandbox_id = None
+        # 2. Create Sandbox (warm from the pool when one is ready)
         try:
-            sandbox_pass = str(uuid.uuid4())
-            sandbox = await create_sandbox(sandbox_pass, project_id)
-            sandbox_id = sandbox.id
-            logger.debug(f"Created new sandbox {sandbox_id} for project {project_id}")
-            
-            # Get preview links
-            vnc_link = await sandbox.get_preview_link(6080)
-            website_link = await sandbox.get_preview_link(8080)
-            vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
-            website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
-            token = None
-            if hasattr(vnc_link, 'token'):
-                token = vnc_link.token
-            elif "token='" in str(vnc_link):
-                token = str(vnc_link).split("token='")[1].split("'")[0]
+            provisioned = await bind_project_sandbox(client, project_id)
+            logger.debug(f"Created new sandbox {provisioned.sandbox_id} for project {project_id}")
         except Exception as e:
             logger.error(f"Error creating sandbox: {str(e)}")
             await client.table('projects').delete().eq('project_id', project_id).execute()
-            if sandbox_id:
-                try: 
-                    await delete_sandbox(sandbox_id)
-                except Exception as e: 
-                    logger.error(f"Error deleting sandbox: {str(e)}")
             raise Exception("Failed to create sandbox")
 
-        # Update project with sandbox info
-        update_result = await client.table('projects').update({
-            'sandbox': {
-                'id': sandbox_id, 
-                'pass': sandbox_pass, 
-                'vnc_preview': vnc_url,
-                'sandbox_url': website_url, 
-                'token': token
-            }
-        }).eq('project_id', project_id).execute()
-
-        if not update_result.data:
-            logger.error(f"Failed to update project {project_id} with new sandbox {sandbox_id}")
-            if sandbox_id:
-                try: 
-                    await delete_sandbox(sandbox_id)
-                except Exception as e: 
-                    logger.error(f"Error deleting sandbox: {str(e)}")
-            raise Exception("Database update failed")
-
         # 3. Create Thread
         thread_data = {
             "thread_id": str(uuid.uuid4()), 
@@ -358,11 +324,19 @@ async def create_thread(
 async def get_thread_messages(
     thread_id: str,
     request: Request,
-    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'")
+    response: Response,
+    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit (without cursor/since) to get the whole thread"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    since: Optional[str] = Query(None, description="sync_cursor of an earlier response; only newer messages are returned"),
+    fields: Optional[str] = Query(None, description="Comma-separated message fields to return (created_at and message_id are always included)"),
 ):
-    """Get all messages for a thread, fetching in batches of 1000 from the DB to avoid large queries.
+    """Get the messages of a thread, paginated by (created_at, message_id) cursor.
+
+    Without limit, cursor or since the whole thread is returned. Responses carry an
+    ETag; a matching If-None-Match is answered with 304.
     Supports both authenticated and anonymous access (for public threads)."""
-    logger.debug(f"Fetching all messages for thread: {thread_id}, order={order}")
+    logger.debug(f"Fetching messages for thread: {thread_id}, order={order}, limit={limit}, cursor={bool(cursor)}, since={bool(since)}")
     client = await utils.db.client
     
     # Try to get user_id from JWT (optional for public threads)
@@ -371,22 +345,44 @@ async def get_thread_messages(
     
     # Verify access (handles both authenticated and public thread access)
     await verify_and_authorize_thread_access(client, thread_id, user_id)
+
     try:
-        batch_size = 1000
-        offset = 0
-        all_messages = []
-        while True:
-            query = client.table('messages').select('*').eq('thread_id', thread_id)
-            query = query.order('created_at', desc=(order == "desc"))
-            query = query.range(offset, offset + batch_size - 1)
-            messages_result = await query.execute()
-            batch = messages_result.data or []
-            all_messages.extend(batch)
-            logger.debug(f"Fetched batch of {len(batch)} messages (offset {offset})")
-            if len(batch) < batch_size:
-                break
-            offset += batch_size
-        return {"messages": all_messages}
+        select = parse_fields(fields)
+        after = decode_cursor(cursor, 'cursor')
+        since_position = decode_cursor(since, 'since')
+    except InvalidPaginationParameter as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    descending = order == "desc"
+
+    try:
+        etag = await thread_messages_etag(client, thread_id, {
+            "order": order, "limit": limit, "cursor": cursor, "since": since, "fields": select,
+        })
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if limit is None and after is None and since_position is None:
+            # Whole thread, in constant-size keyset pages
+            messages = []
+            while True:
+                batch, after = await fetch_message_page(client, thread_id, select, descending, MAX_PAGE_SIZE, after=after)
+                messages.extend(batch)
+                logger.debug(f"Fetched batch of {len(batch)} messages")
+                if after is None:
+                    break
+            next_position = None
+        else:
+            messages, next_position = await fetch_message_page(
+                client, thread_id, select, descending, limit or MAX_PAGE_SIZE, after=after, since=since_position
+            )
+
+        response.headers["ETag"] = etag
+        return {
+            "messages": messages,
+            "next_cursor": encode_cursor(next_position),
+            "has_more": next_position is not None,
+            "sync_cursor": encode_cursor(sync_position(messages, since_position)),
+        }
     except Exception as e:
         logger.error(f"Error fetching messages for thread {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 from core.agentpress.tool import Tool, ToolResult, ToolSchema, SchemaType, tool_metadata
 from core.mcp_module import mcp_service
 from core.utils.logger import logger
@@ -7,18 +7,52 @@ import asyncio
 import time
 import hashlib
 import json
+import re
+from collections import OrderedDict
 from core.tools.utils.mcp_connection_manager import MCPConnectionManager
 from core.tools.utils.custom_mcp_handler import CustomMCPHandler
 from core.tools.utils.dynamic_tool_builder import DynamicToolBuilder
 from core.tools.utils.mcp_tool_executor import MCPToolExecutor
+from core.tools.utils.mcp_session_pool import mcp_session_pool
 from core.services import redis as redis_service
+from core.utils.config import config as app_config
 
 
 class MCPSchemaRedisCache:
-    def __init__(self, ttl_seconds: int = 3600, key_prefix: str = "mcp_schema:"):
+    """Two-level MCP tool-schema cache: an in-process LRU in front of Redis.
+
+    Entries carry the time they were discovered; entries older than
+    `refresh_after` are still served, but callers should refresh them in the
+    background (see MCPSchemaRefresher).
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, key_prefix: str = "mcp_schema:", local_max_entries: Optional[int] = None, refresh_after: Optional[int] = None):
         self._ttl = ttl_seconds
         self._key_prefix = key_prefix
         self._redis_client = None
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._local_max_entries = local_max_entries or int(app_config.MCP_SCHEMA_LOCAL_CACHE_SIZE or 256)
+        self.refresh_after = refresh_after or int(app_config.MCP_SCHEMA_REFRESH_AFTER_SECONDS or 600)
+    
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        expires_at, data = item
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return data
+    
+    def _set_local(self, key: str, data: Dict[str, Any]):
+        self._local[key] = (time.monotonic() + self._ttl, data)
+        self._local.move_to_end(key)
+        while len(self._local) > self._local_max_entries:
+            self._local.popitem(last=False)
+    
+    def is_stale(self, data: Dict[str, Any]) -> bool:
+        return time.time() - data.get('timestamp', 0) > self.refresh_after
     
     async def _ensure_redis(self):
         if not self._redis_client:
@@ -35,16 +69,22 @@ class MCPSchemaRedisCache:
         return f"{self._key_prefix}{config_hash}"
     
     async def get(self, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._get_cache_key(config)
+        local_data = self._get_local(key)
+        if local_data is not None:
+            return local_data
+        
         if not await self._ensure_redis():
             return None
             
         try:
-            key = self._get_cache_key(config)
             cached_data = await self._redis_client.get(key)
             
             if cached_data:
                 logger.debug(f"⚡ Redis cache hit for MCP: {config.get('name', config.get('qualifiedName', 'Unknown'))}")
-                return json.loads(cached_data)
+                data = json.loads(cached_data)
+                self._set_local(key, data)
+                return data
             else:
                 logger.debug(f"Redis cache miss for MCP: {config.get('name', config.get('qualifiedName', 'Unknown'))}")
                 return None
@@ -54,11 +94,13 @@ class MCPSchemaRedisCache:
             return None
     
     async def set(self, config: Dict[str, Any], data: Dict[str, Any]):
+        key = self._get_cache_key(config)
+        self._set_local(key, data)
+        
         if not await self._ensure_redis():
             return
             
         try:
-            key = self._get_cache_key(config)
             serialized_data = json.dumps(data)
             
             await self._redis_client.setex(key, self._ttl, serialized_data)
@@ -68,6 +110,7 @@ class MCPSchemaRedisCache:
             logger.warning(f"Error writing to Redis cache: {e}")
     
     async def clear_pattern(self, pattern: Optional[str] = None):
+        self._local.clear()
         if not await self._ensure_redis():
             return
         try:
@@ -98,6 +141,7 @@ class MCPSchemaRedisCache:
             return {
                 "available": True,
                 "cached_schemas": count,
+                "local_cached_schemas": len(self._local),
                 "ttl_seconds": self._ttl,
                 "key_prefix": self._key_prefix
             }
@@ -108,6 +152,95 @@ class MCPSchemaRedisCache:
 
 _redis_cache = MCPSchemaRedisCache(ttl_seconds=3600)
 
+# Bump when the cached entry format changes; older entries are re-discovered
+SCHEMA_CACHE_VERSION = 2
+
+
+def _tools_fingerprint(tools: Any) -> str:
+    return hashlib.md5(json.dumps(tools, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class MCPSchemaRefresher:
+    """Discovers MCP server tools, and re-discovers stale cached schemas in the background.
+
+    One refresher serves the process, so a stale entry is refreshed once even
+    when several runs load it; later runs pick up any change from the cache.
+    """
+
+    def __init__(self, cache: MCPSchemaRedisCache, mcp_manager=mcp_service):
+        self._cache = cache
+        self._mcp_manager = mcp_manager
+        self._tasks: Set[asyncio.Task] = set()
+        self._refreshing: Set[str] = set()
+
+    async def discover_standard_tools(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """List the enabled tools of a standard server over a pooled session."""
+        spec = await self._mcp_manager.resolve_server_spec(config)
+        server_tools = await mcp_session_pool.list_tools(spec)
+        enabled_tools = config.get('enabledTools', config.get('enabled_tools', []))
+        return [
+            {'name': tool.name, 'description': tool.description, 'parameters': tool.inputSchema}
+            for tool in server_tools
+            if tool.name in enabled_tools
+        ]
+
+    async def discover_custom_tools(self, config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Connect to a custom server on a throwaway handler and return its enabled tools."""
+        return await CustomMCPHandler(MCPConnectionManager()).initialize_custom_mcp(config)
+
+    def schedule(self, config: Dict[str, Any], cached_data: Dict[str, Any]) -> bool:
+        """Refresh a server's cached schema in the background unless that is already under way."""
+        key = self._cache._get_cache_key(config)
+        if key in self._refreshing:
+            return False
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(config, cached_data, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _refresh(self, config: Dict[str, Any], cached_data: Dict[str, Any], key: str):
+        config_name = config.get('name', config.get('qualifiedName', 'Unknown'))
+        try:
+            if config.get('isCustom', False):
+                tools = await self.discover_custom_tools(config)
+                fresh_data = {'tools': tools, 'type': 'custom', 'version': SCHEMA_CACHE_VERSION, 'timestamp': time.time()}
+            else:
+                tools = await self.discover_standard_tools(config)
+                fresh_data = {'tools': tools, 'type': 'standard', 'version': SCHEMA_CACHE_VERSION, 'timestamp': time.time()}
+            
+            if not tools and cached_data.get('tools'):
+                logger.debug(f"Background refresh for MCP {config_name} returned no tools, keeping cached schema")
+                return
+            
+            await self._cache.set(config, fresh_data)
+            if _tools_fingerprint(tools) != _tools_fingerprint(cached_data.get('tools')):
+                logger.info(f"MCP tool list changed for {config_name}, schema cache updated")
+        except Exception as e:
+            logger.debug(f"Background MCP schema refresh failed for {config_name}: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def close(self):
+        """Cancel refreshes still in flight."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"refreshing": len(self._refreshing)}
+
+
+mcp_schema_refresher = MCPSchemaRefresher(_redis_cache)
+
+
+def _standard_tool_prefix(config: Dict[str, Any]) -> str:
+    """Prefix for standard MCP tool names: mcp_<server-slug>_<tool> (parsed by DynamicToolBuilder)."""
+    server = config.get('qualifiedName', config.get('name', 'server'))
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', server).strip('-').lower() or 'server'
+    return f"mcp_{slug}_"
+
 @tool_metadata(
     display_name="MCP Tool Wrapper",
     description="Internal wrapper for MCP external tool integration",
@@ -124,6 +257,7 @@ class MCPToolWrapper(Tool):
         self._schemas: Dict[str, List[ToolSchema]] = {}
         self._dynamic_tools = {}
         self._custom_tools = {}
+        self._standard_tools: Dict[str, Dict[str, Any]] = {}
         self.use_cache = use_cache
         
         self.connection_manager = MCPConnectionManager()
@@ -142,51 +276,35 @@ class MCPToolWrapper(Tool):
     async def _initialize_servers(self):
         start_time = time.time()
         
-        standard_configs = [cfg for cfg in self.mcp_configs if not cfg.get('isCustom', False)]
-        custom_configs = [cfg for cfg in self.mcp_configs if cfg.get('isCustom', False)]
-        
         cached_configs = []
-        cached_tools_data = []
-        
         initialization_tasks = []
         
-        if standard_configs:
-            for config in standard_configs:
-                if self.use_cache:
-                    cached_data = await _redis_cache.get(config)
-                    if cached_data:
-                        cached_configs.append(config.get('qualifiedName', 'Unknown'))
-                        cached_tools_data.append(cached_data)
-                        continue
-                
-                task = self._initialize_single_standard_server(config)
-                initialization_tasks.append(('standard', config, task))
+        # Schemas come from the cache without connecting; servers are only
+        # contacted on a miss, and connections for calls open lazily on first use
+        if self.use_cache and self.mcp_configs:
+            cached_entries = await asyncio.gather(*[_redis_cache.get(config) for config in self.mcp_configs])
+        else:
+            cached_entries = [None] * len(self.mcp_configs)
         
-        if custom_configs:
-            for config in custom_configs:
-                if self.use_cache:
-                    cached_data = await _redis_cache.get(config)
-                    if cached_data:
-                        cached_configs.append(config.get('name', 'Unknown'))
-                        cached_tools_data.append(cached_data)
-                        continue
-                
+        for config, cached_data in zip(self.mcp_configs, cached_entries):
+            is_custom = config.get('isCustom', False)
+            config_name = config.get('name', 'Unknown') if is_custom else config.get('qualifiedName', 'Unknown')
+            
+            if cached_data and self._restore_cached_tools(config, cached_data):
+                cached_configs.append(config_name)
+                if _redis_cache.is_stale(cached_data):
+                    mcp_schema_refresher.schedule(config, cached_data)
+                continue
+            
+            if is_custom:
                 task = self._initialize_single_custom_mcp(config)
                 initialization_tasks.append(('custom', config, task))
+            else:
+                task = self._initialize_single_standard_server(config)
+                initialization_tasks.append(('standard', config, task))
         
-        if cached_tools_data:
-            logger.debug(f"⚡ Loaded {len(cached_configs)} MCP schemas from Redis cache: {', '.join(cached_configs)}")
-            for cached_data in cached_tools_data:
-                try:
-                    if cached_data.get('type') == 'standard':
-                        logger.debug("Standard MCP tools found in cache but require connection to restore")
-                    elif cached_data.get('type') == 'custom':
-                        custom_tools = cached_data.get('tools', {})
-                        if custom_tools:
-                            self.custom_handler.custom_tools.update(custom_tools)
-                            logger.debug(f"Restored {len(custom_tools)} custom tools from cache")
-                except Exception as e:
-                    logger.warning(f"Failed to restore cached tools: {e}")
+        if cached_configs:
+            logger.debug(f"⚡ Loaded {len(cached_configs)} MCP schemas from cache: {', '.join(cached_configs)}")
         
         if initialization_tasks:
             logger.debug(f"🚀 Initializing {len(initialization_tasks)} MCP servers in parallel (cache enabled: {self.use_cache})...")
@@ -205,7 +323,7 @@ class MCPToolWrapper(Tool):
                     logger.error(f"Failed to initialize MCP server '{config_name}': {result}")
                 else:
                     successful += 1
-                    if self.use_cache and result:
+                    if self.use_cache and result and result.get('tools'):
                         await _redis_cache.set(config, result)
             
             elapsed_time = time.time() - start_time
@@ -213,18 +331,46 @@ class MCPToolWrapper(Tool):
         else:
             if cached_configs:
                 elapsed_time = time.time() - start_time
-                logger.debug(f"⚡ All {len(cached_configs)} MCP schemas loaded from Redis cache in {elapsed_time:.2f}s - instant startup!")
+                logger.debug(f"⚡ All {len(cached_configs)} MCP schemas loaded from cache in {elapsed_time:.2f}s - instant startup!")
             else:
                 logger.debug("No MCP servers to initialize")
     
+    def _restore_cached_tools(self, config: Dict[str, Any], cached_data: Dict[str, Any]) -> bool:
+        """Register tools from a cache entry. Returns False if the entry can't be used."""
+        if cached_data.get('version') != SCHEMA_CACHE_VERSION:
+            return False
+        try:
+            if cached_data.get('type') == 'standard':
+                self._register_standard_tools(config, cached_data.get('tools', []))
+                return True
+            elif cached_data.get('type') == 'custom':
+                custom_tools = cached_data.get('tools', {})
+                self.custom_handler.custom_tools.update(custom_tools)
+                return True
+        except Exception as e:
+            logger.warning(f"Failed to restore cached tools: {e}")
+        return False
+    
+    def _register_standard_tools(self, config: Dict[str, Any], tools: List[Dict[str, Any]]):
+        prefix = _standard_tool_prefix(config)
+        for tool in tools:
+            tool_name = f"{prefix}{tool['name']}"
+            self._standard_tools[tool_name] = {
+                'name': tool_name,
+                'description': tool.get('description') or '',
+                'parameters': tool.get('parameters') or {"type": "object", "properties": {}, "required": []},
+                'original_name': tool['name'],
+                'server_config': config,
+            }
+    
     async def _initialize_single_standard_server(self, config: Dict[str, Any]):
         try:
-            logger.debug(f"Connecting to standard MCP server: {config['qualifiedName']}")
-            await self.mcp_manager.connect_server(config)
-            logger.debug(f"✓ Connected to MCP server: {config['qualifiedName']}")
+            logger.debug(f"Discovering tools of standard MCP server: {config['qualifiedName']}")
+            tools = await mcp_schema_refresher.discover_standard_tools(config)
+            self._register_standard_tools(config, tools)
+            logger.debug(f"✓ Discovered {len(tools)} tools on MCP server: {config['qualifiedName']}")
             
-            tools_info = self.mcp_manager.get_all_tools_openapi()
-            return {'tools': tools_info, 'type': 'standard', 'timestamp': time.time()}
+            return {'tools': tools, 'type': 'standard', 'version': SCHEMA_CACHE_VERSION, 'timestamp': time.time()}
         except Exception as e:
             logger.error(f"✗ Failed to connect to MCP server {config['qualifiedName']}: {e}")
             raise e
@@ -232,11 +378,11 @@ class MCPToolWrapper(Tool):
     async def _initialize_single_custom_mcp(self, config: Dict[str, Any]):
         try:
             logger.debug(f"Initializing custom MCP: {config.get('name', 'Unknown')}")
-            await self.custom_handler._initialize_single_custom_mcp(config)
+            # The handler is shared by all servers of this wrapper; this returns (and caches) only this server's tools
+            custom_tools = await self.custom_handler.initialize_custom_mcp(config)
             logger.debug(f"✓ Initialized custom MCP: {config.get('name', 'Unknown')}")
             
-            custom_tools = self.custom_handler.get_custom_tools()
-            return {'tools': custom_tools, 'type': 'custom', 'timestamp': time.time()}
+            return {'tools': custom_tools, 'type': 'custom', 'version': SCHEMA_CACHE_VERSION, 'timestamp': time.time()}
         except Exception as e:
             logger.error(f"✗ Failed to initialize custom MCP {config.get('name', 'Unknown')}: {e}")
             raise e
@@ -246,7 +392,7 @@ class MCPToolWrapper(Tool):
     
     async def _create_dynamic_tools(self):
         try:
-            available_tools = self.mcp_manager.get_all_tools_openapi()
+            available_tools = list(self._standard_tools.values())
             custom_tools = self.custom_handler.get_custom_tools()
             
             # logger.debug(f"MCPManager returned {len(available_tools)} tools")
@@ -254,7 +400,7 @@ class MCPToolWrapper(Tool):
             
             self._custom_tools = custom_tools
             
-            self.tool_executor = MCPToolExecutor(custom_tools, self)
+            self.tool_executor = MCPToolExecutor(custom_tools, self, standard_tools=self._standard_tools)
             
             dynamic_methods = self.tool_builder.create_dynamic_methods(
                 available_tools, 
@@ -329,7 +475,10 @@ class MCPToolWrapper(Tool):
             
     async def get_available_tools(self) -> List[Dict[str, Any]]:
         await self._ensure_initialized()
-        return self.mcp_manager.get_all_tools_openapi()
+        return [
+            {"type": "function", "function": {"name": tool['name'], "description": tool['description'], "parameters": tool['parameters']}}
+            for tool in self._standard_tools.values()
+        ]
     
     async def _execute_mcp_tool(self, tool_name: str, arguments: Dict[str, Any]) -> ToolResult:
         await self._ensure_initialized()
@@ -256,8 +256,6 @@ IMPORTANT: All content must be wrapped in proper HTML tags. Do not use unsupport
             else:
                 content_to_save = content
             
-            await self.sandbox.fs.upload_file(content_to_save.encode(), file_path)
-            
             all_metadata = await self._load_metadata()
             doc_info = {
                 "id": doc_id,
@@ -272,7 +270,12 @@ IMPORTANT: All content must be wrapped in proper HTML tags. Do not use unsupport
                 "doc_type": "tiptap_document" if format == "html" else "plain"
             }
             all_metadata["documents"][doc_id] = doc_info
-            await self._save_metadata(all_metadata)
+            
+            # Write the document and the updated metadata in one transfer
+            await self.upload_files({
+                file_path: content_to_save,
+                self.metadata_file: json.dumps(all_metadata, indent=2),
+            })
             
             preview_url = None
             if hasattr(self, '_sandbox_url') and self._sandbox_url:
@@ -795,7 +798,6 @@ IMPORTANT: All content must be wrapped in proper HTML tags. Do not use unsupport
             
             temp_html_filename = f"temp_pdf_{doc_id}.html"
             temp_html_path = f"/workspace/{temp_html_filename}"
-            await self.sandbox.fs.upload_file(complete_html.encode(), temp_html_path)
             
             logger.info(f"Creating PDF from document: {title}")
             
@@ -845,15 +847,17 @@ if __name__ == "__main__":
 """
             
             script_path = f"/workspace/temp_pdf_script_{doc_id}.py"
-            await self.sandbox.fs.upload_file(pdf_generation_script.encode(), script_path)
+            await self.upload_files({
+                temp_html_path: complete_html,
+                script_path: pdf_generation_script,
+            })
             
             response = await self.sandbox.process.exec(
                 f"cd /workspace && python {script_path}",
                 timeout=30
             )
             
-            await self.sandbox.fs.delete_file(temp_html_path)
-            await self.sandbox.fs.delete_file(script_path)
+            await self.sandbox.process.exec(f"rm -f {temp_html_path} {script_path}")
             
             if response.exit_code != 0:
                 logger.error(f"PDF generation failed: {response.result}")
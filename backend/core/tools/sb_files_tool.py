@@ -1,11 +1,13 @@
 from core.agentpress.tool import ToolResult, openapi_schema, tool_metadata
 from core.sandbox.tool_base import SandboxToolsBase
+from core.sandbox import remote_edit
 from core.utils.files_utils import should_exclude_file, clean_path
 from core.agentpress.thread_manager import ThreadManager
 from core.utils.logger import logger
 from core.utils.config import config
 import os
 import json
+import hashlib
 import litellm
 import openai
 import asyncio
@@ -52,16 +54,21 @@ class SandboxFilesTool(SandboxToolsBase):
             await self._ensure_sandbox()
             
             files = await self.sandbox.fs.list_files(self.workspace_path)
+            # Skip excluded files and directories
+            files = [
+                file_info for file_info in files
+                if not (self._should_exclude_file(file_info.name) or file_info.is_dir)
+            ]
+            contents = await self.download_files(f"{self.workspace_path}/{file_info.name}" for file_info in files)
+
             for file_info in files:
                 rel_path = file_info.name
-                
-                # Skip excluded files and directories
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
+                full_path = f"{self.workspace_path}/{rel_path}"
+                if full_path not in contents:
                     continue
 
                 try:
-                    full_path = f"{self.workspace_path}/{rel_path}"
-                    content = (await self.sandbox.fs.download_file(full_path)).decode()
+                    content = contents[full_path].decode()
                     files_state[rel_path] = {
                         "content": content,
                         "is_dir": file_info.is_dir,
@@ -122,18 +129,12 @@ class SandboxFilesTool(SandboxToolsBase):
             if await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' already exists. Use update_file to modify existing files.")
             
-            # Create parent directories if needed
-            parent_dir = '/'.join(full_path.split('/')[:-1])
-            if parent_dir:
-                await self.sandbox.fs.create_folder(parent_dir, "755")
-
             # convert to json string if file_contents is a dict
             if isinstance(file_contents, dict):
                 file_contents = json.dumps(file_contents, indent=4)
 
-            # Write the file content
-            await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
-            await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            # Write the file content (parent directories and permissions in the same transfer)
+            await self.upload_files({full_path: file_contents}, permissions=permissions)
             
             message = f"File '{file_path}' created successfully."
             
@@ -183,12 +184,27 @@ class SandboxFilesTool(SandboxToolsBase):
             
             file_path = self.clean_path(file_path)
             full_path = f"{self.workspace_path}/{file_path}"
+            old_str = old_str.expandtabs()
+            new_str = new_str.expandtabs()
+            
+            # Apply the replacement inside the sandbox so the file doesn't travel
+            result = await remote_edit.replace(self.sandbox, full_path, old_str, new_str)
+            if result is not None:
+                if result.error == "missing":
+                    return self.fail_response(f"File '{file_path}' does not exist")
+                if result.error == "not_found":
+                    return self.fail_response(f"String '{old_str}' not found in file")
+                if result.error == "multiple":
+                    return self.fail_response(f"Multiple occurrences found in lines {result.match_lines}. Please ensure string is unique")
+                if result.ok:
+                    logger.debug(f"str_replace on '{file_path}': {result.summary()}")
+                    return self.success_response("Replacement successful.")
+            
+            # Fallback: edit the whole file here
             if not await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' does not exist")
             
             content = (await self.sandbox.fs.download_file(full_path)).decode()
-            old_str = old_str.expandtabs()
-            new_str = new_str.expandtabs()
             
             occurrences = content.count(old_str)
             if occurrences == 0:
@@ -254,8 +270,7 @@ class SandboxFilesTool(SandboxToolsBase):
             if not await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' does not exist. Use create_file to create a new file.")
 
-            await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
-            await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            await self.upload_files({full_path: file_contents}, permissions=permissions)
             
             message = f"File '{file_path}' completely rewritten successfully."
             
@@ -514,7 +529,30 @@ class SandboxFilesTool(SandboxToolsBase):
                     "updated_content": original_content
                 }))
 
-            await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            # Ship only the changed line ranges; upload the whole file only if the remote edit couldn't run
+            result = await remote_edit.patch_lines(
+                self.sandbox,
+                full_path,
+                remote_edit.line_hunks(original_content, new_content),
+                expected_sha256=hashlib.sha256(original_content.encode()).hexdigest(),
+            )
+            if result is None:
+                await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            elif result.ok:
+                logger.debug(f"edit_file on '{target_file}': {result.summary()}")
+            else:
+                # e.g. "conflict": the file changed since it was read, so the edit would overwrite those changes
+                message = (
+                    f"File '{target_file}' was modified while it was being edited. Read it again and retry the edit."
+                    if result.error == "conflict"
+                    else f"Failed to apply the edit to '{target_file}': {result.error}"
+                )
+                return ToolResult(success=False, output=json.dumps({
+                    "message": message,
+                    "file_path": target_file,
+                    "original_content": original_content,
+                    "updated_content": None
+                }))
             
             return ToolResult(success=True, output=json.dumps({
                 "message": f"File '{target_file}' edited successfully.",
@@ -1,11 +1,79 @@
 import asyncio
-from typing import Optional, List
+import base64
+import hashlib
+import json
+import shlex
+from typing import Dict, Iterator, Optional, List
 from core.agentpress.tool import ToolResult, openapi_schema, tool_metadata
 from core.sandbox.tool_base import SandboxToolsBase
 from core.agentpress.thread_manager import ThreadManager
 from core.utils.config import config
 from core.knowledge_base.validation import FileNameValidator, ValidationError
 from core.utils.logger import logger
+from core.sandbox.file_transfer import gather_bounded
+
+KB_MANIFEST_NAME = ".kb-manifest.json"
+KB_SYNC_BATCH_BYTES = 64 * 1024 * 1024
+
+# Lists ~/<kb_dir> as {relative path: [size, sha256]}. Files whose size and
+# mtime match the manifest reuse the recorded hash instead of being re-read;
+# freshly verified files get their mtime recorded in the manifest.
+KB_SCAN_SCRIPT = r'''
+import hashlib, json, os, sys
+root = os.path.expanduser("~/" + sys.argv[1])
+manifest_name = sys.argv[2]
+os.makedirs(root, exist_ok=True)
+manifest = None
+try:
+    with open(os.path.join(root, manifest_name)) as f:
+        manifest = json.load(f)
+except Exception:
+    pass
+recorded = (manifest or {}).get("files", {})
+files = {}
+stamped = False
+for dirpath, dirnames, filenames in os.walk(root):
+    for name in filenames:
+        full = os.path.join(dirpath, name)
+        rel = os.path.relpath(full, root)
+        st = os.stat(full)
+        known = recorded.get(rel) or {}
+        if rel != manifest_name and known.get("size") == st.st_size and known.get("mtime_ns") == st.st_mtime_ns:
+            files[rel] = [st.st_size, known.get("sha256")]
+            continue
+        digest = hashlib.sha256()
+        with open(full, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        files[rel] = [st.st_size, digest.hexdigest()]
+        if known.get("sha256") == files[rel][1] and known.get("size") == st.st_size:
+            # Verified: remember the mtime so the next scan can skip hashing it
+            known["mtime_ns"] = st.st_mtime_ns
+            stamped = True
+if stamped:
+    tmp = os.path.join(root, manifest_name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(root, manifest_name))
+print(json.dumps({"root": root, "files": files, "manifest": manifest}))
+'''
+
+
+def _kb_source_fingerprint(entry: dict) -> str:
+    """Identity of a knowledge base entry's stored content."""
+    return f"{entry.get('entry_id')}:{entry.get('file_path')}:{entry.get('file_size')}:{entry.get('updated_at')}"
+
+
+def _batch_by_size(files: Dict[str, bytes], max_bytes: int) -> Iterator[Dict[str, bytes]]:
+    batch, size = {}, 0
+    for path, content in files.items():
+        if batch and size + len(content) > max_bytes:
+            yield batch
+            batch, size = {}, 0
+        batch[path] = content
+        size += len(content)
+    if batch:
+        yield batch
 
 @tool_metadata(
     display_name="Knowledge Base",
@@ -267,7 +335,7 @@ class SandboxKbTool(SandboxToolsBase):
         "type": "function",
         "function": {
             "name": "global_kb_sync",
-            "description": "Sync agent's knowledge base files to sandbox ~/knowledge-base-global directory. Downloads all assigned knowledge base files and creates a local copy with proper folder structure.",
+            "description": "Sync agent's knowledge base files to sandbox ~/knowledge-base-global directory. Keeps a local copy of all assigned knowledge base files with proper folder structure; only files added or changed since the last sync are transferred.",
             "parameters": {
                 "type": "object",
                 "properties": {},
@@ -276,7 +344,12 @@ class SandboxKbTool(SandboxToolsBase):
         }
     })
     async def global_kb_sync(self) -> ToolResult:
-        """Sync all agent's knowledge base files to sandbox ~/knowledge-base-global directory."""
+        """Sync all agent's knowledge base files to sandbox ~/knowledge-base-global directory.
+
+        Incremental: a manifest in the directory records each file's source entry
+        and sha256, so only added/changed files are downloaded and uploaded and
+        only unassigned ones are deleted.
+        """
         try:
             await self._ensure_sandbox()
             
@@ -295,10 +368,12 @@ class SandboxKbTool(SandboxToolsBase):
                 entry_id,
                 enabled,
                 knowledge_base_entries (
+                    entry_id,
                     filename,
                     file_path,
                     file_size,
                     mime_type,
+                    updated_at,
                     knowledge_base_folders (
                         name
                     )
@@ -312,60 +387,87 @@ class SandboxKbTool(SandboxToolsBase):
                     "kb_directory": "~/knowledge-base-global"
                 })
             
-            # Create knowledge base directory in sandbox
             kb_dir = "knowledge-base-global"
-            await self.sandbox.process.exec(f"mkdir -p ~/{kb_dir}")
-            await self.sandbox.process.exec(f"rm -rf ~/{kb_dir}/*")
-            
-            synced_files = 0
-            folder_structure = {}
             
+            # Desired state: relative path -> source entry
+            desired = {}
             for assignment in result.data:
-                if not assignment.get('knowledge_base_entries'):
+                entry = assignment.get('knowledge_base_entries')
+                if not entry:
                     continue
-                    
-                entry = assignment['knowledge_base_entries']
-                folder_name = entry['knowledge_base_folders']['name']
-                filename = entry['filename']
-                file_path = entry['file_path']  # S3 path
-                
+                rel_path = f"{entry['knowledge_base_folders']['name']}/{entry['filename']}"
+                desired[rel_path] = entry
+            
+            # Current state of the sandbox copy, in one round trip
+            state = await self._scan_kb_directory(kb_dir)
+            root = state["root"]
+            present = state["files"]
+            manifest_files = (state.get("manifest") or {}).get("files", {})
+            
+            unchanged, changed = [], []
+            for rel_path, entry in desired.items():
+                recorded = manifest_files.get(rel_path)
+                current = present.get(rel_path)
+                if (
+                    recorded
+                    and current
+                    and recorded.get("source") == _kb_source_fingerprint(entry)
+                    and recorded.get("sha256") == current[1]
+                    and recorded.get("size") == current[0]
+                ):
+                    unchanged.append(rel_path)
+                else:
+                    changed.append(rel_path)
+            removed = [rel_path for rel_path in present if rel_path not in desired and rel_path not in (KB_MANIFEST_NAME, "README.md")]
+            
+            # Fetch only added/changed files from storage, with bounded concurrency
+            async def fetch(rel_path: str):
                 try:
-                    # Download file from S3
-                    file_response = await client.storage.from_('file-uploads').download(file_path)
-                    
-                    if not file_response:
-                        continue
-                    
-                    # Create folder structure in sandbox
-                    folder_path = f"~/{kb_dir}/{folder_name}"
-                    await self.sandbox.process.exec(f"mkdir -p '{folder_path}'")
-                    
-                    # Upload file to sandbox
-                    file_destination = f"{kb_dir}/{folder_name}/{filename}"
-                    await self.sandbox.fs.upload_file(file_response, file_destination)
-                    
-                    synced_files += 1
-                    
-                    if folder_name not in folder_structure:
-                        folder_structure[folder_name] = []
-                    folder_structure[folder_name].append(filename)
-                    
+                    return await client.storage.from_('file-uploads').download(desired[rel_path]['file_path'])
                 except Exception as e:
+                    logger.warning(f"Failed to download knowledge base file {rel_path}: {e}")
+                    return None
+            
+            contents = await gather_bounded(fetch(rel_path) for rel_path in changed)
+            
+            new_manifest = {rel_path: manifest_files[rel_path] for rel_path in unchanged}
+            uploads = {}
+            transferred = 0
+            for rel_path, content in zip(changed, contents):
+                if not content:
                     continue
+                transferred += 1
+                uploads[f"{root}/{rel_path}"] = content
+                new_manifest[rel_path] = {
+                    "source": _kb_source_fingerprint(desired[rel_path]),
+                    "sha256": hashlib.sha256(content).hexdigest(),
+                    "size": len(content),
+                }
             
-            # Create README
-            readme_content = f"""# Global Knowledge Base
+            if removed:
+                paths = " ".join(shlex.quote(f"{root}/{rel_path}") for rel_path in removed)
+                await self.sandbox.process.exec(f"rm -f {paths} && find {shlex.quote(root)} -mindepth 1 -type d -empty -delete")
+            
+            folder_structure = {}
+            for rel_path in sorted(new_manifest):
+                folder_name, filename = rel_path.split("/", 1)
+                folder_structure.setdefault(folder_name, []).append(filename)
+            synced_files = len(new_manifest)
+            
+            if uploads or removed or new_manifest != manifest_files:
+                # Create README
+                readme_content = f"""# Global Knowledge Base
 
 This directory contains your agent's knowledge base files, synced from the cloud.
 
 ## Structure:
 """
-            for folder_name, files in folder_structure.items():
-                readme_content += f"\n### {folder_name}/\n"
-                for filename in files:
-                    readme_content += f"- {filename}\n"
-            
-            readme_content += f"""
+                for folder_name, files in folder_structure.items():
+                    readme_content += f"\n### {folder_name}/\n"
+                    for filename in files:
+                        readme_content += f"- {filename}\n"
+                
+                readme_content += f"""
 ## Usage:
 - Files are automatically synced when you run tasks that require knowledge base access
 - You can manually sync with the `global_kb_sync` tool
@@ -374,12 +476,19 @@ This directory contains your agent's knowledge base files, synced from the cloud
 ## Last Sync:
 Agent ID: {agent_id}
 """
-            
-            await self.sandbox.fs.upload_file(readme_content.encode('utf-8'), f"{kb_dir}/README.md")
+                uploads[f"{root}/README.md"] = readme_content.encode('utf-8')
+                uploads[f"{root}/{KB_MANIFEST_NAME}"] = json.dumps({"version": 1, "agent_id": agent_id, "files": new_manifest}, indent=2).encode()
+                
+                # Files, README and manifest in batched transfers
+                for batch in _batch_by_size(uploads, KB_SYNC_BATCH_BYTES):
+                    await self.upload_files(batch)
             
             return self.success_response({
                 "message": f"Successfully synced {synced_files} files to knowledge base",
                 "synced_files": synced_files,
+                "added_or_updated": transferred,
+                "unchanged": len(unchanged),
+                "removed": len(removed),
                 "kb_directory": f"~/{kb_dir}",
                 "folder_structure": folder_structure,
                 "agent_id": agent_id
@@ -388,6 +497,14 @@ Agent ID: {agent_id}
         except Exception as e:
             return self.fail_response(f"Failed to sync knowledge base: {str(e)}")
 
+    async def _scan_kb_directory(self, kb_dir: str) -> dict:
+        """Sizes and sha256 of the files under ~/{kb_dir}, plus its sync manifest, in one exec."""
+        script = base64.b64encode(KB_SCAN_SCRIPT.encode()).decode()
+        response = await self.sandbox.process.exec(f"echo {script} | base64 -d | python3 - {shlex.quote(kb_dir)} {KB_MANIFEST_NAME}")
+        if response.exit_code != 0:
+            raise RuntimeError(f"Failed to scan knowledge base directory: {response.result}")
+        return json.loads(response.result.strip().splitlines()[-1])
+
     @openapi_schema({
         "type": "function",
         "function": {
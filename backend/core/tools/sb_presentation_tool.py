@@ -99,11 +99,15 @@ class SandboxPresentationTool(SandboxToolsBase):
                 "updated_at": datetime.now().isoformat()
             }
 
-    async def _save_presentation_metadata(self, presentation_path: str, metadata: Dict):
-        """Save presentation metadata"""
+    def _serialize_presentation_metadata(self, presentation_path: str, metadata: Dict) -> Dict[str, bytes]:
+        """Stamp and serialize presentation metadata as a {path: content} upload entry"""
         metadata["updated_at"] = datetime.now().isoformat()
         metadata_path = f"{presentation_path}/metadata.json"
-        await self.sandbox.fs.upload_file(json.dumps(metadata, indent=2).encode(), metadata_path)
+        return {metadata_path: json.dumps(metadata, indent=2).encode()}
+
+    async def _save_presentation_metadata(self, presentation_path: str, metadata: Dict):
+        """Save presentation metadata"""
+        await self.upload_files(self._serialize_presentation_metadata(presentation_path, metadata))
 
     def _load_template_metadata(self, template_name: str) -> Dict:
         """Load metadata from a template on the backend filesystem"""
@@ -139,38 +143,24 @@ class SandboxPresentationTool(SandboxToolsBase):
         # Ensure presentation directory exists
         await self._ensure_presentation_dir(presentation_name)
         
-        # Use os.walk to recursively copy all files
-        copied_files = []
+        # Use os.walk to collect all files, then copy them in a single transfer
+        template_files = {}
         for root, dirs, files in os.walk(template_path):
-            # Calculate relative path from template root
-            rel_path = os.path.relpath(root, template_path)
-            
-            # Create corresponding directory in workspace (if not root)
-            if rel_path != '.':
-                target_dir = os.path.join(presentation_path, rel_path)
-                target_dir_path = target_dir.replace('\\', '/')  # Normalize path separators
-                try:
-                    await self.sandbox.fs.create_folder(target_dir_path, "755")
-                except:
-                    pass  # Directory might already exist
-            else:
-                target_dir_path = presentation_path
-            
-            # Copy all files
             for file in files:
                 source_file = os.path.join(root, file)
                 rel_file_path = os.path.relpath(source_file, template_path)
-                target_file = os.path.join(presentation_path, rel_file_path).replace('\\', '/')
+                target_file = os.path.join(presentation_path, rel_file_path).replace('\\', '/')  # Normalize path separators
                 
                 try:
                     with open(source_file, 'rb') as f:
-                        file_content = f.read()
-                    await self.sandbox.fs.upload_file(file_content, target_file)
-                    copied_files.append(rel_file_path)
+                        template_files[target_file] = f.read()
                 except Exception as e:
                     # Log error but continue with other files
                     print(f"Error copying {rel_file_path}: {str(e)}")
         
+        # Directories are created by the transfer
+        await self.upload_files(template_files)
+        
         # Update metadata.json with correct paths for the new presentation
         metadata = await self._load_presentation_metadata(presentation_path)
         template_metadata = self._load_template_metadata(template_name)
@@ -575,10 +565,8 @@ class SandboxPresentationTool(SandboxToolsBase):
                 presentation_title=presentation_title
             )
             
-            # Save slide file
             slide_filename = f"slide_{slide_number:02d}.html"
             slide_path = f"{presentation_path}/{slide_filename}"
-            await self.sandbox.fs.upload_file(slide_html.encode(), slide_path)
             
             # Update metadata
             if "slides" not in metadata:
@@ -592,8 +580,11 @@ class SandboxPresentationTool(SandboxToolsBase):
                 "created_at": datetime.now().isoformat()
             }
             
-            # Save updated metadata
-            await self._save_presentation_metadata(presentation_path, metadata)
+            # Save slide file and updated metadata in one transfer
+            await self.upload_files({
+                slide_path: slide_html,
+                **self._serialize_presentation_metadata(presentation_path, metadata),
+            })
             
             response_data = {
                 "message": f"Slide {slide_number} '{slide_title}' created/updated successfully",
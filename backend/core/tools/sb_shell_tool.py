@@ -1,11 +1,49 @@
 import asyncio
-from typing import Optional, Dict, Any
-import time
-import asyncio
+import shlex
+from typing import Optional, Dict, Any, List
 from uuid import uuid4
 from core.agentpress.tool import ToolResult, openapi_schema, tool_metadata
 from core.sandbox.tool_base import SandboxToolsBase
 from core.agentpress.thread_manager import ThreadManager
+from core.utils.logger import logger
+
+
+class _CommandOutput:
+    """Output of a streamed command, tracked by offset per stream (stdout, stderr) so a re-attached stream only appends new data."""
+
+    STREAMS = ("stdout", "stderr")
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self.offsets: Dict[str, int] = dict.fromkeys(self.STREAMS, 0)
+        self._replayed: Dict[str, int] = dict.fromkeys(self.STREAMS, 0)
+
+    def rewind(self):
+        """Start of (re)played log streams: the first `offsets[stream]` characters of each are already known."""
+        self._replayed = dict.fromkeys(self.STREAMS, 0)
+
+    def _on_chunk(self, stream: str, chunk: str):
+        if not chunk:
+            return
+        start = self._replayed[stream]
+        self._replayed[stream] += len(chunk)
+        offset = self.offsets[stream]
+        if self._replayed[stream] <= offset:
+            return
+        new = chunk[max(0, offset - start):]
+        self._chunks.append(new)
+        self.offsets[stream] += len(new)
+
+    def on_stdout(self, chunk: str):
+        self._on_chunk("stdout", chunk)
+
+    def on_stderr(self, chunk: str):
+        self._on_chunk("stderr", chunk)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
 
 @tool_metadata(
     display_name="Terminal & Commands",
@@ -64,11 +102,11 @@ class SandboxShellTool(SandboxToolsBase):
                     },
                     "session_name": {
                         "type": "string",
-                        "description": "Optional name of the tmux session to use. Use named sessions for related commands that need to maintain state. Defaults to a random session name.",
+                        "description": "Optional name of the session to use. Use named sessions for related commands that need to maintain state. Defaults to a random session name. Blocking and non-blocking commands keep separate sessions: a non-blocking command runs in the tmux session of this name, a blocking one in a shell session of this name that only later blocking commands share (working directory, environment). So a blocking command does not see state set up by non-blocking commands of the same session name, and vice versa.",
                     },
                     "blocking": {
                         "type": "boolean",
-                        "description": "Whether to wait for the command to complete. Defaults to false for non-blocking execution.",
+                        "description": "Whether to wait for the command to complete and return its output and exit code. Defaults to false for non-blocking execution. Blocking commands do not run in tmux, so check_command_output and terminate_command do not apply to them; one that exceeds its timeout is terminated.",
                         "default": False
                     },
                     "timeout": {
@@ -100,9 +138,13 @@ class SandboxShellTool(SandboxToolsBase):
                 cwd = f"{self.workspace_path}/{folder}"
             
             # Generate a session name if not provided
+            named_session = bool(session_name)
             if not session_name:
                 session_name = f"session_{str(uuid4())[:8]}"
             
+            if blocking:
+                return await self._execute_blocking(command, cwd, session_name, timeout, keep_session=named_session)
+            
             # Check if tmux session already exists
             check_session = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'not_exists'")
             session_exists = "not_exists" not in check_session.get("output", "")
@@ -114,61 +156,16 @@ class SandboxShellTool(SandboxToolsBase):
             # Escape double quotes for the command
             wrapped_command = command.replace('"', '\\"')
             
-            if blocking:
-                # For blocking execution, use a more reliable approach
-                # Add a unique marker to detect command completion
-                marker = f"COMMAND_DONE_{str(uuid4())[:8]}"
-                completion_command = self._format_completion_command(command, marker)
-                wrapped_completion_command = completion_command.replace('"', '\\"')
-                
-                # Send the command with completion marker
-                await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_completion_command}" Enter')
-                
-                start_time = time.time()
-                final_output = ""
-                
-                while (time.time() - start_time) < timeout:
-                    # Wait a shorter interval for more responsive checking
-                    await asyncio.sleep(0.5)
-                    
-                    # Check if session still exists (command might have exited)
-                    check_result = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'ended'")
-                    if "ended" in check_result.get("output", ""):
-                        break
-                        
-                    # Get current output and check for our completion marker
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    current_output = output_result.get("output", "")
-
-                    if self._is_command_completed(current_output, marker):
-                        final_output = current_output
-                        break
-                
-                # If we didn't get the marker, capture whatever output we have
-                if not final_output:
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    final_output = output_result.get("output", "")
-                
-                # Kill the session after capture
-                await self._execute_raw_command(f"tmux kill-session -t {session_name}")
-                
-                return self.success_response({
-                    "output": final_output,
-                    "session_name": session_name,
-                    "cwd": cwd,
-                    "completed": True
-                })
-            else:
-                # Send command to tmux session for non-blocking execution
-                await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_command}" Enter')
-                
-                # For non-blocking, just return immediately
-                return self.success_response({
-                    "session_name": session_name,
-                    "cwd": cwd,
-                    "message": f"Command sent to tmux session '{session_name}'. Use check_command_output to view results.",
-                    "completed": False
-                })
+            # Send command to tmux session for non-blocking execution
+            await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_command}" Enter')
+            
+            # For non-blocking, just return immediately
+            return self.success_response({
+                "session_name": session_name,
+                "cwd": cwd,
+                "message": f"Command sent to tmux session '{session_name}'. Use check_command_output to view results.",
+                "completed": False
+            })
                 
         except Exception as e:
             # Attempt to clean up session in case of error
@@ -179,6 +176,82 @@ class SandboxShellTool(SandboxToolsBase):
                     pass
             return self.fail_response(f"Error executing command: {str(e)}")
 
+    async def _execute_blocking(self, command: str, cwd: str, session_name: str, timeout: int, keep_session: bool = False) -> ToolResult:
+        """Run a command to completion in a sandbox process session.
+
+        The command runs asynchronously in the session and its logs are streamed
+        back as it produces them; the call returns as soon as the command exits,
+        with the exit code recorded by the session. A named session is kept so
+        later blocking commands share its shell state; generated ones are
+        removed afterwards (which also kills a command that timed out).
+
+        The process session is separate from the tmux session of the same name
+        that non-blocking commands use (see the execute_command schema).
+        """
+        from daytona_sdk import SessionExecuteRequest
+
+        session_key = f"blocking:{session_name}"
+        session_id = await self._ensure_session(session_key)
+        output = _CommandOutput()
+        timed_out = False
+        exit_code = None
+
+        try:
+            response = await self.sandbox.process.execute_session_command(
+                session_id=session_id,
+                req=SessionExecuteRequest(command=f"cd {shlex.quote(cwd)} && {command}", var_async=True),
+            )
+            try:
+                exit_code = await asyncio.wait_for(self._follow_command(session_id, response.cmd_id, output), timeout=timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+        finally:
+            if timed_out or not keep_session:
+                await self._cleanup_session(session_key)
+
+        result = {
+            "output": output.text,
+            "exit_code": exit_code,
+            "session_name": session_name,
+            "cwd": cwd,
+            "completed": not timed_out,
+        }
+        if timed_out:
+            result["message"] = f"Command did not finish within {timeout}s and was terminated. Use blocking=false for long-running commands."
+        return self.success_response(result)
+
+    async def _follow_command(self, session_id: str, command_id: str, output: "_CommandOutput", max_attempts: int = 3) -> Optional[int]:
+        """Stream a session command's logs into `output` until it exits; return its exit code.
+
+        If the log stream drops before the command exits it is re-attached, and
+        the replayed logs of each stream are skipped up to the offset already
+        received on it.
+        """
+        process = self.sandbox.process
+        for attempt in range(max_attempts):
+            output.rewind()
+            try:
+                await process.get_session_command_logs_async(session_id, command_id, output.on_stdout, output.on_stderr)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                command = await process.get_session_command(session_id, command_id)
+                if command.exit_code is not None:
+                    # Finished while the stream was down: one fetch for the remainder
+                    logs = await process.get_session_command_logs(session_id=session_id, command_id=command_id)
+                    output.rewind()
+                    if logs:
+                        output.on_stdout(logs.stdout or "")
+                        output.on_stderr(logs.stderr or "")
+                    return command.exit_code
+                if attempt == max_attempts - 1:
+                    raise
+                logger.debug(f"Log stream for command {command_id} dropped, re-attaching from offsets {output.offsets}: {e}")
+
+        command = await process.get_session_command(session_id, command_id)
+        return command.exit_code
+
     async def _execute_raw_command(self, command: str) -> Dict[str, Any]:
         """Execute a raw command directly in the sandbox."""
         # Ensure session exists for raw commands
@@ -246,7 +319,7 @@ class SandboxShellTool(SandboxToolsBase):
             # Check if session exists
             check_result = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'not_exists'")
             if "not_exists" in check_result.get("output", ""):
-                return self.fail_response(f"Tmux session '{session_name}' does not exist.")
+                return self.fail_response(f"Tmux session '{session_name}' does not exist. Blocking commands don't run in tmux; their output is returned by execute_command.")
             
             # Get output from tmux pane
             output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
@@ -351,98 +424,6 @@ class SandboxShellTool(SandboxToolsBase):
         except Exception as e:
             return self.fail_response(f"Error listing commands: {str(e)}")
 
-    def _format_completion_command(self, command: str, marker: str) -> str:
-        """Format command with completion marker, handling heredocs properly."""
-        import re
-        
-        # Check if command contains heredoc syntax
-        # Look for patterns like: << EOF, << 'EOF', << "EOF", <<EOF
-        heredoc_pattern = r'<<\s*[\'"]?\w+[\'"]?'
-        
-        if re.search(heredoc_pattern, command):
-            # For heredoc commands, add the completion marker on a new line
-            # This ensures it executes after the heredoc completes
-            return f"{command}\necho {marker}"
-        else:
-            # For regular commands, use semicolon separator
-            return f"{command} ; echo {marker}"
-
-    def _is_command_completed(self, current_output: str, marker: str) -> bool:
-        """
-        Check if command execution is completed by comparing marker from end to start.
-        
-        Args:
-            current_output: Current output content
-            marker: Completion marker
-            
-        Returns:
-            bool: True if command completed, False otherwise
-        """
-        if not current_output or not marker:
-            return False
-
-        # Find the last complete marker match position to start comparison
-        # Avoid terminal prompt output at the end
-        marker_end_pos = -1
-        for i in range(len(current_output) - len(marker), -1, -1):
-            if current_output[i:i+len(marker)] == marker:
-                marker_end_pos = i + len(marker) - 1
-                break
-        
-        # Start comparison from found marker position or end of output
-        if marker_end_pos != -1:
-            output_idx = marker_end_pos
-            marker_idx = len(marker) - 1
-        else:
-            output_idx = len(current_output) - 1
-            marker_idx = len(marker) - 1
-        
-        # Compare characters from end to start
-        while marker_idx >= 0 and output_idx >= 0:
-            # Skip newlines in current_output
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            # Compare characters
-            if current_output[output_idx] != marker[marker_idx]:
-                return False
-                
-            # Continue comparison
-            output_idx -= 1
-            marker_idx -= 1
-        
-        # If marker not fully matched
-        if marker_idx >= 0:
-            return False
-            
-        # Check if preceded by "echo " (command just started)
-        check_count = 0
-        echo_chars = "echo "
-        echo_idx = len(echo_chars) - 1
-        
-        while output_idx >= 0 and check_count < 5:
-            # Skip newlines
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            check_count += 1
-            
-            # Check for "echo " pattern
-            if echo_idx >= 0 and current_output[output_idx] == echo_chars[echo_idx]:
-                echo_idx -= 1
-            else:
-                echo_idx = len(echo_chars) - 1
-                
-            output_idx -= 1
-            
-        # If "echo " found, command just started
-        if echo_idx < 0:
-            return False
-            
-        return True
-
     async def cleanup(self):
         """Clean up all sessions."""
         for session_name in list(self._sessions.keys()):
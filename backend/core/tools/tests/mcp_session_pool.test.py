@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from core.tools.utils import mcp_session_pool as mcp_session_pool_module
+from core.tools.utils.mcp_session_pool import MCPServerSpec, MCPSessionPool
+
+
+class _FakeSession:
+    opened = 0
+
+    def __init__(self, read, write):
+        type(self).opened += 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def initialize(self):
+        pass
+
+    async def call_tool(self, name, arguments):
+        await asyncio.sleep(arguments.get("delay", 0))
+        return name
+
+
+class TestMCPSessionPool:
+    @pytest.fixture(autouse=True)
+    def fake_session(self, monkeypatch):
+        _FakeSession.opened = 0
+        monkeypatch.setattr(mcp_session_pool_module, "ClientSession", _FakeSession)
+
+    def _pool(self, monkeypatch, connect_delay: float = 0.0) -> MCPSessionPool:
+        @asynccontextmanager
+        async def transport():
+            await asyncio.sleep(connect_delay)
+            yield (None, None)
+
+        pool = MCPSessionPool(max_concurrency=2, idle_timeout=60, health_check_interval=60)
+        monkeypatch.setattr(pool, "_open_transport", lambda spec: transport())
+        return pool
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_session_is_reused_across_calls(self, monkeypatch):
+        pool = self._pool(monkeypatch)
+        spec = MCPServerSpec.http("https://mcp.example.com")
+        try:
+            assert await pool.call_tool(spec, "search", {}) == "search"
+            assert await pool.call_tool(spec, "fetch", {}) == "fetch"
+            assert _FakeSession.opened == 1
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_connect_and_call_share_one_deadline(self, monkeypatch):
+        pool = self._pool(monkeypatch, connect_delay=0.15)
+        spec = MCPServerSpec.http("https://mcp.example.com")
+        try:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(TimeoutError):
+                await pool.call_tool(spec, "search", {"delay": 0.15}, timeout=0.2)
+            assert loop.time() - started < 0.3
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_deadline_during_connect_closes_the_pending_session(self, monkeypatch):
+        pool = self._pool(monkeypatch, connect_delay=10)
+        spec = MCPServerSpec.http("https://mcp.example.com")
+
+        with pytest.raises(TimeoutError):
+            await pool.call_tool(spec, "search", {}, timeout=0.05)
+
+        assert pool.stats()["sessions"] == 0
+        assert [task for task in asyncio.all_tasks() if "_run_session" in repr(task)] == []
@@ -32,6 +32,15 @@ class CustomMCPHandler:
         
         return self.custom_tools
     
+    async def initialize_custom_mcp(self, config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Connect to one custom MCP server, register its enabled tools and return them.
+
+        Unlike initialize_custom_mcps, errors propagate to the caller.
+        """
+        await self._initialize_single_custom_mcp(config)
+        server_name = config.get('name', 'Unknown')
+        return {name: info for name, info in self.custom_tools.items() if info.get('server') == server_name}
+    
     async def _initialize_single_custom_mcp_safe(self, config: Dict[str, Any]):
         try:
             await self._initialize_single_custom_mcp(config)
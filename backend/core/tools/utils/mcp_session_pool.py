@@ -0,0 +1,304 @@
+"""
+Process-wide pool of live MCP client sessions.
+
+Opening an MCP session costs a transport handshake (SSE/HTTP connect, or
+spawning a stdio server) plus `session.initialize()`. MCPToolExecutor used to
+pay that on every tool call; the pool keeps one initialized session per server
+and reuses it:
+
+- sessions are keyed by a hash of the transport, URL, headers and stdio
+  command/args/env, so identical server configs share a session
+- connecting is single-flight per key
+- each server has a concurrency cap (MCP_SESSION_MAX_CONCURRENCY) on calls in
+  flight over its session
+- a session unused for MCP_SESSION_HEALTH_CHECK_SECONDS is pinged before reuse
+- sessions idle for MCP_SESSION_IDLE_TIMEOUT_SECONDS are closed
+- a call that fails because the connection broke is retried once on a fresh
+  session
+
+The MCP client context managers run anyio task groups that must be entered and
+exited from the same task, so every session lives in a dedicated owner task
+that opens the transport, initializes the session and then waits until the
+pool closes it.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from core.utils.config import config
+from core.utils.logger import logger
+
+# Errors that mean the transport is gone, not that the tool failed
+CONNECTION_ERRORS = (
+    ConnectionError,
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+)
+
+
+class MCPSessionClosedError(ConnectionError):
+    """The pooled session's transport closed before or during a call."""
+
+
+@dataclass(frozen=True)
+class MCPServerSpec:
+    """Connection parameters identifying one MCP server."""
+    transport: str
+    url: Optional[str] = None
+    headers: Tuple[Tuple[str, str], ...] = ()
+    command: Optional[str] = None
+    args: Tuple[str, ...] = ()
+    env: Tuple[Tuple[str, str], ...] = ()
+
+    @classmethod
+    def sse(cls, url: str, headers: Optional[Dict[str, str]] = None) -> "MCPServerSpec":
+        return cls(transport="sse", url=url, headers=tuple(sorted((headers or {}).items())))
+
+    @classmethod
+    def http(cls, url: str, headers: Optional[Dict[str, str]] = None) -> "MCPServerSpec":
+        return cls(transport="http", url=url, headers=tuple(sorted((headers or {}).items())))
+
+    @classmethod
+    def stdio(cls, command: str, args: Optional[list] = None, env: Optional[Dict[str, str]] = None) -> "MCPServerSpec":
+        return cls(transport="stdio", command=command, args=tuple(args or ()), env=tuple(sorted((env or {}).items())))
+
+    @property
+    def key(self) -> str:
+        raw = json.dumps([self.transport, self.url, self.headers, self.command, self.args, self.env], default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @property
+    def label(self) -> str:
+        """Log-safe description (no headers or env values)."""
+        return f"{self.transport}:{self.url or self.command}"
+
+
+@dataclass
+class _PooledSession:
+    spec: MCPServerSpec
+    semaphore: asyncio.Semaphore
+    session: Optional[ClientSession] = None
+    owner: Optional[asyncio.Task] = None
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    closing: asyncio.Event = field(default_factory=asyncio.Event)
+    error: Optional[BaseException] = None
+    last_used: float = field(default_factory=time.monotonic)
+    in_flight: int = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self.owner is not None and not self.owner.done() and not self.closing.is_set()
+
+
+class MCPSessionPool:
+    """Keyed pool of initialized MCP ClientSessions, one per server."""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        health_check_interval: Optional[float] = None,
+        connect_timeout: float = 30,
+    ):
+        self.max_concurrency = max_concurrency or int(config.MCP_SESSION_MAX_CONCURRENCY or 8)
+        self.idle_timeout = idle_timeout or float(config.MCP_SESSION_IDLE_TIMEOUT_SECONDS or 300)
+        self.health_check_interval = health_check_interval or float(config.MCP_SESSION_HEALTH_CHECK_SECONDS or 60)
+        self.connect_timeout = connect_timeout
+        self._sessions: Dict[str, _PooledSession] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+        self._janitor: Optional[asyncio.Task] = None
+
+    def _open_transport(self, spec: MCPServerSpec):
+        headers = dict(spec.headers)
+        if spec.transport == "sse":
+            try:
+                return sse_client(spec.url, headers=headers)
+            except TypeError as e:
+                if "unexpected keyword argument" in str(e):
+                    return sse_client(spec.url)
+                raise
+        if spec.transport == "http":
+            if headers:
+                return streamablehttp_client(spec.url, headers=headers)
+            return streamablehttp_client(spec.url)
+        if spec.transport == "stdio":
+            return stdio_client(StdioServerParameters(command=spec.command, args=list(spec.args), env=dict(spec.env)))
+        raise ValueError(f"Unsupported MCP transport: {spec.transport}")
+
+    async def _run_session(self, entry: _PooledSession):
+        """Owner task: open the transport and session, then hold them until closed."""
+        try:
+            async with AsyncExitStack() as stack:
+                streams = await stack.enter_async_context(self._open_transport(entry.spec))
+                read, write = streams[0], streams[1]
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                entry.session = session
+                entry.ready.set()
+                await entry.closing.wait()
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            entry.error = e
+            if entry.ready.is_set():
+                logger.warning(f"MCP session for {entry.spec.label} closed unexpectedly: {e}")
+        finally:
+            entry.closing.set()
+            entry.ready.set()
+
+    async def _connect(self, spec: MCPServerSpec) -> _PooledSession:
+        entry = _PooledSession(spec=spec, semaphore=self._semaphores.setdefault(spec.key, asyncio.Semaphore(self.max_concurrency)))
+        entry.owner = asyncio.create_task(self._run_session(entry))
+        try:
+            await asyncio.wait_for(entry.ready.wait(), timeout=self.connect_timeout)
+        except asyncio.TimeoutError:
+            await self._close_entry(entry)
+            raise TimeoutError(f"Timed out connecting to MCP server {spec.label}")
+        except asyncio.CancelledError:
+            # The caller's deadline expired while connecting: don't leave the owner task behind
+            await self._close_entry(entry)
+            raise
+        if not entry.alive:
+            error = entry.error
+            await self._close_entry(entry)
+            raise MCPSessionClosedError(f"Failed to connect to MCP server {spec.label}: {error}") from error
+        logger.debug(f"Opened pooled MCP session for {spec.label}")
+        self._ensure_janitor()
+        return entry
+
+    async def _is_healthy(self, entry: _PooledSession) -> bool:
+        if not entry.alive:
+            return False
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(entry.session.send_ping(), timeout=5)
+            return True
+        except Exception as e:
+            logger.debug(f"MCP session health check failed for {entry.spec.label}: {e}")
+            return False
+
+    async def _acquire(self, spec: MCPServerSpec) -> _PooledSession:
+        key = spec.key
+        entry = self._sessions.get(key)
+        if entry and await self._is_healthy(entry):
+            return entry
+        unhealthy = entry
+
+        lock = self._connect_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._sessions.get(key)
+            if entry and entry is not unhealthy and entry.alive:
+                # Another caller reconnected while we waited for the lock
+                return entry
+            if entry:
+                await self._discard(entry)
+            entry = await self._connect(spec)
+            self._sessions[key] = entry
+            return entry
+
+    async def _discard(self, entry: _PooledSession):
+        if self._sessions.get(entry.spec.key) is entry:
+            del self._sessions[entry.spec.key]
+        await self._close_entry(entry)
+
+    async def _run(self, spec: MCPServerSpec, operation: Callable[[ClientSession], Awaitable[Any]], description: str, timeout: float) -> Any:
+        """Run an operation on the pooled session for `spec`, reconnecting once if the session broke.
+
+        Connecting, waiting for a concurrency slot, the call and a reconnect all
+        share one `timeout` deadline, as the per-call connection did before.
+        """
+        async with asyncio.timeout(timeout):
+            for attempt in range(2):
+                entry = await self._acquire(spec)
+                async with entry.semaphore:
+                    entry.in_flight += 1
+                    try:
+                        result = await operation(entry.session)
+                        entry.last_used = time.monotonic()
+                        return result
+                    except CONNECTION_ERRORS as e:
+                        await self._discard(entry)
+                        if attempt == 1:
+                            raise
+                        logger.debug(f"MCP session for {spec.label} broke during {description}, reconnecting: {e}")
+                    except Exception:
+                        if not entry.alive:
+                            await self._discard(entry)
+                        raise
+                    finally:
+                        entry.in_flight -= 1
+
+    async def call_tool(self, spec: MCPServerSpec, tool_name: str, arguments: Dict[str, Any], timeout: float = 30) -> Any:
+        """Call a tool over the pooled session for `spec`."""
+        return await self._run(spec, lambda session: session.call_tool(tool_name, arguments), tool_name, timeout)
+
+    async def list_tools(self, spec: MCPServerSpec, timeout: float = 30) -> List[Any]:
+        """List the server's tools over the pooled session (the session stays open for later calls)."""
+        result = await self._run(spec, lambda session: session.list_tools(), "list_tools", timeout)
+        return result.tools if hasattr(result, 'tools') else result
+
+    async def _close_entry(self, entry: _PooledSession):
+        entry.closing.set()
+        if entry.owner and not entry.owner.done():
+            if entry.session is None:
+                # Still connecting: nothing to shut down gracefully
+                entry.owner.cancel()
+            try:
+                await asyncio.wait_for(entry.owner, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                entry.owner.cancel()
+            except Exception:
+                pass
+
+    def _ensure_janitor(self):
+        if self._janitor is None or self._janitor.done():
+            self._janitor = asyncio.create_task(self._evict_idle_loop())
+
+    async def _evict_idle_loop(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 60.0))
+        try:
+            while self._sessions:
+                await asyncio.sleep(interval)
+                await self.evict_idle()
+        except asyncio.CancelledError:
+            pass
+
+    async def evict_idle(self):
+        """Close sessions that are dead or have been idle longer than idle_timeout."""
+        now = time.monotonic()
+        for entry in list(self._sessions.values()):
+            if entry.in_flight:
+                continue
+            if not entry.alive or now - entry.last_used >= self.idle_timeout:
+                logger.debug(f"Evicting idle MCP session for {entry.spec.label}")
+                await self._discard(entry)
+
+    async def close_all(self):
+        """Close every pooled session (on API and worker shutdown)."""
+        if self._janitor and not self._janitor.done():
+            self._janitor.cancel()
+        for entry in list(self._sessions.values()):
+            await self._discard(entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "in_flight": sum(entry.in_flight for entry in self._sessions.values()),
+        }
+
+
+mcp_session_pool = MCPSessionPool()
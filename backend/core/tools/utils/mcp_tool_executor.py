@@ -1,20 +1,18 @@
 import json
-import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from core.agentpress.tool import ToolResult
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.sse import sse_client
-from mcp.client.stdio import stdio_client
-from mcp.client.streamable_http import streamablehttp_client
 from core.mcp_module import mcp_service
+from core.tools.utils.mcp_session_pool import MCPServerSpec, mcp_session_pool
 from core.utils.logger import logger
 
 
 class MCPToolExecutor:
-    def __init__(self, custom_tools: Dict[str, Dict[str, Any]], tool_wrapper=None):
+    def __init__(self, custom_tools: Dict[str, Dict[str, Any]], tool_wrapper=None, standard_tools: Optional[Dict[str, Dict[str, Any]]] = None):
         self.mcp_manager = mcp_service
         self.custom_tools = custom_tools
+        self.standard_tools = standard_tools or {}
         self.tool_wrapper = tool_wrapper
+        self._standard_specs: Dict[str, MCPServerSpec] = {}
     
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> ToolResult:
         logger.debug(f"Executing MCP tool {tool_name} with arguments {arguments}")
@@ -28,7 +26,24 @@ class MCPToolExecutor:
             logger.error(f"Error executing MCP tool {tool_name}: {str(e)}")
             return self._create_error_result(f"Error executing tool: {str(e)}")
     
+    async def _get_standard_spec(self, server_config: Dict[str, Any]) -> MCPServerSpec:
+        qualified_name = server_config.get('qualifiedName', server_config.get('name', ''))
+        spec = self._standard_specs.get(qualified_name)
+        if spec is None:
+            spec = await self.mcp_manager.resolve_server_spec(server_config)
+            self._standard_specs[qualified_name] = spec
+        return spec
+    
     async def _execute_standard_tool(self, tool_name: str, arguments: Dict[str, Any]) -> ToolResult:
+        tool_info = self.standard_tools.get(tool_name)
+        if tool_info:
+            # Connects lazily: the pooled session is opened on the first call to this server
+            spec = await self._get_standard_spec(tool_info['server_config'])
+            result = await mcp_session_pool.call_tool(spec, tool_info['original_name'], arguments, timeout=30)
+            if getattr(result, 'isError', False):
+                return self._create_error_result(self._extract_content(result))
+            return self._create_success_result(self._extract_content(result))
+        
         result = await self.mcp_manager.execute_tool(tool_name, arguments)
         if isinstance(result, dict):
             if result.get('isError', False):
@@ -83,23 +98,9 @@ class MCPToolExecutor:
         url = custom_config['url']
         headers = custom_config.get('headers', {})
         
-        async with asyncio.timeout(30):
-            try:
-                async with sse_client(url, headers=headers) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
-                        
-            except TypeError as e:
-                if "unexpected keyword argument" in str(e):
-                    async with sse_client(url) as (read, write):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            result = await session.call_tool(original_tool_name, arguments)
-                            return self._create_success_result(self._extract_content(result))
-                else:
-                    raise
+        spec = MCPServerSpec.sse(url, headers)
+        result = await mcp_session_pool.call_tool(spec, original_tool_name, arguments, timeout=30)
+        return self._create_success_result(self._extract_content(result))
     
     async def _execute_http_tool(self, tool_name: str, arguments: Dict[str, Any], tool_info: Dict[str, Any]) -> ToolResult:
         custom_config = tool_info['custom_config']
@@ -108,12 +109,9 @@ class MCPToolExecutor:
         url = custom_config['url']
         
         try:
-            async with asyncio.timeout(30):
-                async with streamablehttp_client(url) as (read, write, _):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
+            spec = MCPServerSpec.http(url)
+            result = await mcp_session_pool.call_tool(spec, original_tool_name, arguments, timeout=30)
+            return self._create_success_result(self._extract_content(result))
                         
         except Exception as e:
             logger.error(f"Error executing HTTP MCP tool: {str(e)}")
@@ -123,18 +121,13 @@ class MCPToolExecutor:
         custom_config = tool_info['custom_config']
         original_tool_name = tool_info['original_name']
         
-        server_params = StdioServerParameters(
+        spec = MCPServerSpec.stdio(
             command=custom_config["command"],
             args=custom_config.get("args", []),
             env=custom_config.get("env", {})
         )
-        
-        async with asyncio.timeout(30):
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(original_tool_name, arguments)
-                    return self._create_success_result(self._extract_content(result))
+        result = await mcp_session_pool.call_tool(spec, original_tool_name, arguments, timeout=30)
+        return self._create_success_result(self._extract_content(result))
     
     async def _resolve_external_user_id(self, custom_config: Dict[str, Any]) -> str:
         profile_id = custom_config.get('profile_id')
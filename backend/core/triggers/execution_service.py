@@ -5,6 +5,7 @@ from typing import Dict, Any, Tuple, Optional
 
 from core.services.supabase import DBConnection
 from core.services import redis
+from core.services.run_admission import run_admission
 from core.utils.logger import logger, structlog
 from core.utils.config import config, EnvMode
 from run_agent_background import run_agent_background
@@ -86,47 +87,13 @@ class SessionManager:
         client = await self._db.client
         
         try:
-            from core.sandbox.sandbox import create_sandbox, delete_sandbox
+            from core.sandbox.sandbox_pool import bind_project_sandbox
             
-            sandbox_pass = str(uuid.uuid4())
-            sandbox = await create_sandbox(sandbox_pass, project_id)
-            sandbox_id = sandbox.id
-            
-            vnc_link = await sandbox.get_preview_link(6080)
-            website_link = await sandbox.get_preview_link(8080)
-            vnc_url = self._extract_url(vnc_link)
-            website_url = self._extract_url(website_link)
-            token = self._extract_token(vnc_link)
-            
-            update_result = await client.table('projects').update({
-                'sandbox': {
-                    'id': sandbox_id,
-                    'pass': sandbox_pass,
-                    'vnc_preview': vnc_url,
-                    'sandbox_url': website_url,
-                    'token': token
-                }
-            }).eq('project_id', project_id).execute()
-            
-            if not update_result.data:
-                await delete_sandbox(sandbox_id)
-                raise Exception("Database update failed")
+            await bind_project_sandbox(client, project_id)
                 
         except Exception as e:
             await client.table('projects').delete().eq('project_id', project_id).execute()
             raise Exception(f"Failed to create sandbox: {str(e)}")
-    
-    def _extract_url(self, link) -> str:
-        if hasattr(link, 'url'):
-            return link.url
-        return str(link).split("url='")[1].split("'")[0]
-    
-    def _extract_token(self, link) -> str:
-        if hasattr(link, 'token'):
-            return link.token
-        if "token='" in str(link):
-            return str(link).split("token='")[1].split("'")[0]
-        return None
 
 
 class AgentExecutor:
@@ -358,6 +325,12 @@ class AgentExecutor:
         agent_run_id = agent_run.data[0]['id']
         
         await self._register_agent_run(agent_run_id)
+
+        # Triggered runs aren't admission-checked, but count towards the account's running runs
+        try:
+            await run_admission.track(account_id, agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to track run slot for triggered run {agent_run_id}: {e}")
         
         run_agent_background.send(
             agent_run_id=agent_run_id,
@@ -1,26 +1,212 @@
+"""
+Two-level cache: an in-process LRU (L1) in front of Redis (L2).
+
+Every Cache.get used to be a Redis round trip plus a json.loads, even for
+values like an account's tier that are read on every agent start and change a
+few times a month. Values are now also kept in a per-process LRU:
+
+- L1 entries live for at most CACHE_L1_TTL_SECONDS (and never longer than the
+  Redis TTL); at most CACHE_L1_MAX_ENTRIES are kept
+- L1 keeps the serialized value and decodes it on every hit, so each caller
+  gets its own copy and may modify it, as with a value read from Redis
+- `invalidate()` and `set()` publish the key on `cache:invalidate`, and every
+  process drops its L1 copy when the message arrives; if the pub/sub
+  connection is re-established (messages may have been lost) the whole L1 is
+  cleared
+- L1 is only used while the invalidation subscription is live, so a process
+  that can't hear invalidations reads through to Redis
+- `get_or_set()` loads a missing key once per process: concurrent callers wait
+  for the same load instead of all querying the database (single-flight)
+
+`stats()` reports L1/L2 hits, misses, loads and invalidations.
+"""
+
+import asyncio
+import copy
 import json
-from typing import Any
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
 from core.services.redis import get_client
+from core.utils.config import config
+from core.utils.logger import logger
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+_MISSING = object()
 
 
 class _cache:
+    def __init__(self):
+        self._l1: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._subscription = None
+        self._subscribe_lock: Optional[asyncio.Lock] = None
+        self._next_subscribe_attempt = 0.0
+        self._origin = uuid.uuid4().hex
+        self.metrics: Dict[str, int] = {
+            "l1_hits": 0, "l2_hits": 0, "misses": 0, "loads": 0, "coalesced": 0, "invalidations": 0,
+        }
+
+    @property
+    def l1_ttl(self) -> float:
+        return float(config.CACHE_L1_TTL_SECONDS or 30)
+
+    @property
+    def l1_max_entries(self) -> int:
+        max_entries = config.CACHE_L1_MAX_ENTRIES
+        return int(2048 if max_entries is None else max_entries)
+
+    async def _l1_enabled(self) -> bool:
+        """Subscribe to invalidations on first use; L1 is only trusted while subscribed."""
+        if self._subscription is not None and not self._subscription.closed:
+            return True
+        if self.l1_max_entries <= 0 or time.monotonic() < self._next_subscribe_attempt:
+            return False
+        if self._subscribe_lock is None:
+            self._subscribe_lock = asyncio.Lock()
+        async with self._subscribe_lock:
+            if self._subscription is not None and not self._subscription.closed:
+                return True
+            from core.services.pubsub_multiplexer import pubsub_multiplexer
+            try:
+                self._subscription = await pubsub_multiplexer.subscribe(
+                    INVALIDATION_CHANNEL, callback=self._on_invalidation
+                )
+            except Exception as e:
+                self._next_subscribe_attempt = time.monotonic() + 30
+                logger.warning(f"Cache invalidation subscription failed, using Redis only: {e}")
+                return False
+        return True
+
+    def _on_invalidation(self, message: Dict[str, Any]):
+        if message.get("type") == "message":
+            try:
+                payload = json.loads(message.get("data") or "{}")
+            except ValueError:
+                return
+            if payload.get("origin") != self._origin:
+                self._drop_local(payload.get("key"))
+        else:
+            # Reconnected: invalidations published meanwhile were lost
+            self._l1.clear()
+
+    def _drop_local(self, key: Optional[str]):
+        if not key:
+            return
+        self._l1.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        if len(self._generations) > self.l1_max_entries * 4:
+            self._generations.clear()
+
+    def _l1_get(self, key: str) -> Any:
+        entry = self._l1.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, serialized = entry
+        if expires_at <= time.monotonic():
+            self._l1.pop(key, None)
+            return _MISSING
+        self._l1.move_to_end(key)
+        return json.loads(serialized)
+
+    def _l1_set(self, key: str, serialized: str, ttl: float):
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_ttl), serialized)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    async def _publish_invalidation(self, redis, key: str):
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "origin": self._origin}))
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
     async def get(self, key: str):
+        use_l1 = await self._l1_enabled()
+        if use_l1:
+            value = self._l1_get(key)
+            if value is not _MISSING:
+                self.metrics["l1_hits"] += 1
+                return value
+
+        generation = self._generations.get(key, 0)
         redis = await get_client()
-        key = f"cache:{key}"
-        result = await redis.get(key)
-        if result:
-            return json.loads(result)
-        return None
+        if use_l1:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(f"cache:{key}")
+                pipe.ttl(f"cache:{key}")
+                result, ttl = await pipe.execute()
+        else:
+            result, ttl = await redis.get(f"cache:{key}"), None
+        if not result:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["l2_hits"] += 1
+        value = json.loads(result)
+        # Skip L1 if the key was invalidated while Redis was being read
+        if use_l1 and ttl and ttl > 0 and self._generations.get(key, 0) == generation:
+            self._l1_set(key, result, ttl)
+        return value
 
     async def set(self, key: str, value: Any, ttl: int = 15 * 60):
+        serialized = json.dumps(value)
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.set(key, json.dumps(value), ex=ttl)
+        await redis.set(f"cache:{key}", serialized, ex=ttl)
+        # Other processes drop their copy; this one keeps the new value
+        self._drop_local(key)
+        await self._publish_invalidation(redis, key)
+        if await self._l1_enabled():
+            self._l1_set(key, serialized, ttl)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 15 * 60):
+        """Return the cached value, or load, cache and return it; one load per key at a time."""
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.metrics["coalesced"] += 1
+            try:
+                # The loading caller keeps the loaded object; waiters get their own copy
+                return copy.deepcopy(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The loading caller was cancelled; load on our own
+                return await self.get_or_set(key, loader, ttl=ttl)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.metrics["loads"] += 1
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl=ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so failures without waiters aren't logged as unhandled
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
 
     async def invalidate(self, key: str):
+        self.metrics["invalidations"] += 1
+        self._drop_local(key)
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.delete(key)
+        await redis.delete(f"cache:{key}")
+        await self._publish_invalidation(redis, key)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.metrics, "l1_entries": len(self._l1), "inflight": len(self._inflight)}
 
 
 Cache = _cache()
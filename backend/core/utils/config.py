@@ -361,10 +361,42 @@ class Configuration:
     STRIPE_PRODUCT_ID_PROD: Optional[str] = 'prod_SCl7AQ2C8kK1CD'
     STRIPE_PRODUCT_ID_STAGING: Optional[str] = 'prod_SCgIj3G7yPOAWY'
     
+    # Token counting for context compression
+    TOKEN_COUNT_REMOTE_POLICY: Optional[str] = "near_threshold"  # always | near_threshold | never
+    TOKEN_COUNT_REMOTE_THRESHOLD_PERCENT: Optional[int] = 85  # near_threshold: count remotely above this % of the limit
+    TOKEN_COUNT_MAX_CONCURRENCY: Optional[int] = 8  # Concurrent remote count calls per process
+    
+    # Agent run response publishing (worker -> Redis)
+    AGENT_RESPONSE_BATCH_MAX_ITEMS: Optional[int] = 50  # Flush once this many responses are buffered
+    AGENT_RESPONSE_BATCH_WINDOW_MS: Optional[int] = 20  # Max time a response waits in the buffer
+    AGENT_RUN_STREAM_TRANSPORT: Optional[str] = "list"  # list (RPUSH + pub/sub) | stream (Redis Streams)
+    AGENT_RUN_STREAM_MAXLEN: Optional[int] = 0  # stream transport: approximate max entries kept per run (0 = whole run; a limit truncates replay and the final DB update)
+    AGENT_RUN_STREAM_BLOCK_MS: Optional[int] = 5000  # stream transport: XREAD BLOCK timeout (keep below socket timeout)
+    PUBSUB_IDLE_UNSUBSCRIBE_SECONDS: Optional[int] = 30  # Shared pub/sub: unsubscribe channels unwatched for this long
+    ACTIVE_RUN_TTL_REFRESH_SECONDS: Optional[int] = 300  # Worker: refresh active_run:* key TTLs on this interval
+    PROMPT_CACHE_SIZE: Optional[int] = 128  # Compiled static system prompts kept per process
+    PROMPT_KB_CONTEXT_TTL_SECONDS: Optional[int] = 300  # Cache an agent's knowledge base prompt context for this long
+    THREAD_RUN_STATE_TTL_SECONDS: Optional[int] = 604800  # Expire idle per-thread run state (re-hydrated from the DB)
+    USAGE_LEDGER_ENABLED: bool = True  # Queue LLM usage in Redis and settle it in batches instead of per response
+    USAGE_LEDGER_FLUSH_INTERVAL_MS: Optional[int] = 1000  # Window over which queued usage is aggregated per account
+    USAGE_LEDGER_BATCH_SIZE: Optional[int] = 500  # Stream entries read per settlement batch
+    USAGE_LEDGER_CLAIM_IDLE_MS: Optional[int] = 60000  # Reclaim entries a dead settler left unacknowledged this long
+    CACHE_L1_MAX_ENTRIES: Optional[int] = 2048  # In-process LRU entries in front of the Redis cache (0 disables it)
+    CACHE_L1_TTL_SECONDS: Optional[int] = 30  # Upper bound on how long a process serves a value without Redis
+    RUN_LEASE_TTL_SECONDS: Optional[int] = 900  # Concurrent run lease lifetime; renewed by the worker, so keep above ACTIVE_RUN_TTL_REFRESH_SECONDS
+    RUN_ADMISSION_RECONCILE_SECONDS: Optional[int] = 30  # Check an at-limit account's leases against agent_runs at most this often
+    
     # Sandbox configuration
     SANDBOX_IMAGE_NAME = "kortix/suna:0.1.3.25"
     SANDBOX_SNAPSHOT_NAME = "kortix/suna:0.1.3.25"
     SANDBOX_ENTRYPOINT = "/usr/bin/supervisord -n -c /etc/supervisor/conf.d/supervisord.conf"
+    SANDBOX_BACKEND: Optional[str] = "daytona"  # "daytona", or "fake" for the in-memory backend (offline testing)
+    SANDBOX_POOL_MIN_SIZE: Optional[int] = 0  # Warm sandboxes kept ready even without recent demand
+    SANDBOX_POOL_MAX_SIZE: Optional[int] = 0  # Upper bound on warm sandboxes per process (0 disables the pool; opt-in)
+    SANDBOX_POOL_DEMAND_WINDOW_SECONDS: Optional[int] = 900  # Window over which sandbox demand is measured
+    SANDBOX_POOL_MAX_IDLE_SECONDS: Optional[int] = 600  # Recycle warm sandboxes unclaimed for this long (< auto-stop)
+    SANDBOX_HANDLE_REVALIDATE_SECONDS: Optional[int] = 30  # Sandbox tools: re-check a run's shared sandbox after this long
+    SANDBOX_FILE_TRANSFER_CONCURRENCY: Optional[int] = 8  # Parallel per-file calls when a batched transfer can't be used
 
     # LangFuse configuration
     LANGFUSE_PUBLIC_KEY: Optional[str] = None
@@ -381,6 +413,13 @@ class Configuration:
     # MCP (Master Credential Provider) configuration
     MCP_CREDENTIAL_ENCRYPTION_KEY: Optional[str] = None
     
+    # MCP client session pool (custom MCP tool execution)
+    MCP_SESSION_MAX_CONCURRENCY: Optional[int] = 8  # Concurrent tool calls per server session
+    MCP_SESSION_IDLE_TIMEOUT_SECONDS: Optional[int] = 300  # Close sessions unused for this long
+    MCP_SESSION_HEALTH_CHECK_SECONDS: Optional[int] = 60  # Ping sessions unused for this long before reuse
+    MCP_SCHEMA_LOCAL_CACHE_SIZE: Optional[int] = 256  # In-process LRU entries in front of the Redis schema cache
+    MCP_SCHEMA_REFRESH_AFTER_SECONDS: Optional[int] = 600  # Refresh cached tool schemas in the background after this age
+    
     # Composio integration
     COMPOSIO_API_KEY: Optional[str] = None
     COMPOSIO_WEBHOOK_SECRET: Optional[str] = None
@@ -1,57 +1,31 @@
 from typing import Dict, Any
-from datetime import datetime, timezone, timedelta
 from core.utils.logger import logger
 from core.utils.config import config
 from core.utils.cache import Cache
 
 
+async def _get_concurrent_runs_limit(account_id: str) -> int:
+    try:
+        from core.billing import subscription_service
+        tier_info = await subscription_service.get_user_subscription_tier(account_id)
+        tier_name = tier_info['name']
+        concurrent_runs_limit = tier_info.get('concurrent_runs', 1)
+        logger.debug(f"Account {account_id} tier: {tier_name}, concurrent runs limit: {concurrent_runs_limit}")
+        return concurrent_runs_limit
+    except Exception as billing_error:
+        logger.warning(f"Could not get subscription tier for {account_id}: {str(billing_error)}, using global default")
+        return config.MAX_PARALLEL_AGENT_RUNS
+
+
 async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
+    """Current running runs of the account, from its run leases (see run_admission)."""
     try:
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago_iso = twenty_four_hours_ago.isoformat()
-        
-        logger.debug(f"Checking agent run limit for account {account_id} since {twenty_four_hours_ago_iso}")
-        
-        try:
-            from core.billing import subscription_service
-            tier_info = await subscription_service.get_user_subscription_tier(account_id)
-            tier_name = tier_info['name']
-            concurrent_runs_limit = tier_info.get('concurrent_runs', 1)
-            logger.debug(f"Account {account_id} tier: {tier_name}, concurrent runs limit: {concurrent_runs_limit}")
-        except Exception as billing_error:
-            logger.warning(f"Could not get subscription tier for {account_id}: {str(billing_error)}, using global default")
-            concurrent_runs_limit = config.MAX_PARALLEL_AGENT_RUNS
-        
-        threads_result = await client.table('threads').select('thread_id').eq('account_id', account_id).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for account {account_id}")
-            return {
-                'can_start': True,
-                'running_count': 0,
-                'running_thread_ids': [],
-                'limit': concurrent_runs_limit
-            }
-        
-        thread_ids = [thread['thread_id'] for thread in threads_result.data]
-        logger.debug(f"Found {len(thread_ids)} threads for account {account_id}")
-        
-        from core.utils.query_utils import batch_query_in
-        
-        running_runs = await batch_query_in(
-            client=client,
-            table_name='agent_runs',
-            select_fields='id, thread_id, started_at',
-            in_field='thread_id',
-            in_values=thread_ids,
-            additional_filters={
-                'status': 'running',
-                'started_at_gte': twenty_four_hours_ago_iso
-            }
-        )
-        
-        running_count = len(running_runs)
-        running_thread_ids = [run['thread_id'] for run in running_runs]
+        from core.services.run_admission import run_admission
+
+        concurrent_runs_limit = await _get_concurrent_runs_limit(account_id)
+        running_run_ids = await run_admission.running_run_ids(account_id)
+        running_count = len(running_run_ids)
+        running_thread_ids = await run_admission.running_thread_ids(client, running_run_ids)
         
         logger.debug(f"Account {account_id} has {running_count}/{concurrent_runs_limit} running agent runs")
         
@@ -73,6 +47,41 @@ async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
         }
 
 
+async def acquire_agent_run_slot(client, account_id: str, agent_run_id: str) -> Dict[str, Any]:
+    """Atomically check the concurrent run limit and, if below it, take a slot for agent_run_id.
+
+    The slot is released by the worker when the run ends (or expires with its lease).
+    """
+    try:
+        from core.services.run_admission import run_admission
+
+        concurrent_runs_limit = await _get_concurrent_runs_limit(account_id)
+        admitted, running_count = await run_admission.acquire(client, account_id, agent_run_id, concurrent_runs_limit)
+        
+        running_thread_ids = []
+        if not admitted:
+            running_run_ids = await run_admission.running_run_ids(account_id)
+            running_thread_ids = await run_admission.running_thread_ids(client, running_run_ids)
+        
+        logger.debug(f"Account {account_id} run admission: admitted={admitted}, {running_count}/{concurrent_runs_limit} running")
+        
+        return {
+            'can_start': admitted,
+            'running_count': running_count,
+            'running_thread_ids': running_thread_ids,
+            'limit': concurrent_runs_limit
+        }
+
+    except Exception as e:
+        logger.error(f"Error acquiring agent run slot for account {account_id}: {str(e)}")
+        return {
+            'can_start': True,
+            'running_count': 0,
+            'running_thread_ids': [],
+            'limit': 1
+        }
+
+
 async def check_agent_count_limit(client, account_id: str) -> Dict[str, Any]:
     try:
         if config.ENV_MODE.value == "local":
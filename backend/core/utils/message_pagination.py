@@ -0,0 +1,152 @@
+"""
+Keyset pagination for thread messages.
+
+Messages are ordered by (created_at, message_id) and paged by position rather
+than OFFSET, so every page costs the same index range scan however deep into
+the thread it is. Positions are handed to clients as opaque cursors:
+
+- `cursor`: continue after this position in the requested order
+- `since`: only return messages newer than this position (delta sync); the
+  `sync_cursor` of a response is the position to pass as `since` next time
+
+The ETag of a message listing is derived from the thread's message count and
+latest `updated_at` (plus the request's parameters), which one small query
+returns, so an unchanged thread can be answered with 304 before any content
+is read.
+"""
+
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+MESSAGE_FIELDS = (
+    'message_id', 'thread_id', 'type', 'is_llm_message', 'content', 'metadata',
+    'created_at', 'updated_at', 'agent_id', 'agent_version_id',
+)
+# Needed to build cursors, so always selected
+KEY_FIELDS = ('created_at', 'message_id')
+MAX_PAGE_SIZE = 1000
+
+Position = Tuple[str, str]
+
+
+class InvalidPaginationParameter(ValueError):
+    pass
+
+
+def encode_cursor(position: Optional[Position]) -> Optional[str]:
+    if position is None:
+        return None
+    raw = json.dumps(list(position), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], name: str = 'cursor') -> Optional[Position]:
+    """Decode a client-supplied cursor; both parts are validated because they end up in query filters."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, message_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(message_id, str):
+            raise TypeError("cursor parts must be strings")
+        datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        return created_at, str(uuid.UUID(message_id))
+    except (ValueError, TypeError):
+        raise InvalidPaginationParameter(f"Invalid {name}")
+
+
+def parse_fields(fields: Optional[str]) -> str:
+    """Validate a comma-separated field projection and return the select clause."""
+    if not fields:
+        return '*'
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in MESSAGE_FIELDS]
+    if unknown:
+        raise InvalidPaginationParameter(f"Unknown message fields: {', '.join(unknown)}")
+    selected = list(dict.fromkeys([*KEY_FIELDS, *requested]))
+    return ', '.join(selected)
+
+
+def _position(row: Dict[str, Any]) -> Position:
+    return row['created_at'], row['message_id']
+
+
+def _sort_key(position: Position) -> Tuple[datetime, str]:
+    created_at, message_id = position
+    return datetime.fromisoformat(created_at.replace('Z', '+00:00')), message_id
+
+
+def _quoted(value: str) -> str:
+    # Timestamps contain PostgREST reserved characters (':' and '.')
+    return f'"{value}"'
+
+
+async def fetch_message_page(
+    client,
+    thread_id: str,
+    select: str,
+    descending: bool,
+    limit: int,
+    after: Optional[Position] = None,
+    since: Optional[Position] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Position]]:
+    """One page of messages after `after` in the requested order, newer than `since`.
+
+    Returns the rows and the position to continue from (None on the last page).
+    """
+    query = client.table('messages').select(select).eq('thread_id', thread_id)
+    if after is not None:
+        op = 'lt' if descending else 'gt'
+        created_at, message_id = after
+        query = query.or_(
+            f"created_at.{op}.{_quoted(created_at)},"
+            f"and(created_at.eq.{_quoted(created_at)},message_id.{op}.{message_id})"
+        )
+    if since is not None:
+        # Rows at exactly `since`'s timestamp are filtered below by message_id
+        query = query.gte('created_at', since[0])
+    query = query.order('created_at', desc=descending).order('message_id', desc=descending)
+    result = await query.limit(limit + 1).execute()
+
+    rows = result.data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_position = _position(rows[-1]) if has_more and rows else None
+    if since is not None:
+        since_created_at, since_message_id = since
+        rows = [
+            row for row in rows
+            if row['created_at'] != since_created_at or row['message_id'] > since_message_id
+        ]
+    return rows, next_position
+
+
+def sync_position(rows: List[Dict[str, Any]], since: Optional[Position]) -> Optional[Position]:
+    """Newest position among `rows`, or `since` if there are none."""
+    positions = [_position(row) for row in rows]
+    if since is not None:
+        positions.append(since)
+    return max(positions, key=_sort_key) if positions else None
+
+
+async def thread_messages_etag(client, thread_id: str, params: Dict[str, Any]) -> str:
+    """Weak ETag for a listing of the thread's messages with the given parameters."""
+    result = await client.table('messages').select('updated_at', count='exact')\
+        .eq('thread_id', thread_id)\
+        .order('updated_at', desc=True)\
+        .limit(1)\
+        .execute()
+    latest = result.data[0]['updated_at'] if result.data else ''
+    fingerprint = json.dumps([thread_id, result.count or 0, latest, params], sort_keys=True, default=str)
+    return f'W/"{hashlib.sha256(fingerprint.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag[2:] in candidates
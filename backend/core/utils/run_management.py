@@ -1,8 +1,8 @@
 """Agent run management utilities - starting, stopping, and monitoring agent runs."""
-import json
 from typing import Optional, List
 from fastapi import HTTPException
 from core.services import redis
+from core.services.agent_run_stream import append_control_entry, load_run_responses
 from ..utils.logger import logger
 from run_agent_background import update_agent_run_status, _cleanup_redis_response_list
 
@@ -55,11 +55,9 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
     final_status = "failed" if error_message else "stopped"
 
     # Attempt to fetch final responses from Redis
-    response_list_key = f"agent_run:{agent_run_id}:responses"
     all_responses = []
     try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        all_responses = await load_run_responses(agent_run_id)
         logger.debug(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
     except Exception as e:
         logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
@@ -80,6 +78,7 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
+    await append_control_entry(agent_run_id, "STOP")
 
     # Find all instances handling this agent run and send STOP to instance-specific channels
     try:
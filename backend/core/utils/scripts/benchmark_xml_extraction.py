@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: streaming XML tool-call extraction.
+
+Compares the previous per-delta approach (rescan the accumulated buffer with
+ResponseProcessor._extract_xml_chunks, then str.replace the extracted block)
+against StreamingXMLChunkExtractor, which consumes each delta once.
+
+Usage:
+    uv run python -m core.utils.scripts.benchmark_xml_extraction [--size-kb 100] [--tool-calls 40] [--delta-size 8]
+"""
+
+import argparse
+import random
+import time
+
+from core.agentpress.response_processor import ResponseProcessor
+from core.agentpress.tool_registry import ToolRegistry
+from core.agentpress.xml_tool_parser import StreamingXMLChunkExtractor
+
+
+class _NoopTrace:
+    def event(self, *args, **kwargs):
+        pass
+
+
+def build_response(size_kb: int, tool_calls: int) -> str:
+    """Build a response of roughly size_kb KB with prose interleaved with tool calls."""
+    target = size_kb * 1024
+    words = ["the", "agent", "writes", "a", "file", "with", "content", "and", "then", "checks", "output"]
+    rng = random.Random(42)
+    block = (
+        '<function_calls>\n<invoke name="create_file">\n'
+        '<parameter name="file_path">src/app_{i}.py</parameter>\n'
+        '<parameter name="file_contents">{body}</parameter>\n'
+        '</invoke>\n</function_calls>'
+    )
+    per_call = max(1, target // max(1, tool_calls) // 2)
+    parts = []
+    for i in range(tool_calls):
+        prose = " ".join(rng.choice(words) for _ in range(per_call // 6))
+        body = "x = 1\n" * (per_call // 6)
+        parts.append(prose + "\n")
+        parts.append(block.format(i=i, body=body))
+    content = "".join(parts)
+    if len(content) < target:
+        content += " ".join(rng.choice(words) for _ in range((target - len(content)) // 6))
+    return content
+
+
+def split_deltas(content: str, delta_size: int):
+    return [content[i:i + delta_size] for i in range(0, len(content), delta_size)]
+
+
+def run_rescan(processor: ResponseProcessor, deltas) -> int:
+    current_xml_content = ""
+    found = 0
+    for delta in deltas:
+        current_xml_content += delta
+        for xml_chunk in processor._extract_xml_chunks(current_xml_content):
+            current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
+            found += 1
+    return found
+
+
+def run_incremental(deltas) -> int:
+    extractor = StreamingXMLChunkExtractor()
+    found = 0
+    for delta in deltas:
+        found += len(extractor.feed(delta))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming XML tool-call extraction")
+    parser.add_argument("--size-kb", type=int, default=100, help="Approximate response size in KB")
+    parser.add_argument("--tool-calls", type=int, default=40, help="Number of <function_calls> blocks")
+    parser.add_argument("--delta-size", type=int, default=8, help="Characters per streamed delta")
+    args = parser.parse_args()
+
+    content = build_response(args.size_kb, args.tool_calls)
+    deltas = split_deltas(content, args.delta_size)
+    processor = ResponseProcessor(tool_registry=ToolRegistry(), add_message_callback=None, trace=_NoopTrace())
+
+    print(f"Response: {len(content) / 1024:.1f} KB, {len(deltas)} deltas, {args.tool_calls} tool calls")
+
+    start = time.perf_counter()
+    rescan_found = run_rescan(processor, deltas)
+    rescan_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    incremental_found = run_incremental(deltas)
+    incremental_elapsed = time.perf_counter() - start
+
+    print(f"  rescan + replace:  {rescan_elapsed * 1000:9.1f} ms  ({rescan_found} blocks)")
+    print(f"  incremental:       {incremental_elapsed * 1000:9.1f} ms  ({incremental_found} blocks)")
+    if incremental_elapsed > 0:
+        print(f"  speedup:           {rescan_elapsed / incremental_elapsed:9.1f}x")
+    if rescan_found != incremental_found:
+        print("  ✗ block counts differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Load test: agent run output transports under many concurrent viewers.
+
+Simulates one agent run streaming responses through the worker-side publisher
+while N viewers follow it the way stream_agent_run does:
+- list:   "new" ping via the shared pub/sub multiplexer + LRANGE of the list tail
+- stream: wait for entries after the last seen stream entry ID (one shared
+          XREAD BLOCK per process via the stream read multiplexer)
+
+Reports delivery latency (publish -> viewer), commands processed by Redis and
+peak client connections for each transport. Needs a Redis reachable through
+REDIS_HOST / REDIS_PORT / REDIS_PASSWORD; all keys are removed afterwards.
+
+Usage:
+    uv run python -m core.utils.scripts.load_test_run_stream [--viewers 1000] [--responses 500] [--interval-ms 5] [--transport both]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Dict, List
+
+from core.services import redis
+from core.services.agent_run_stream import (
+    TRANSPORT_LIST, TRANSPORT_STREAM,
+    response_list_key, response_channel, response_stream_key, read_stream_entries, get_stream_block_ms,
+    stream_read_multiplexer,
+)
+from core.services.pubsub_multiplexer import pubsub_multiplexer
+from core.services.response_publisher import create_response_publisher
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def is_end(response: Dict) -> bool:
+    return response.get('type') == 'status' and response.get('status') in ('completed', 'failed', 'stopped')
+
+
+async def list_viewer(agent_run_id: str, ready: asyncio.Event, ready_count: List[int], viewers: int, latencies: List[float]) -> int:
+    """Follow a run with multiplexed pub/sub + LRANGE, like the list branch of stream_agent_run."""
+    received = 0
+    last_index = -1
+    subscription = await pubsub_multiplexer.subscribe(response_channel(agent_run_id))
+    try:
+        ready_count[0] += 1
+        if ready_count[0] == viewers:
+            ready.set()
+        while True:
+            message = await subscription.get()
+            if message.get("data") != "new":
+                continue
+            new_json = await redis.lrange(response_list_key(agent_run_id), last_index + 1, -1)
+            now = time.time()
+            done = False
+            for raw in new_json:
+                response = json.loads(raw)
+                if 'sent_at' in response:
+                    latencies.append((now - response['sent_at']) * 1000)
+                received += 1
+                if is_end(response):
+                    done = True
+            last_index += len(new_json)
+            if done:
+                break
+    finally:
+        await subscription.close()
+    return received
+
+
+async def stream_viewer(agent_run_id: str, ready: asyncio.Event, ready_count: List[int], viewers: int, latencies: List[float]) -> int:
+    """Follow a run with XREAD BLOCK, like the stream branch of stream_agent_run."""
+    received = 0
+    last_id = "0-0"
+    block_ms = get_stream_block_ms()
+    ready_count[0] += 1
+    if ready_count[0] == viewers:
+        ready.set()
+    while True:
+        entries = await read_stream_entries(agent_run_id, last_id, block_ms=block_ms)
+        now = time.time()
+        for entry in entries:
+            last_id = entry.id
+            if entry.data is None:
+                continue
+            response = json.loads(entry.data)
+            if 'sent_at' in response:
+                latencies.append((now - response['sent_at']) * 1000)
+            received += 1
+            if is_end(response):
+                return received
+
+
+async def sample_clients(stop: asyncio.Event, peak: List[int]):
+    redis_client = await redis.get_client()
+    while not stop.is_set():
+        info = await redis_client.info("clients")
+        peak[0] = max(peak[0], int(info.get("connected_clients", 0)))
+        await asyncio.sleep(0.2)
+
+
+async def run_transport(transport: str, viewers: int, responses: int, interval_ms: float, payload_size: int) -> Dict:
+    agent_run_id = f"loadtest-{uuid.uuid4().hex[:12]}"
+    redis_client = await redis.get_client()
+    viewer_fn = stream_viewer if transport == TRANSPORT_STREAM else list_viewer
+
+    latencies: List[float] = []
+    ready = asyncio.Event()
+    ready_count = [0]
+    viewer_tasks = [asyncio.create_task(viewer_fn(agent_run_id, ready, ready_count, viewers, latencies)) for _ in range(viewers)]
+    await asyncio.wait_for(ready.wait(), timeout=60)
+
+    stop_sampling = asyncio.Event()
+    peak_clients = [0]
+    sampler = asyncio.create_task(sample_clients(stop_sampling, peak_clients))
+
+    commands_before = int((await redis_client.info("stats")).get("total_commands_processed", 0))
+    start = time.perf_counter()
+
+    publisher = create_response_publisher(agent_run_id, transport=transport)
+    content = "x" * payload_size
+    for i in range(responses):
+        await publisher.publish({"type": "assistant", "sequence": i, "content": content, "sent_at": time.time()})
+        if interval_ms:
+            await asyncio.sleep(interval_ms / 1000)
+    await publisher.publish({"type": "status", "status": "completed", "sent_at": time.time()})
+    await publisher.close()
+
+    received = await asyncio.wait_for(asyncio.gather(*viewer_tasks), timeout=300)
+    elapsed = time.perf_counter() - start
+    commands_after = int((await redis_client.info("stats")).get("total_commands_processed", 0))
+
+    stop_sampling.set()
+    await sampler
+    await redis.delete(response_list_key(agent_run_id))
+    await redis.delete(response_stream_key(agent_run_id))
+
+    return {
+        "transport": transport,
+        "elapsed_s": elapsed,
+        "delivered": sum(received),
+        "expected": viewers * (responses + 1),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else 0.0,
+        "redis_commands": commands_after - commands_before,
+        "peak_clients": peak_clients[0],
+        "publisher": publisher.stats.summary(),
+    }
+
+
+def print_result(result: Dict):
+    print(f"\n[{result['transport']}]")
+    print(f"  elapsed:          {result['elapsed_s']:9.2f} s")
+    print(f"  delivered:        {result['delivered']:9d} / {result['expected']}")
+    print(f"  latency p50:      {result['p50_ms']:9.1f} ms")
+    print(f"  latency p95:      {result['p95_ms']:9.1f} ms")
+    print(f"  latency p99:      {result['p99_ms']:9.1f} ms")
+    print(f"  latency max:      {result['max_ms']:9.1f} ms")
+    print(f"  redis commands:   {result['redis_commands']:9d}")
+    print(f"  peak connections: {result['peak_clients']:9d}")
+    print(f"  publisher:        {result['publisher']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test agent run output transports")
+    parser.add_argument("--viewers", type=int, default=1000, help="Concurrent viewers of the run")
+    parser.add_argument("--responses", type=int, default=500, help="Responses published by the run")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Delay between published responses")
+    parser.add_argument("--payload-size", type=int, default=200, help="Characters of content per response")
+    parser.add_argument("--transport", choices=[TRANSPORT_LIST, TRANSPORT_STREAM, "both"], default="both")
+    args = parser.parse_args()
+
+    await redis.initialize_async()
+
+    transports = [TRANSPORT_LIST, TRANSPORT_STREAM] if args.transport == "both" else [args.transport]
+    print(f"{args.viewers} viewers, {args.responses} responses every {args.interval_ms} ms")
+    try:
+        for transport in transports:
+            print_result(await run_transport(transport, args.viewers, args.responses, args.interval_ms, args.payload_size))
+    finally:
+        await pubsub_multiplexer.close()
+        await stream_read_multiplexer.close()
+        await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
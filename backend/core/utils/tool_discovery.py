@@ -127,14 +127,18 @@ def warm_up_tools_cache():
     """Pre-load and cache all tool classes on worker startup.
     
     This should be called when a worker process starts to avoid the first
-    user request paying the ~4s cost of importing all tool modules.
+    user request paying the ~4s cost of importing all tool modules. Also
+    compiles the schemas and metadata of every tool class into the process
+    tool catalog.
     """
     logger.info("🔥 Warming up worker: loading tool classes...")
     import time
+    from core.agentpress.tool_catalog import tool_catalog
     start = time.time()
     discover_tools()
+    compiled = tool_catalog.warm_up(_TOOLS_CACHE.values())
     elapsed = time.time() - start
-    logger.info(f"✅ Worker ready: {len(_TOOLS_CACHE)} tools loaded in {elapsed:.2f}s")
+    logger.info(f"✅ Worker ready: {len(_TOOLS_CACHE)} tools loaded, {compiled} compiled in {elapsed:.2f}s")
 
 
 def discover_tools() -> Dict[str, Type[Tool]]:
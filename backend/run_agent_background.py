@@ -8,6 +8,10 @@ import traceback
 from datetime import datetime, timezone
 from typing import Optional
 from core.services import redis
+from core.services.agent_run_stream import append_control_entry, expire_run_output, load_run_responses
+from core.services.response_publisher import create_response_publisher
+from core.services.run_control import run_control_listener
+from core.services.run_admission import run_admission
 from core.run import run_agent
 from core.utils.logger import logger, structlog
 import dramatiq
@@ -26,8 +30,23 @@ from typing import Dict, Any
 redis_host = os.getenv('REDIS_HOST', 'redis')
 redis_port = int(os.getenv('REDIS_PORT', 6379))
 
+class WorkerShutdown(dramatiq.Middleware):
+    """Releases the worker's shared resources while its event loop is still running."""
+
+    def before_worker_shutdown(self, broker, worker):
+        if not _initialized:
+            return
+        from dramatiq.asyncio import get_event_loop_thread
+        event_loop_thread = get_event_loop_thread()
+        if event_loop_thread is None:
+            return
+        try:
+            event_loop_thread.run_coroutine(shutdown())
+        except Exception as e:
+            logger.error(f"Error during worker shutdown: {e}")
+
 logger.info(f"🔧 Configuring Dramatiq broker with Redis at {redis_host}:{redis_port}")
-redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO()])
+redis_broker = RedisBroker(host=redis_host, port=redis_port, middleware=[dramatiq.middleware.AsyncIO(), WorkerShutdown()])
 
 dramatiq.set_broker(redis_broker)
 
@@ -53,9 +72,27 @@ async def initialize():
     from core.utils.tool_discovery import warm_up_tools_cache
     warm_up_tools_cache()
 
+    # Settle queued LLM usage from this worker
+    from core.billing.usage_ledger import usage_ledger
+    usage_ledger.start()
+
     _initialized = True
     logger.info(f"✅ Worker initialized successfully with instance ID: {instance_id}")
 
+async def shutdown():
+    """Settle queued usage and close the worker's pooled MCP sessions and warm sandboxes."""
+    from core.billing.usage_ledger import usage_ledger
+    await usage_ledger.close()
+
+    from core.tools.mcp_tool_wrapper import mcp_schema_refresher
+    await mcp_schema_refresher.close()
+
+    from core.tools.utils.mcp_session_pool import mcp_session_pool
+    await mcp_session_pool.close_all()
+
+    from core.sandbox.sandbox_pool import sandbox_pool
+    await sandbox_pool.close()
+
 @dramatiq.actor
 async def check_health(key: str):
     """Run the agent in the background using Redis for state."""
@@ -118,61 +155,35 @@ async def run_agent_background(
     client = await db.client
     start_time = datetime.now(timezone.utc)
     total_responses = 0
-    pubsub = None
-    stop_checker = None
-    stop_signal_received = False
+    run_control = None
+    publisher = create_response_publisher(agent_run_id)
     
-    # Create cancellation event to signal LLM to stop
+    # Create cancellation event to signal LLM to stop (set by the worker's control listener on STOP)
     cancellation_event = asyncio.Event()
 
     # Define Redis keys and channels
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
     instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
-    async def check_for_stop_signal():
-        nonlocal stop_signal_received
-        if not pubsub: return
-        try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.debug(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        # Set cancellation event to stop LLM execution immediately
-                        cancellation_event.set()
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
-        except asyncio.CancelledError:
-            logger.debug(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
-        except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
-
     trace = langfuse.trace(name="agent_run", id=agent_run_id, session_id=thread_id, metadata={"project_id": project_id, "instance_id": instance_id})
 
     try:
-        # Setup Pub/Sub listener for control signals
-        pubsub = await redis.create_pubsub()
+        # Register with the worker-level control listener (shared pub/sub, STOP -> cancellation_event)
         try:
-            await retry(lambda: pubsub.subscribe(instance_control_channel, global_control_channel))
+            run_control = await retry(lambda: run_control_listener.register(
+                agent_run_id,
+                [instance_control_channel, global_control_channel],
+                cancellation_event,
+                active_key=instance_active_key,
+            ))
         except Exception as e:
             logger.error(f"Redis failed to subscribe to control channels: {e}", exc_info=True)
             raise e
 
         logger.info(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
-        stop_checker = asyncio.create_task(check_for_stop_signal())
 
-        # Ensure active run key exists and has TTL
+        # Ensure active run key exists and has TTL (refreshed by the control listener's timer)
         await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
 
         # Initialize agent generator with cancellation event
@@ -187,19 +198,16 @@ async def run_agent_background(
         final_status = "running"
         error_message = None
 
-        pending_redis_operations = []
-
         async for response in agent_gen:
-            if stop_signal_received:
+            if cancellation_event.is_set():
                 logger.debug(f"Agent run {agent_run_id} stopped by signal.")
                 final_status = "stopped"
                 trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
                 break
 
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            # Buffer response; the publisher batches RPUSH + "new" notifications
+            # and flushes terminal statuses immediately
+            await publisher.publish(response)
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -222,12 +230,16 @@ async def run_agent_background(
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await publisher.publish(completion_message, flush=True)
+
+        # Make sure nothing is left in the buffer (e.g. after a STOP signal)
+        try:
+            await publisher.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush buffered responses for {agent_run_id}, retrying on close: {e}")
 
         # Fetch final responses from Redis for DB update
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
+        all_responses = await load_run_responses(agent_run_id)
 
         # Update DB status
         await update_agent_run_status(client, agent_run_id, final_status, error=error_message)
@@ -240,6 +252,7 @@ async def run_agent_background(
             logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
         except Exception as e:
             logger.warning(f"Failed to publish final control signal {control_signal}: {str(e)}")
+        await append_control_entry(agent_run_id, control_signal)
 
     except Exception as e:
         error_message = str(e)
@@ -252,8 +265,7 @@ async def run_agent_background(
         # Push error message to Redis list
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            await publisher.publish(error_response, flush=True)
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
@@ -266,23 +278,24 @@ async def run_agent_background(
             logger.debug(f"Published ERROR signal to {global_control_channel}")
         except Exception as e:
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
+        await append_control_entry(agent_run_id, "ERROR")
 
     finally:
-        # Cleanup stop checker task
-        if stop_checker and not stop_checker.done():
-            stop_checker.cancel()
-            try: await stop_checker
-            except asyncio.CancelledError: pass
-            except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
-
-        # Close pubsub connection
-        if pubsub:
+        # Stop listening for control signals
+        if run_control:
             try:
-                await pubsub.unsubscribe()
-                await pubsub.close()
-                logger.debug(f"Closed pubsub connection for {agent_run_id}")
+                await run_control_listener.unregister(run_control)
+                logger.debug(f"Unregistered control listener for {agent_run_id}")
             except Exception as e:
-                logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
+                logger.warning(f"Error unregistering control listener for {agent_run_id}: {str(e)}")
+
+        # Flush any buffered responses before setting the list TTL, with timeout
+        try:
+            await asyncio.wait_for(publisher.close(), timeout=30.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
+        except Exception as e:
+            logger.warning(f"Failed to flush buffered responses for {agent_run_id}: {e}")
 
         # Set TTL on the response list in Redis
         await _cleanup_redis_response_list(agent_run_id)
@@ -293,11 +306,8 @@ async def run_agent_background(
         # Clean up the run lock
         await _cleanup_redis_run_lock(agent_run_id)
 
-        # Wait for all pending redis operations to complete, with timeout
-        try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
+        # Free the account's concurrent run slot
+        await _release_run_slot(agent_run_id)
 
         logger.debug(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
@@ -314,6 +324,13 @@ async def _cleanup_redis_instance_key(agent_run_id: str):
     except Exception as e:
         logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
 
+async def _release_run_slot(agent_run_id: str):
+    """Release the run's lease in the account's concurrent run counter."""
+    try:
+        await run_admission.release(agent_run_id)
+    except Exception as e:
+        logger.warning(f"Failed to release run slot for {agent_run_id}: {str(e)}")
+
 async def _cleanup_redis_run_lock(agent_run_id: str):
     """Clean up the run lock Redis key for an agent run."""
     run_lock_key = f"agent_run_lock:{agent_run_id}"
@@ -328,13 +345,8 @@ async def _cleanup_redis_run_lock(agent_run_id: str):
 REDIS_RESPONSE_LIST_TTL = 3600 * 24
 
 async def _cleanup_redis_response_list(agent_run_id: str):
-    """Set TTL on the Redis response list."""
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    try:
-        await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
-        # logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
-    except Exception as e:
-        logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
+    """Set TTL on the Redis response list (or stream)."""
+    await expire_run_output(agent_run_id, REDIS_RESPONSE_LIST_TTL)
 
 async def update_agent_run_status(
     client,
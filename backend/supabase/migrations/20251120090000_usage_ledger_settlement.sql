@@ -0,0 +1,137 @@
+-- Bulk settlement of LLM usage recorded by the write-behind usage ledger
+-- Usage events are appended to a Redis stream per response and settled here in
+-- batches per account. Each event is keyed by its message_id, so replays after
+-- a crash or retry never charge the same response twice.
+
+CREATE TABLE IF NOT EXISTS public.usage_settlements (
+    message_id TEXT PRIMARY KEY,
+    account_id UUID NOT NULL,
+    thread_id TEXT,
+    model TEXT,
+    amount NUMERIC(12, 6) NOT NULL,
+    settled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_settlements_account_settled
+    ON public.usage_settlements (account_id, settled_at DESC);
+
+ALTER TABLE public.usage_settlements ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION atomic_settle_usage_batch(
+    p_account_id UUID,
+    p_entries JSONB,
+    p_description TEXT DEFAULT 'LLM usage'
+) RETURNS JSONB AS $$
+DECLARE
+    v_current_expiring NUMERIC(10, 2);
+    v_current_non_expiring NUMERIC(10, 2);
+    v_amount NUMERIC(12, 6);
+    v_settled_count INTEGER;
+    v_charge NUMERIC(10, 2);
+    v_amount_from_expiring NUMERIC(10, 2);
+    v_amount_from_non_expiring NUMERIC(10, 2);
+    v_new_expiring NUMERIC(10, 2);
+    v_new_non_expiring NUMERIC(10, 2);
+    v_new_total NUMERIC(10, 2);
+    v_message_ids TEXT[];
+BEGIN
+    SELECT expiring_credits, non_expiring_credits
+    INTO v_current_expiring, v_current_non_expiring
+    FROM public.credit_accounts
+    WHERE account_id = p_account_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object(
+            'success', false,
+            'error', 'No credit account found'
+        );
+    END IF;
+
+    -- Only entries not settled before are charged (idempotency by message_id)
+    WITH inserted AS (
+        INSERT INTO public.usage_settlements (message_id, account_id, thread_id, model, amount)
+        SELECT
+            entry->>'message_id',
+            p_account_id,
+            entry->>'thread_id',
+            entry->>'model',
+            (entry->>'amount')::NUMERIC(12, 6)
+        FROM jsonb_array_elements(p_entries) AS entry
+        ON CONFLICT (message_id) DO NOTHING
+        RETURNING message_id, amount
+    )
+    SELECT COALESCE(SUM(amount), 0), COUNT(*), ARRAY_AGG(message_id)
+    INTO v_amount, v_settled_count, v_message_ids
+    FROM inserted;
+
+    v_charge := ROUND(v_amount, 2);
+
+    IF v_settled_count = 0 OR v_charge <= 0 THEN
+        RETURN jsonb_build_object(
+            'success', true,
+            'settled', v_settled_count,
+            'amount_deducted', 0,
+            'new_total', v_current_expiring + v_current_non_expiring
+        );
+    END IF;
+
+    -- Same split as atomic_use_credits: expiring credits first, negative balances allowed
+    IF v_current_expiring >= v_charge THEN
+        v_amount_from_expiring := v_charge;
+        v_amount_from_non_expiring := 0;
+    ELSE
+        v_amount_from_expiring := GREATEST(v_current_expiring, 0);
+        v_amount_from_non_expiring := v_charge - v_amount_from_expiring;
+    END IF;
+
+    v_new_expiring := v_current_expiring - v_amount_from_expiring;
+    v_new_non_expiring := v_current_non_expiring - v_amount_from_non_expiring;
+    v_new_total := v_new_expiring + v_new_non_expiring;
+
+    UPDATE public.credit_accounts
+    SET
+        expiring_credits = v_new_expiring,
+        non_expiring_credits = v_new_non_expiring,
+        balance = v_new_total,
+        updated_at = NOW()
+    WHERE account_id = p_account_id;
+
+    INSERT INTO public.credit_ledger (
+        account_id,
+        amount,
+        balance_after,
+        type,
+        description,
+        metadata,
+        processing_source
+    ) VALUES (
+        p_account_id,
+        -v_charge,
+        v_new_total,
+        'usage',
+        p_description,
+        jsonb_build_object(
+            'message_ids', to_jsonb(v_message_ids),
+            'settled', v_settled_count,
+            'from_expiring', v_amount_from_expiring,
+            'from_non_expiring', v_amount_from_non_expiring
+        ),
+        'usage_ledger'
+    );
+
+    RETURN jsonb_build_object(
+        'success', true,
+        'settled', v_settled_count,
+        'amount_deducted', v_charge,
+        'from_expiring', v_amount_from_expiring,
+        'from_non_expiring', v_amount_from_non_expiring,
+        'new_expiring', v_new_expiring,
+        'new_non_expiring', v_new_non_expiring,
+        'new_total', v_new_total
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION atomic_settle_usage_batch TO service_role;
+GRANT ALL ON TABLE public.usage_settlements TO service_role;
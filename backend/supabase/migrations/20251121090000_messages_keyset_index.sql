@@ -0,0 +1,5 @@
+-- Keyset pagination of thread messages orders by (created_at, message_id) within a thread.
+-- Built CONCURRENTLY so writes to public.messages are not blocked during the build.
+-- CONCURRENTLY cannot run inside a transaction block, so this file must contain only this statement.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_thread_created_message
+    ON public.messages (thread_id, created_at, message_id);
@@ -139,6 +139,9 @@ class ThreadsResponse:
 @dataclass
 class MessagesResponse:
     messages: List[Message]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    sync_cursor: Optional[str] = None
 
 
 @dataclass
@@ -393,26 +396,80 @@ class ThreadsClient:
             {**data, "project": project_data, "recent_agent_runs": agent_runs_data},
         )
 
-    async def get_thread_messages(
-        self, thread_id: str, order: str = "desc"
+    async def get_thread_messages_page(
+        self,
+        thread_id: str,
+        order: str = "desc",
+        limit: int = 200,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
     ) -> MessagesResponse:
-        """Get ALL messages for a thread.
+        """Get one page of messages for a thread.
 
         Args:
             thread_id: The thread ID
             order: Order by created_at: 'asc' or 'desc'
+            limit: Page size (max 1000)
+            cursor: next_cursor of the previous page
+            since: sync_cursor of an earlier response, to only get newer messages
 
         Returns:
-            MessagesResponse containing all messages
+            MessagesResponse with the page's messages and its cursors
         """
-        params = {"order": order}
+        params: Dict[str, Any] = {"order": order, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if since:
+            params["since"] = since
         response = await self.client.get(
             f"/threads/{thread_id}/messages", params=params
         )
         data = self._handle_response(response)
 
         messages = [from_dict(Message, msg_data) for msg_data in data["messages"]]
-        return MessagesResponse(messages=messages)
+        return MessagesResponse(
+            messages=messages,
+            next_cursor=data.get("next_cursor"),
+            has_more=data.get("has_more", False),
+            sync_cursor=data.get("sync_cursor"),
+        )
+
+    async def get_thread_messages(
+        self,
+        thread_id: str,
+        order: str = "desc",
+        since: Optional[str] = None,
+        page_size: int = 200,
+    ) -> MessagesResponse:
+        """Get ALL messages for a thread (or all messages newer than `since`).
+
+        Messages are fetched in cursor pages of `page_size`.
+
+        Args:
+            thread_id: The thread ID
+            order: Order by created_at: 'asc' or 'desc'
+            since: sync_cursor of an earlier response, to only get newer messages
+            page_size: Messages per request (max 1000)
+
+        Returns:
+            MessagesResponse containing all messages; pass its sync_cursor as
+            `since` to fetch only the messages added afterwards
+        """
+        messages: List[Message] = []
+        cursor = None
+        sync_cursor = since
+        while True:
+            page = await self.get_thread_messages_page(
+                thread_id, order=order, limit=page_size, cursor=cursor, since=since
+            )
+            messages.extend(page.messages)
+            if page.sync_cursor and (order == "asc" or cursor is None):
+                # Newest position: the last page in asc order, the first in desc order
+                sync_cursor = page.sync_cursor
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        return MessagesResponse(messages=messages, sync_cursor=sync_cursor)
 
     async def add_message_to_thread(self, thread_id: str, message: str) -> Message:
         """Add a simple message to a thread.